@@ -1,5 +1,5 @@
 from django.apps import AppConfig
-from . import patches
+from . import patches, versions
 
 
 class CvConfig(AppConfig):
@@ -8,3 +8,4 @@ class CvConfig(AppConfig):
 
     def ready(self):
         patches.cv_patcher.connect()
+        versions.cv_versions.connect()
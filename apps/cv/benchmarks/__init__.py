@@ -0,0 +1,6 @@
+# IDE: PyCharm
+# Project: cv
+# Path: apps/cv/benchmarks
+# File: __init__.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 10:12 AM
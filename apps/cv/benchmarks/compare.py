@@ -0,0 +1,143 @@
+# IDE: PyCharm
+# Project: cv
+# Path: apps/cv/benchmarks
+# File: compare.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 10:40 AM
+import gc
+import json
+import pathlib
+import platform
+import sys
+import time
+import tracemalloc
+from typing import NamedTuple, Callable, Iterable, Optional, Union
+
+from apps.cv.benchmarks.data import CVDataFactory, Similarity
+from apps.cv.compare import (
+    DictComparer, DataComparer, DataMatcher, CompleteDataComparer, DateRangeCrossing, DateRangeMatcher
+)
+
+
+class BenchmarkResult(NamedTuple):
+    name: str
+    size: int
+    repeat: int
+    seconds: float  # the best (min) time of one call
+    ops_per_sec: float  # calls per second for the best time
+    rows_per_sec: float
+    peak_memory: int  # bytes, measured by tracemalloc in a separate call
+
+
+class CompareBenchmark:
+    """
+    It times each public entry point of `apps.cv.compare` on the synthetic data (see CVDataFactory)
+    for each of `sizes` and collects BenchmarkResult-s.
+
+        bench = CompareBenchmark(sizes=(10, 100), repeat=3)
+        results = bench.run()
+        bench.save(results, 'compare.json')
+
+    Results of two runs can be compared by `.regressions(...)`
+    """
+
+    # 1000 and more rows take minutes for the exhaustive comparers, pass them explicitly
+    sizes = (10, 100)
+    repeat = 3
+
+    def __init__(self, sizes: Optional[Iterable[int]] = None, repeat: Optional[int] = None, seed: int = 0,
+                 similarity: Optional[Similarity] = None, names: Optional[Iterable[str]] = None) -> None:
+        if sizes is not None:
+            self.sizes = tuple(sizes)
+        if repeat is not None:
+            self.repeat = repeat
+        self.seed = seed
+        self.similarity = similarity
+        self.names = None if names is None else set(names)
+
+    def get_cases(self, size: int) -> dict[str, Callable[[], object]]:
+        """
+        Returns { name: callable, ... } where each callable calls the entry point on the data of `size` rows.
+        Data is generated here, thus it is not counted in the timing.
+        """
+        factory = CVDataFactory(self.seed, self.similarity)
+        s_tech, u_tech = factory.technology_rows(size)
+        s_proj, u_proj = factory.project_rows(size)
+        date_ranges = factory.date_ranges(size)
+        haystack, needles = factory.date_range_pairs(size)
+        u_row = u_proj[0]
+        s_plain = [{k: v for k, v in s.items() if k != 'id'} for s in s_proj]
+
+        return {
+            'DictComparer.compare': lambda: DictComparer(u_row).compare(s_plain),
+            'DataComparer.prepare_to_update': lambda: DataComparer(s_tech, u_tech).prepare_to_update(),
+            'DataMatcher.match': lambda: DataMatcher(s_plain, u_proj).match(),
+            'CompleteDataComparer.prepare_to_update': lambda: CompleteDataComparer(s_tech, u_tech).prepare_to_update(),
+            'DateRangeCrossing.min_crossings': lambda: DateRangeCrossing(date_ranges).min_crossings(),
+            'DateRangeCrossing.crossings': lambda: DateRangeCrossing(date_ranges).crossings(),
+            'DateRangeMatcher.match': lambda: DateRangeMatcher(haystack, needles).match(),
+            'DateRangeMatcher.match1': lambda: DateRangeMatcher(haystack, needles).match1(),
+        }
+
+    def measure(self, name: str, size: int, func: Callable[[], object]) -> BenchmarkResult:
+        gc.collect()
+        best = float('inf')
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+
+        # the memory is measured separately, because tracemalloc slows down the code
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return BenchmarkResult(
+            name=name, size=size, repeat=self.repeat, seconds=best,
+            ops_per_sec=1 / best if best else float('inf'),
+            rows_per_sec=size / best if best else float('inf'),
+            peak_memory=peak
+        )
+
+    def iter_run(self):
+        for size in self.sizes:
+            for name, func in self.get_cases(size).items():
+                if self.names is None or name in self.names:
+                    yield self.measure(name, size, func)
+
+    def run(self) -> list[BenchmarkResult]:
+        return list(self.iter_run())
+
+    def to_dict(self, results: Iterable[BenchmarkResult]) -> dict:
+        return {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'seed': self.seed,
+            'repeat': self.repeat,
+            'results': [r._asdict() for r in results]
+        }
+
+    def save(self, results: Iterable[BenchmarkResult], path: Union[str, pathlib.Path]) -> None:
+        pathlib.Path(path).write_text(json.dumps(self.to_dict(results), indent=2))
+
+    @staticmethod
+    def load(path: Union[str, pathlib.Path]) -> list[BenchmarkResult]:
+        return [BenchmarkResult(**r) for r in json.loads(pathlib.Path(path).read_text())['results']]
+
+    @staticmethod
+    def regressions(baseline: Iterable[BenchmarkResult], results: Iterable[BenchmarkResult],
+                    max_slowdown: float = 1.5) -> list[tuple[BenchmarkResult, BenchmarkResult, float]]:
+        """
+        Returns [(baseline_result, result, slowdown), ...] for each (name, size) that is present in both
+        and became slower more than `max_slowdown` times.
+        """
+        base = {(r.name, r.size): r for r in baseline}
+        res = []
+        for r in results:
+            b = base.get((r.name, r.size))
+            if b is not None and b.seconds > 0 and r.seconds / b.seconds > max_slowdown:
+                res.append((b, r, r.seconds / b.seconds))
+        return res
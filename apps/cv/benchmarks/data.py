@@ -0,0 +1,124 @@
+# IDE: PyCharm
+# Project: cv
+# Path: apps/cv/benchmarks
+# File: data.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 10:14 AM
+import datetime
+import random
+from typing import NamedTuple, Optional
+
+from faker import Faker
+
+
+class Similarity(NamedTuple):
+    """
+    Distribution of the update rows relatively to the stored rows (parts of 1.0)
+        - exact - a copy of a stored row (ratio 1.0)
+        - similar - a stored row with some modified fields (typos, extra words)
+        - the rest - new rows that are not related to the stored rows
+    """
+    exact: float = .3
+    similar: float = .5
+
+
+class CVDataFactory:
+    """
+    It generates synthetic CV rows and date ranges that look like the data of `my_cv.json`.
+    The data is reproducible for the same `seed`.
+
+        factory = CVDataFactory(seed=1)
+        s, u = factory.technology_rows(100)
+        haystack, needles = factory.date_range_pairs(100)
+    """
+
+    technology_types = ('Programming language', 'Framework', 'Database', 'Tool', 'Library', 'OS')
+    date_begin = datetime.date(2000, 1, 1)
+    date_days = 8000
+
+    def __init__(self, seed: Optional[int] = 0, similarity: Optional[Similarity] = None) -> None:
+        self.faker = Faker()
+        self.faker.seed_instance(seed)
+        self.random = random.Random(seed)
+        self.similarity = Similarity() if similarity is None else similarity
+
+    def _mutate_text(self, text: str) -> str:
+        chars = list(text)
+        action = self.random.randrange(3)
+        if action == 0 and chars:
+            # typo
+            chars[self.random.randrange(len(chars))] = self.random.choice('abcdefghijklmnopqrstuvwxyz')
+        elif action == 1 and len(chars) > 1:
+            del chars[self.random.randrange(len(chars))]
+        else:
+            chars.extend(' ' + self.faker.word())
+        return ''.join(chars)
+
+    def _mutate_row(self, row: dict) -> dict:
+        row = row.copy()
+        keys = [k for k, v in row.items() if isinstance(v, str) and v]
+        for k in self.random.sample(keys, self.random.randint(1, len(keys))) if keys else ():
+            row[k] = self._mutate_text(row[k])
+        return row
+
+    def technology(self) -> dict:
+        return {
+            'technology_type': self.random.choice(self.technology_types),
+            'technology': f'{self.faker.word().capitalize()} {self.faker.word()}',
+        }
+
+    def project(self) -> dict:
+        begin = self.date_begin + datetime.timedelta(self.random.randrange(self.date_days))
+        return {
+            'begin': begin.isoformat(),
+            'end': (begin + datetime.timedelta(self.random.randint(30, 900))).isoformat(),
+            'title': self.faker.catch_phrase(),
+            'description': self.faker.sentence(nb_words=12),
+        }
+
+    def _rows(self, count: int, row_factory) -> tuple[list[dict], list[dict]]:
+        """
+        Returns (stored, update) lists, where `stored` rows have `id` (like the API returns)
+        and `update` rows are distributed according to `self.similarity`
+        """
+        stored = [{'id': i + 1, **row_factory()} for i in range(count)]
+        update = []
+        for i in range(count):
+            row = {k: v for k, v in self.random.choice(stored).items() if k != 'id'}
+            dice = self.random.random()
+            if dice < self.similarity.exact:
+                update.append(row)
+            elif dice < self.similarity.exact + self.similarity.similar:
+                update.append(self._mutate_row(row))
+            else:
+                update.append(row_factory())
+        return stored, update
+
+    def technology_rows(self, count: int) -> tuple[list[dict], list[dict]]:
+        return self._rows(count, self.technology)
+
+    def project_rows(self, count: int) -> tuple[list[dict], list[dict]]:
+        return self._rows(count, self.project)
+
+    def date_range(self, max_days: int = 900, open_end: float = .05) -> tuple[str, Optional[str]]:
+        begin = self.date_begin + datetime.timedelta(self.random.randrange(self.date_days))
+        if self.random.random() < open_end:
+            return begin.isoformat(), None
+        return begin.isoformat(), (begin + datetime.timedelta(self.random.randint(0, max_days))).isoformat()
+
+    def date_ranges(self, count: int, max_days: int = 900) -> list[tuple[str, Optional[str]]]:
+        return [self.date_range(max_days) for _ in range(count)]
+
+    def date_range_pairs(self, count: int) -> tuple[list, list]:
+        """
+        Returns (haystack, needles) - the haystack looks like workplaces (long ranges)
+        and the needles look like responsibilities/projects (shorter ranges), part of them are exact copies.
+        """
+        haystack = self.date_ranges(count)
+        needles = []
+        for _ in range(count):
+            if self.random.random() < self.similarity.exact:
+                needles.append(self.random.choice(haystack))
+            else:
+                needles.append(self.date_range(max_days=120))
+        return haystack, needles
@@ -0,0 +1,99 @@
+# IDE: PyCharm
+# Project: cv
+# Path: apps/cv
+# File: cache.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 11:10 PM
+
+import hashlib
+import json
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import caches, BaseCache
+from rest_framework import status
+from rest_framework.response import Response
+
+
+class ResponseCache:
+    """
+        The cache of the data of GET responses (`response.data`, it is rendered for each request as usual).
+
+        The key must contain everything the data depends on, for the CV endpoints it is the ETag
+        (the user, the absolute URI with the query params, the format and the versions of the profile data
+        and the dictionaries, see apps.cv.versions), thus a write makes the new key and the cached data
+        is never invalidated explicitly, the old entries just expire.
+
+        settings.CV_RESPONSE_CACHE - the alias of settings.CACHES (LocMemCache, FileBasedCache ...), None disables it
+        settings.CV_RESPONSE_CACHE_TIMEOUT - the timeout of the entries (seconds)
+
+        The number of hits and misses is kept in the same cache, thus it is shared like the cache itself
+        (per process for LocMemCache, per host for FileBasedCache).
+    """
+
+    key_prefix = 'cv:response:'
+    stats_key_prefix = 'cv:response-stats:'
+    stats_names = ('hits', 'misses')
+    header_name = 'X-Cache'
+
+    @property
+    def alias(self) -> Optional[str]:
+        return getattr(settings, 'CV_RESPONSE_CACHE', None)
+
+    @property
+    def cache(self) -> Optional[BaseCache]:
+        alias = self.alias
+        return None if alias is None else caches[alias]
+
+    @property
+    def timeout(self) -> Optional[int]:
+        return getattr(settings, 'CV_RESPONSE_CACHE_TIMEOUT', 60 * 60)
+
+    def get_key(self, *parts) -> str:
+        return self.key_prefix + hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+    def count(self, cache: BaseCache, name: str):
+        key = self.stats_key_prefix + name
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # the counter is deleted (cleared) concurrently
+            cache.add(key, 1, timeout=None)
+
+    def get_stats(self) -> dict:
+        cache = self.cache
+        res = {'cache': self.alias}
+        if cache is None:
+            return res | dict.fromkeys(self.stats_names)
+        counters = cache.get_many([self.stats_key_prefix + name for name in self.stats_names])
+        return res | {name: counters.get(self.stats_key_prefix + name, 0) for name in self.stats_names}
+
+    def reset_stats(self):
+        cache = self.cache
+        if cache is not None:
+            cache.delete_many([self.stats_key_prefix + name for name in self.stats_names])
+
+    def get_response(self, key: str, handler: Callable[[], Response]) -> Response:
+        """
+            The response with the cached data or the response of the handler (its data is cached if it is 200 OK)
+        """
+        cache = self.cache
+        if cache is None:
+            return handler()
+
+        data = cache.get(key)
+        if data is not None:
+            self.count(cache, 'hits')
+            return Response(data, headers={self.header_name: 'HIT'})
+
+        self.count(cache, 'misses')
+        response = handler()
+        if response.status_code == status.HTTP_200_OK and response.data is not None:
+            # ReturnDict and ReturnList are pickled as dict and list (without the serializer)
+            cache.set(key, response.data, self.timeout)
+            response[self.header_name] = 'MISS'
+        return response
+
+
+response_cache = ResponseCache()
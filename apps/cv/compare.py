@@ -4,23 +4,97 @@
 # File: compare.py
 # Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
 # Created by ox23 at 2023-10-23 (y-m-d) 9:25 PM
+import bisect
+import concurrent.futures
 import datetime
 import difflib
 import functools
 import hashlib
+import heapq
 import itertools
 import json
+import os
 import string
 import sys
-from collections import namedtuple
+from collections import namedtuple, OrderedDict, Counter
 from enum import Enum
-from typing import Union, Optional, Sequence, Iterable
+from typing import Union, Optional, Sequence, Iterable, Iterator
 from django.conf import settings
 
 
 ComparedItemInfoClass = namedtuple('ComparedItemInfo', ('ratio', 'idx', 'hash'))
 
 
+class SerializationCache:
+    """
+    Bounded (LRU) cache of serialized values and dictionary fingerprints
+    that lives during one comparison session (one `DataComparer.compare()` run, for example).
+
+    Plain scalars (str, int, bool, None and float except ±0.0) are cached by content (type and value),
+    other values (tuples, lists, dicts ...) and dictionaries passed to `fingerprint()` are cached by identity,
+    the content key of the container would mix up the nested values of different types
+    (like (1, True) and (1, 1) or 0.0 and -0.0 that are equal in Python but not in JSON). The cache keeps
+    a reference to the object, thus the `id()` can not be reused while the entry is alive.
+    Objects must not be changed during the session.
+
+        cache = SerializationCache(maxsize=2)
+        cache.dumps('abc'), cache.dumps('abc'), cache.dumps([1, 2])
+        => ('"abc"', '"abc"', '[1, 2]')
+        cache.hits, cache.misses
+        => (1, 2)
+    """
+
+    maxsize = 4096
+    _content_key_types = (str, int, bool, type(None))
+
+    def __init__(self, maxsize: Optional[int] = None) -> None:
+        if maxsize is not None:
+            self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.hits = self.misses = 0
+
+    def _get_or_set(self, key, obj, func):
+        try:
+            _, val = self._data[key]
+        except KeyError:
+            self.misses += 1
+            val = func()
+            self._data[key] = (obj, val)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        else:
+            self.hits += 1
+            self._data.move_to_end(key)
+        return val
+
+    def dumps(self, v) -> str:
+        """
+        Cached equivalent of `json.dumps(v, default=str)`
+        """
+        if type(v) in self._content_key_types or (type(v) is float and v != 0.0):
+            key = ('v', type(v), v)
+        else:
+            key = ('i', id(v))
+        return self._get_or_set(key, v, lambda: json.dumps(v, default=str))
+
+    def fingerprint(self, dc: 'DictComparer', d: dict) -> int:
+        """
+        Cached equivalent of the hash that `DictComparer.compare()` returns for `d`.
+        It depends on the keys (and their order) of `dc`.
+        """
+        return self._get_or_set(
+            ('f', id(d), dc.keys), d,
+            lambda: dc._get_hash(dc._get_dict_repr(dict(dc._iter_over_dict(d))))
+        )
+
+
 class DictComparer:
     """
 
@@ -110,8 +184,19 @@ class DictComparer:
     _empty = object()
     ratio_round_precision = 4
 
-    def __init__(self, d: dict, keys: Union[list, tuple, None, bool] = None) -> None:
+    def __init__(self, d: dict, keys: Union[list, tuple, None, bool] = None,
+                 cache: Optional[SerializationCache] = None) -> None:
+        """
+        `cache` can be shared between several instances (see `DataComparer.compare()`),
+        then each of the compared values and dictionaries will be serialized only once.
+        Without it, each `.compare()` and `.best()` call uses a new cache (the session is one call),
+        thus the dictionaries can be changed between the calls.
+        """
         self._d = {}
+        self._own_cache = cache is None
+        self.cache = SerializationCache() if cache is None else cache
+        # how many full `SequenceMatcher.ratio()` computations were avoided by `.best()`
+        self.avoided_ratio_count = 0
         self.set_d(d, keys)
 
     @property
@@ -140,6 +225,10 @@ class DictComparer:
         self._d = d
         self.keys = keys
 
+    def _start_session(self) -> None:
+        if self._own_cache:
+            self.cache = SerializationCache()
+
     @staticmethod
     def _json_typed_val(v):
         return v if isinstance(v, str) else (type(v).__name__ + ':' + str(v)).lower()
@@ -191,6 +280,26 @@ class DictComparer:
             except KeyError:
                 pass
 
+    @staticmethod
+    def _real_quick_ratio(a: str, b: str) -> float:
+        """
+        The same as `SequenceMatcher(None, a, b).real_quick_ratio()` - upper bound of `.ratio()` by lengths only
+        """
+        la_lb = len(a) + len(b)
+        return 2.0 * min(len(a), len(b)) / la_lb if la_lb else 1.0
+
+    @staticmethod
+    def _quick_ratio(a: str, b: str, counters: dict[str, Counter]) -> float:
+        """
+        The same as `SequenceMatcher(None, a, b).quick_ratio()` - upper bound of `.ratio()` by character counts.
+        `counters` is the cache { string: Counter(string), ... }
+        """
+        la_lb = len(a) + len(b)
+        if not la_lb:
+            return 1.0
+        ca, cb = (counters[v] if v in counters else counters.setdefault(v, Counter(v)) for v in (a, b))
+        return 2.0 * sum((ca & cb).values()) / la_lb
+
     def _get_compare_info(self, others: list[dict], exclude_ids: list = None) -> dict[int, dict[str, float]]:
         """
             For optimisation we going through the keys in `self._d` and make resulting structure
@@ -207,16 +316,17 @@ class DictComparer:
 
         res: dict[int, dict[str, float]] = {}
         sm = difflib.SequenceMatcher(lambda c: c in string.whitespace)
+        dumps = self.cache.dumps
 
         for ki, (k, v) in enumerate(self):
-            sm.set_seq1(json.dumps(v, default=str))
+            sm.set_seq1(dumps(v))
             for oi, oitem in enumerate(others):
                 if exclude_ids is not None and oi in exclude_ids:
                     continue
 
                 ov, r = oitem.get(k, self._empty), .0
                 if ov is not self._empty:
-                    sm.set_seq2(json.dumps(ov, default=str))
+                    sm.set_seq2(dumps(ov))
                     r = sm.ratio()
 
                 res.setdefault(oi, {})[k] = r
@@ -232,20 +342,570 @@ class DictComparer:
 
         If `others` or `self._d` are empty then result also be an empty array.
         """
+        self._start_session()
+        return [
+            ComparedItemInfoClass(ratio=ravg, idx=oi, hash=self.cache.fingerprint(self, others[oi]))
+            for oi, ravg in self._get_ratios(others, exclude_ids)
+        ]
+
+    def _get_ratios(self, others: list[dict], exclude_ids: list = None) -> list[tuple[int, float]]:
+        """
+        The same as `.compare()` but without hashes - [(idx, ratio), ...]
+        """
         res = []
         for oi, ratios in self._get_compare_info(others, exclude_ids).items():
             ravg = sum(ratios.values()) / len(ratios)
             if self.ratio_round_precision is not None:
                 ravg = round(ravg, self.ratio_round_precision)
+            res.append((oi, ravg))
+
+        return res
+
+    def best(self, others: list[dict], exclude_ids: list = None) -> Optional[ComparedItemInfoClass]:
+        """
+        It returns the same as the first element with maximal ratio from `.compare(others, exclude_ids)`
+        or None if there is nothing to compare.
+
+        Upper bounds of the ratio (`real_quick_ratio`, `quick_ratio`) are calculated for each element of `others`
+        and the elements are compared in the order of decreasing upper bound. As soon as the upper bound is
+        less than the best ratio that was already found, the rest of `others` are skipped.
+        The number of field ratios that were not computed is added to `.avoided_ratio_count`.
+        """
+        self._start_session()
+        best = self._get_best_ratio(others, exclude_ids)
+        if best is None:
+            return None
+        oi, ratio = best
+        return ComparedItemInfoClass(ratio=ratio, idx=oi, hash=self.cache.fingerprint(self, others[oi]))
+
+    def _get_best_ratio(self, others: list[dict], exclude_ids: list = None) -> Optional[tuple[int, float]]:
+        """
+        The same as `.best()` but without hash - (idx, ratio)
+        """
+        dumps, counters = self.cache.dumps, {}
+        items = [(k, dumps(v)) for k, v in self]
+        if not items:
+            return None
 
-            res.append(
-                ComparedItemInfoClass(
-                    ratio=ravg,
-                    idx=oi,
-                    hash=self._get_hash(self._get_dict_repr(dict(self._iter_over_dict(others[oi]))))
-                )
+        def round_ratio(r):
+            return r if self.ratio_round_precision is None else round(r, self.ratio_round_precision)
+
+        bounds = []  # [(upper_bound, oi, count_of_field_ratios), ...]
+        for oi, oitem in enumerate(others):
+            if exclude_ids is not None and oi in exclude_ids:
+                continue
+
+            pairs = [(v, dumps(oitem[k])) for k, v in items if k in oitem]
+            bound = sum(self._real_quick_ratio(v, ov) for v, ov in pairs)
+            if pairs and bound > 0:
+                bound = sum(self._quick_ratio(v, ov, counters) for v, ov in pairs)
+            bounds.append((round_ratio(bound / len(items)), oi, len(pairs)))
+
+        res = None
+        bounds.sort(key=lambda b: (-b[0], b[1]))
+        for bi, (bound, oi, _) in enumerate(bounds):
+            if res is not None and bound < res[1]:
+                self.avoided_ratio_count += sum(b[2] for b in bounds[bi:])
+                break
+
+            ratio = self._get_ratios([others[oi]])[0][1]
+            if res is None or ratio > res[1] or (ratio == res[1] and oi < res[0]):
+                res = (oi, ratio)
+
+        return res
+
+
+class ParallelExecution:
+    """
+    Opt-in execution of independent blocks of rows in a `concurrent.futures.ProcessPoolExecutor`.
+    It is used by `RatioMatrix` and `DataComparer` (see their `parallel` attribute).
+
+    Rows are split into blocks of `chunk_rows` rows (by default, 4 blocks per worker),
+    results of the blocks are merged in the order of blocks, thus the result is the same as the serial one.
+    If the amount of work (len(u) * len(s)) is less than `min_pairs`, the rows are processed serially
+    in the current process, because starting of processes and pickling of data cost more.
+
+    `executor` can be passed to reuse the pool between calls, otherwise the pool is created for each call.
+
+        DataMatcher.parallel = ParallelExecution(max_workers=4)
+    """
+
+    min_pairs = 50_000
+
+    def __init__(self, max_workers: Optional[int] = None, min_pairs: Optional[int] = None,
+                 chunk_rows: Optional[int] = None, executor: Optional[concurrent.futures.Executor] = None) -> None:
+        self.max_workers = max_workers
+        if min_pairs is not None:
+            self.min_pairs = min_pairs
+        self.chunk_rows = chunk_rows
+        self.executor = executor
+
+    def is_parallel(self, u_count: int, s_count: int) -> bool:
+        return self.max_workers != 1 and u_count > 1 and u_count * s_count >= self.min_pairs
+
+    def chunks(self, count: int) -> list[range]:
+        chunk_rows = self.chunk_rows
+        if not chunk_rows:
+            workers = self.max_workers or os.cpu_count() or 1
+            chunk_rows = max(1, -(-count // (workers * 4)))
+        return [range(i, min(i + chunk_rows, count)) for i in range(0, count, chunk_rows)]
+
+    def map(self, func, *iterables) -> list:
+        """
+        The same as `list(map(func, *iterables))` but in the pool of processes.
+        `func` and arguments must be picklable.
+        """
+        if self.executor is not None:
+            return list(self.executor.map(func, *iterables))
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(func, *iterables))
+
+
+class RatioMatrix:
+    """
+    It computes the whole u×s matrix of ratios in one batched pass, where
+    `u` is a list of update/up-to-date dictionaries and `s` is a list of source/stored dictionaries.
+
+    The result is equal to
+        [[DictComparer(u_item).compare([s_item])[0].ratio for s_item in s] for u_item in u]
+    but each field of each row is serialized only once, and each unique pair of serialized values
+    of a field is passed through `difflib.SequenceMatcher` only once.
+    In addition, `SequenceMatcher.set_seq2` (the expensive part of SequenceMatcher) is called
+    once per unique stored value of the field.
+
+    Like in `DictComparer`, the keys of the `u` row define the fields to compare,
+    a field that is absent in the `s` row has ratio 0.0 and the resulting ratio is the average of the field ratios.
+
+    Example:
+        rm = RatioMatrix([{'key': 'stp'}, {'key': 'udp'}], [{'key': 'smtp'}, {'key': 'udp'}])
+        rm.field_matrix('key')
+        => [[0.9090909090909091, 0.6], [0.5454545454545454, 1.0]]
+        rm.matrix
+        => [[0.9091, 0.6], [0.5455, 1.0]]
+
+    If `min_ratio` is set, the pairs of rows whose upper bound of the ratio
+    (average of `real_quick_ratio`/`quick_ratio` of the fields) is less than `min_ratio` are pruned.
+    Their ratios are not computed and are None in `matrix` and `field_matrix()`.
+
+        rm = RatioMatrix([{'key': 'stp'}, {'key': 'udp'}], [{'key': 'smtp'}, {'key': 'udp'}], min_ratio=.7)
+        rm.matrix
+        => [[0.9091, None], [None, 1.0]]
+        rm.avoided_ratio_count
+        => 2
+
+    If `candidates` is set (see NGramIndex), only the pairs (ui, si) where `si` is in `candidates[ui]`
+    are computed, the rest are None as well.
+
+    If `parallel` is set (see ParallelExecution), `matrix` is computed by blocks of `u` rows in separate processes.
+    """
+
+    ratio_round_precision = DictComparer.ratio_round_precision
+    min_ratio: Optional[float] = None
+    parallel: Optional[ParallelExecution] = None
+
+    def __init__(self, u: list[dict], s: list[dict], min_ratio: Optional[float] = None,
+                 candidates: Optional[list[set[int]]] = None, parallel: Optional[ParallelExecution] = None) -> None:
+        self.u: list[dict] = u
+        self.s: list[dict] = s
+        if min_ratio is not None:
+            self.min_ratio = min_ratio
+        if parallel is not None:
+            self.parallel = parallel
+        self.candidates: Optional[list[set[int]]] = candidates
+        # how many full `SequenceMatcher.ratio()` computations were avoided by pruning
+        self.avoided_ratio_count = 0
+        self._alive: Optional[dict[str, set]] = None
+
+        # keys of each `u` row in the order that DictComparer uses by default
+        self.u_keys: list[tuple] = [tuple(sorted(u_item, key=DictComparer._json_typed_val)) for u_item in u]
+        self._field_matrices: dict = {}
+        self._matrix: Optional[list[list[float]]] = None
+
+    @staticmethod
+    def _isjunk(c: str) -> bool:
+        return c in string.whitespace
+
+    @staticmethod
+    def _dumps(v) -> str:
+        return json.dumps(v, default=str)
+
+    def _serialize_field(self, rows: list[dict], key) -> list[Optional[str]]:
+        """
+        Returns the serialized value of the field `key` for each row in `rows` or None if a row has no `key`
+        """
+        return [self._dumps(row[key]) if key in row else None for row in rows]
+
+    def _round(self, r: float) -> float:
+        return r if self.ratio_round_precision is None else round(r, self.ratio_round_precision)
+
+    @property
+    def is_pruned(self) -> bool:
+        return self.min_ratio is not None or self.candidates is not None
+
+    def _calc_alive_pairs(self) -> tuple[dict, list[list[bool]]]:
+        """
+        Returns the unique pairs of serialized values that must be computed for each field
+        { key: {(u_value, s_value), ...}, ... } and the u×s matrix of pairs of rows that are not pruned.
+        """
+        values, counters = {}, {}
+        for keys in self.u_keys:
+            for k in keys:
+                if k not in values:
+                    values[k] = (self._serialize_field(self.u, k), self._serialize_field(self.s, k))
+
+        alive_values = {k: set() for k in values}
+        bound_funcs = (DictComparer._real_quick_ratio, functools.partial(DictComparer._quick_ratio, counters=counters))
+        alive = []
+        for ui, keys in enumerate(self.u_keys):
+            row = []
+            for si in range(len(self.s)):
+                if self.candidates is not None and si not in self.candidates[ui]:
+                    row.append(False)
+                    continue
+
+                s_pairs = [(k, values[k][0][ui], values[k][1][si]) for k in keys if values[k][1][si] is not None]
+                if self.min_ratio is None:
+                    is_alive, funcs = True, ()
+                else:
+                    # the row without keys has ratio 0.0
+                    is_alive, funcs = bool(keys) or self.min_ratio <= 0, bound_funcs if keys else ()
+                for bound_func in funcs:
+                    bound = sum(bound_func(uv, sv) for _, uv, sv in s_pairs) / len(keys)
+                    is_alive = self._round(bound) >= self.min_ratio
+                    if not is_alive:
+                        break
+                if is_alive:
+                    for k, uv, sv in s_pairs:
+                        alive_values[k].add((uv, sv))
+                row.append(is_alive)
+            alive.append(row)
+
+        for k, (u_values, s_values) in values.items():
+            self.avoided_ratio_count += (
+                len({v for v in u_values if v is not None}) * len({v for v in s_values if v is not None})
+                - len(alive_values[k])
             )
+        return alive_values, alive
+
+    def _calc_field_matrix(self, key) -> list[Optional[list[float]]]:
+        u_values = self._serialize_field(self.u, key)
+        s_values = self._serialize_field(self.s, key)
+        # If pruning is enabled, only these pairs of values are needed
+        alive_values = self._get_alive()[0].get(key, set()) if self.is_pruned else None
+
+        # ratio for each unique pair of values { (u_value, s_value): ratio, ... }
+        pair_ratios = {}
+        unique_u_values = {uv for uv in u_values if uv is not None}
+        sm = difflib.SequenceMatcher(self._isjunk)
+        for sv in {sv for sv in s_values if sv is not None}:
+            sm.set_seq2(sv)
+            for uv in unique_u_values:
+                if alive_values is not None and (uv, sv) not in alive_values:
+                    continue
+                sm.set_seq1(uv)
+                pair_ratios[uv, sv] = sm.ratio()
+
+        # the `u` rows that have no `key` are not compared by this field
+        return [
+            None if uv is None else [.0 if sv is None else pair_ratios.get((uv, sv)) for sv in s_values]
+            for uv in u_values
+        ]
+
+    def _get_alive(self) -> tuple[dict, list[list[bool]]]:
+        if self._alive is None:
+            self._alive = self._calc_alive_pairs()
+        return self._alive
+
+    def field_matrix(self, key) -> list[Optional[list[float]]]:
+        """
+        Returns the u×s sub-matrix of ratios for the field `key`.
+        The row is None if the corresponding `u` row has no `key`.
+        """
+        if key not in self._field_matrices:
+            self._field_matrices[key] = self._calc_field_matrix(key)
+        return self._field_matrices[key]
+
+    def _calc_matrix(self) -> list[list[Optional[float]]]:
+        alive = self._get_alive()[1] if self.is_pruned else None
+        res = []
+        for ui, keys in enumerate(self.u_keys):
+            if not keys:
+                # nothing to compare
+                res.append([.0 if alive is None or alive[ui][si] else None for si in range(len(self.s))])
+                continue
+
+            rows = [self.field_matrix(k)[ui] for k in keys]
+            ratios = []
+            for si in range(len(self.s)):
+                if alive is not None and not alive[ui][si]:
+                    ratios.append(None)
+                    continue
+                # The same order of summation as in DictComparer.compare to get the same float result
+                ravg = sum(row[si] for row in rows) / len(rows)
+                ratios.append(self._round(ravg))
+            res.append(ratios)
+        return res
+
+    @classmethod
+    def _calc_block(cls, u: list[dict], s: list[dict], min_ratio: Optional[float],
+                    candidates: Optional[list[set[int]]], ratio_round_precision: Optional[int]) -> tuple[list, int]:
+        """
+        It computes the block of rows in the worker process, returns (matrix, avoided_ratio_count)
+        """
+        rm = cls(u, s, min_ratio, candidates)
+        rm.parallel = None
+        rm.ratio_round_precision = ratio_round_precision
+        return rm.matrix, rm.avoided_ratio_count
+
+    def _calc_matrix_parallel(self) -> list[list[Optional[float]]]:
+        chunks = self.parallel.chunks(len(self.u))
+        blocks = self.parallel.map(
+            type(self)._calc_block,
+            [self.u[chunk.start:chunk.stop] for chunk in chunks],
+            itertools.repeat(self.s),
+            itertools.repeat(self.min_ratio),
+            [None if self.candidates is None else self.candidates[chunk.start:chunk.stop] for chunk in chunks],
+            itertools.repeat(self.ratio_round_precision)
+        )
+        res = []
+        for matrix, avoided_ratio_count in blocks:
+            res.extend(matrix)
+            self.avoided_ratio_count += avoided_ratio_count
+        return res
+
+    @property
+    def matrix(self) -> list[list[Optional[float]]]:
+        if self._matrix is None:
+            if self.parallel is not None and self.parallel.is_parallel(len(self.u), len(self.s)):
+                self._matrix = self._calc_matrix_parallel()
+            else:
+                self._matrix = self._calc_matrix()
+        return self._matrix
+
+
+class NGramIndex:
+    """
+    Blocking index over the list `s` of source/stored dictionaries.
+    It is used to select the candidate pairs before the ratios are computed, thus
+    the ratios of the pairs that have nothing in common are not computed at all.
+
+    Each field value of `s` is serialized (like in `RatioMatrix`) and split into character n-grams,
+    the inverted index { (key, n-gram): {si, ...}, ... } is built over them.
+    The `s` row is a candidate for the `u` row if it shares at least `min_similarity` part
+    of n-grams of the `u` row (only the fields of the `u` row are taken into account).
+
+    The `u` row and the `s` row that have the same serialized values of all fields of the `u` row
+    have the ratio 1.0, such `s` rows are returned by `.exact()` without any comparison.
+
+        index = NGramIndex([{'key': 'smtp'}, {'key': 'udp'}, {'key': 'django'}])
+        index.candidates({'key': 'stp'})
+        => {0}
+        index.exact({'key': 'udp'})
+        => [1]
+    """
+
+    n = 3
+    min_similarity = .3
+
+    def __init__(self, s: list[dict], n: Optional[int] = None, min_similarity: Optional[float] = None) -> None:
+        if n is not None:
+            self.n = n
+        if min_similarity is not None:
+            self.min_similarity = min_similarity
+        self.s: list[dict] = s
+        # the n-gram index is built by the first `.candidates()`, `.exact()` does not need it
+        self._index: Optional[dict[tuple, set[int]]] = None
+        self._fingerprints: dict[tuple, dict[tuple, list[int]]] = {}
+
+    def _get_index(self) -> dict[tuple, set[int]]:
+        if self._index is None:
+            self._index = {}
+            for si, s_item in enumerate(self.s):
+                for k, v in s_item.items():
+                    for gram in self._ngrams(RatioMatrix._dumps(v)):
+                        self._index.setdefault((k, gram), set()).add(si)
+        return self._index
+
+    def _ngrams(self, v: str) -> set[str]:
+        # short values are indexed entirely
+        return {v[i:i + self.n] for i in range(max(len(v) - self.n, 0) + 1)}
+
+    def _fingerprint(self, d: dict, keys: tuple) -> tuple:
+        return tuple(RatioMatrix._dumps(d[k]) if k in d else None for k in keys)
+
+    def exact(self, u: dict) -> list[int]:
+        """
+        Returns the indexes of `s` rows that are equal to `u` by the fields of `u`
+        """
+        keys = tuple(sorted(u, key=DictComparer._json_typed_val))
+        if not keys:
+            return []
+        if keys not in self._fingerprints:
+            fingerprints = self._fingerprints[keys] = {}
+            for si, s_item in enumerate(self.s):
+                fingerprints.setdefault(self._fingerprint(s_item, keys), []).append(si)
+        return self._fingerprints[keys].get(self._fingerprint(u, keys), [])
+
+    def candidates(self, u: dict) -> set[int]:
+        """
+        Returns the indexes of `s` rows that share enough n-grams with `u`
+        """
+        counts, total, index = {}, 0, self._get_index()
+        for k, v in u.items():
+            grams = self._ngrams(RatioMatrix._dumps(v))
+            total += len(grams)
+            for gram in grams:
+                for si in index.get((k, gram), ()):
+                    counts[si] = counts.get(si, 0) + 1
+        return {si for si, count in counts.items() if count >= self.min_similarity * total}
+
+
+Matches = list[tuple[tuple[int, int], float]]
+
+
+class MatchingStrategy:
+    """
+    Base class for the strategies that `DataMatcher` uses to select the matches from ratios.
+
+    `ratios` is { (ui, si): ratio, ..... } and result is a list of matches [((ui, si), r), ... ]
+    where each `ui` and each `si` occurs once at most.
+    Pairs that have a ratio less than `min_ratio` (if it is not None) are never matched.
+    """
+
+    def __init__(self, min_ratio: Optional[float] = None) -> None:
+        self.min_ratio = min_ratio
+
+    def is_acceptable(self, ratio: float) -> bool:
+        return self.min_ratio is None or ratio >= self.min_ratio
+
+    def match(self, ratios: dict[tuple[int, int], float]) -> Matches:
+        raise NotImplementedError
+
+    def iter_match(self, ratios: dict[tuple[int, int], float]) -> Iterator[tuple[tuple[int, int], float]]:
+        """
+        Yields the matches as soon as they are final.
+        Default implementation yields the result of `.match()`
+        """
+        yield from self.match(ratios)
+
+
+class GreedyMatching(MatchingStrategy):
+    """
+    Repeatedly takes the pair with the max ratio among the pairs whose `ui` and `si` are still free.
+    Ties are resolved in favour of the lower (ui, si), thus the result does not depend on the order of `ratios`.
+    It costs O(N*log(N)) where N is len(ratios).
+    """
+
+    def match(self, ratios: dict[tuple[int, int], float]) -> Matches:
+        return list(self.iter_match(ratios))
+
+    def iter_match(self, ratios: dict[tuple[int, int], float]) -> Iterator[tuple[tuple[int, int], float]]:
+        """
+        Each match is final as soon as it is popped from the heap,
+        thus the matches are yielded in the order of decreasing ratio.
+        """
+        heap = [(-r, ui, si) for (ui, si), r in ratios.items() if self.is_acceptable(r)]
+        heapq.heapify(heap)
+        # to stop as soon as either all rows or all columns are matched
+        u_count, s_count = len({ui for _, ui, _ in heap}), len({si for _, _, si in heap})
+
+        matched_u, matched_s = set(), set()
+        while heap and len(matched_u) < u_count and len(matched_s) < s_count:
+            r, ui, si = heapq.heappop(heap)
+            if ui in matched_u or si in matched_s:
+                continue
+            matched_u.add(ui)
+            matched_s.add(si)
+            yield (ui, si), -r
+
+
+class AssignmentMatching(MatchingStrategy):
+    """
+    Solves the linear assignment problem - selects the matches that have the max sum of ratios.
+
+    The pairs with `ratio` == 1.0 are always matched first (like in GreedyMatching),
+    the rest is resolved by the shortest augmenting path (Jonker-Volgenant) variant of the Hungarian algorithm,
+    that costs O(n^2*m) where n = min(len(u), len(s)) and m = max(len(u), len(s)).
+
+    Example where the strategies differ:
+        ratios = {(0, 0): .9, (0, 1): .8, (1, 0): .8, (1, 1): .1}
+        GreedyMatching().match(ratios)
+        => [((0, 0), 0.9), ((1, 1), 0.1)]
+        AssignmentMatching().match(ratios)
+        => [((0, 1), 0.8), ((1, 0), 0.8)]
+    """
 
+    @staticmethod
+    def _solve(cost: list[list[float]]) -> list[int]:
+        """
+        Minimizes the sum of `cost` and returns the column index assigned to each row.
+        It requires len(cost) <= len(cost[0]).
+        """
+        n, m = len(cost), len(cost[0])
+        inf = float('inf')
+        # potentials of rows and columns, p[j] is row (1-based) assigned to column j, column 0 is fictive
+        u, v, p, way = [.0] * (n + 1), [.0] * (m + 1), [0] * (m + 1), [0] * (m + 1)
+        for i in range(1, n + 1):
+            p[0], j0 = i, 0
+            minv, used = [inf] * (m + 1), [False] * (m + 1)
+            while True:
+                used[j0] = True
+                i0, delta, j1 = p[j0], inf, 0
+                cost_row, ui0 = cost[p[j0] - 1], u[p[j0]]
+                for j in range(1, m + 1):
+                    if not used[j]:
+                        cur = cost_row[j - 1] - ui0 - v[j]
+                        if cur < minv[j]:
+                            minv[j], way[j] = cur, j0
+                        if minv[j] < delta:
+                            delta, j1 = minv[j], j
+                for j in range(m + 1):
+                    if used[j]:
+                        u[p[j]] += delta
+                        v[j] -= delta
+                    else:
+                        minv[j] -= delta
+                j0 = j1
+                if p[j0] == 0:
+                    break
+            # augmenting
+            while j0:
+                j1 = way[j0]
+                p[j0] = p[j1]
+                j0 = j1
+
+        res = [-1] * n
+        for j in range(1, m + 1):
+            if p[j]:
+                res[p[j] - 1] = j - 1
+        return res
+
+    def match(self, ratios: dict[tuple[int, int], float]) -> Matches:
+        # Not acceptable pairs can't be matched, so they don't take part in the assignment at all
+        ratios = {usi: r for usi, r in ratios.items() if self.is_acceptable(r)}
+        res = GreedyMatching().match({usi: r for usi, r in ratios.items() if r == 1})
+        matched_u, matched_s = {ui for (ui, _), _ in res}, {si for (_, si), _ in res}
+
+        u_ids = sorted({ui for ui, _ in ratios} - matched_u)
+        s_ids = sorted({si for _, si in ratios} - matched_s)
+        if not (u_ids and s_ids):
+            return res
+
+        # The pairs which are absent cost the same as unmatched ones
+        cost = [[-ratios.get((ui, si), .0) for si in s_ids] for ui in u_ids]
+        transposed = len(u_ids) > len(s_ids)
+        if transposed:
+            cost = [list(col) for col in zip(*cost)]
+
+        assigned = []
+        for i, j in enumerate(self._solve(cost)):
+            ui, si = (u_ids[j], s_ids[i]) if transposed else (u_ids[i], s_ids[j])
+            r = ratios.get((ui, si))
+            if r is not None:
+                assigned.append(((ui, si), r))
+
+        res.extend(sorted(assigned, key=lambda m: (-m[1], m[0])))
         return res
 
 
@@ -284,14 +944,35 @@ class DataMatcher:
     """
 
     ratio_round_precision = DictComparer.ratio_round_precision
-
-    def __init__(self, s: list[dict], u: list[dict]):
+    ratio_matrix_class = RatioMatrix
+    matching_strategy: MatchingStrategy = GreedyMatching()
+    # If True and `matching_strategy.min_ratio` is set, then the pairs that can't reach `min_ratio`
+    # (by upper bound of the ratio) are not computed (see RatioMatrix). Results are the same.
+    prune_ratios = False
+    # If len(u) * len(s) is not less than `blocking_min_pairs` then the ratios are computed only for
+    # the candidate pairs from `blocking_index_class` (the equal rows are always matched without comparison).
+    # It is approximate, the pairs that have almost nothing in common are never matched
+    # (such `u` rows become 'i' instead of 'u'), thus the subclasses must opt in explicitly.
+    # It does not suit the rows that are identified by short keys and have a long varying field
+    # (the n-grams of a changed long text dominate, the stored row is not a candidate anymore).
+    # None (default) - always exhaustive comparison.
+    blocking_index_class = NGramIndex
+    blocking_min_pairs: Optional[int] = None
+    # If it is set, the ratios are computed by blocks of rows in separate processes (see ParallelExecution)
+    parallel: Optional[ParallelExecution] = None
+
+    def __init__(self, s: list[dict], u: list[dict], matching_strategy: Optional[MatchingStrategy] = None):
         """
             - s is "source/stored data"
             - u is "update/up-to-date data"
+            - matching_strategy, if it is None then will be used the class level `matching_strategy`
         """
         self.s: list[dict] = s
         self.u: list[dict] = u
+        if matching_strategy is not None:
+            self.matching_strategy = matching_strategy
+        # how many full `SequenceMatcher.ratio()` computations were avoided by pruning during the last match
+        self.avoided_ratio_count = 0
 
     def _prepare_stored_dict(self, s: dict) -> dict:
         """
@@ -313,6 +994,84 @@ class DataMatcher:
             if v is not None:
                 excludes.setdefault(k, set()).add(v)
 
+    def _get_ratio_matrix(self, u_rows: list[dict], s_rows: list[dict],
+                          candidates: Optional[list[set[int]]] = None) -> RatioMatrix:
+        """
+            Returns the `ratio_matrix_class` instance for prepared rows `u_rows` and `s_rows`.
+        """
+        rm = self.ratio_matrix_class(
+            u_rows, s_rows, self.matching_strategy.min_ratio if self.prune_ratios else None, candidates, self.parallel
+        )
+        rm.ratio_round_precision = self.ratio_round_precision
+        return rm
+
+    def _is_blocking(self, u_count: int, s_count: int) -> bool:
+        return self.blocking_min_pairs is not None and u_count * s_count >= self.blocking_min_pairs
+
+    def _get_candidates(self, index: NGramIndex, u_rows: list[dict], s_positions: list[int]) -> list[set[int]]:
+        """
+            Returns the candidates for each of `u_rows`,
+             `index` is built over all prepared `s` rows and `s_positions` are the positions of compared ones in it,
+             the candidates are positions in `s_positions`
+        """
+        pos_map = {pos: i for i, pos in enumerate(s_positions)}
+        return [{pos_map[pos] for pos in index.candidates(u_row) if pos in pos_map} for u_row in u_rows]
+
+    def _iter_ratios(self, excludes: dict[str, set[int]], maxes: list[tuple[tuple[int, int], float]],
+                     ratios: dict[tuple[int, int], float], prepare_u: Optional[bool] = True,
+                     prepare_s: Optional[bool] = True) -> Iterator[tuple[tuple[int, int], float]]:
+        """
+            Generator version of `._get_ratios`, it fills `ratios` and yields each match with `ratio` == 1.0
+            as soon as it is found:
+             - the equal rows are matched by `blocking_index_class.exact()` before any ratio is computed,
+               their rows and columns are not compared at all
+             - the rows that are equal after rounding are found while the matrix of the rest is scanned
+        """
+        u_ids = [ui for ui in range(len(self.u)) if ui not in excludes.get('u', set())]
+        s_ids = [si for si in range(len(self.s)) if si not in excludes.get('s', set())]
+        if not (u_ids and s_ids):
+            return
+
+        u_rows = [self._prepare_update_dict(self.u[ui]) if prepare_u else self.u[ui] for ui in u_ids]
+        s_rows = [self._prepare_stored_dict(self.s[si]) if prepare_s else self.s[si] for si in s_ids]
+
+        # exact-match fast path
+        index = self.blocking_index_class(s_rows)
+        for ui, u_row in zip(u_ids, u_rows):
+            for pos in index.exact(u_row):
+                si = s_ids[pos]
+                if si not in excludes.get('s', set()):
+                    self._exclude(ui, si, excludes)
+                    ratios[ui, si] = 1.0
+                    maxes.append(((ui, si), 1.0))
+                    yield (ui, si), 1.0
+                    break
+
+        u_pos = [pos for pos, ui in enumerate(u_ids) if ui not in excludes.get('u', set())]
+        s_pos = [pos for pos, si in enumerate(s_ids) if si not in excludes.get('s', set())]
+        if not (u_pos and s_pos):
+            return
+
+        u_ids, u_rows = [u_ids[pos] for pos in u_pos], [u_rows[pos] for pos in u_pos]
+        candidates = None
+        if self._is_blocking(len(u_ids), len(s_pos)):
+            candidates = self._get_candidates(index, u_rows, s_pos)
+        s_ids, s_rows = [s_ids[pos] for pos in s_pos], [s_rows[pos] for pos in s_pos]
+
+        rm = self._get_ratio_matrix(u_rows, s_rows, candidates)
+        for ui, matrix_row in zip(u_ids, rm.matrix):
+            for si, ratio in zip(s_ids, matrix_row):
+                if si in excludes.get('s', set()) or ratio is None:
+                    # excluded or pruned
+                    continue
+                ratios[ui, si] = ratio
+                if ratio == 1:
+                    self._exclude(ui, si, excludes)
+                    maxes.append(((ui, si), ratio))
+                    yield (ui, si), ratio
+                    break
+        self.avoided_ratio_count += rm.avoided_ratio_count
+
     def _get_ratios(self, excludes: dict[str, set[int]], maxes: list[tuple[tuple[int, int], float]],
                     prepare_u: Optional[bool] = True, prepare_s: Optional[bool] = True) -> dict[tuple[int,int], float]:
         """
@@ -322,80 +1081,36 @@ class DataMatcher:
              will also add information into `excludes` and `maxes`
             If `excludes` has information it will also not calculate the ratio
              for these rows (u) or column (s) independently
+
+            Under the hood, the equal rows are matched without comparison, then all ratios of not excluded
+            rows and columns are computed in one batched pass by `ratio_matrix_class` (see `._iter_ratios`).
+            Each row is prepared (._prepare_update_dict, ._prepare_stored_dict) only once.
+            For big inputs only the candidate pairs are computed (see `blocking_min_pairs`).
         """
         ratios = {}  # { (ui, si): ratio, ..... }
-        dc = DictComparer({})
-        for ui, u in enumerate(self.u):
-            if ui in excludes.get('u', set()):
-                continue
-            dc.set_d(self._prepare_update_dict(u) if prepare_u else u)
-            dc.ratio_round_precision = self.ratio_round_precision
-
-            for si, s in enumerate(self.s):
-                if si in excludes.get('s', set()):
-                    continue
-                dc_infos = dc.compare([self._prepare_stored_dict(s) if prepare_s else s])
-                ratio = dc_infos[0].ratio
-                if ratio == 1:
-                    self._exclude(ui, si, excludes)
-                    # add to result
-                    ratios[ui, si] = ratio
-                    maxes.append(((ui, si), ratio))
-                    break
-                ratios[ui, si] = ratio
+        for _ in self._iter_ratios(excludes, maxes, ratios, prepare_u, prepare_s):
+            pass
         return ratios
 
-    def _get_maxed(self, ratios, excludes: dict[str, set[int]]) -> list[tuple[tuple[int, int], float]]:
+    def _get_matches(self, prepare_u: Optional[bool] = True, prepare_s: Optional[bool] = True) -> list[tuple[tuple[int, int], float]]:
         """
-            Get information of the elements that have the max `ratio`-s.
-            It takes into account the `excludes` information but does not modify it.
-            Result, can have the ambiguous values, so you should apply _remove_ambiguity() after.
-            These 2 method are not combined into one for testing and flexibility purposes.
+            The matches are selected from ratios by `matching_strategy` (GreedyMatching by default).
         """
-        result = []
-        for (ui, si), r in ratios.items():
-            if ui in excludes.get('u', set()) or si in excludes.get('s', set()):
-                continue
-            if not result:
-                result.append(((ui, si), r))
-            elif result[0][1] <= r:
-                if result[0][1] < r:
-                    result.clear()
-                result.append(((ui, si), r))
-        return result
-
-    def _remove_ambiguity(self, maxes: list[tuple[tuple[int, int], float]]) -> list[tuple[tuple[int, int], float]]:
-        res = []
-        if maxes:
-            cur = maxes.pop(0)
-            res.append(cur)
-            mlen = len(maxes)
-            while maxes and mlen > 0:
-                (ui, si), r = maxes[mlen-1]
-                if cur[0][0] == ui or cur[0][1] == si:
-                    cross = maxes.pop(mlen-1)
-                    assert cross[1] == cur[1], f"Warning: ratios [{cross[1]}:{cur[1]}] must be equal"
-                mlen -= 1
-            res.extend(self._remove_ambiguity(maxes))
-        return res
+        return list(self._iter_matches(prepare_u, prepare_s))
 
-    def _get_matches(self, prepare_u: Optional[bool] = True, prepare_s: Optional[bool] = True) -> list[tuple[tuple[int, int], float]]:
+    def _iter_matches(self, prepare_u: Optional[bool] = True,
+                      prepare_s: Optional[bool] = True) -> Iterator[tuple[tuple[int, int], float]]:
         excludes: dict[str, set[int]] = {}  # {'u': {u_index1, u_index2, ...}, 's': {s_index1, s_index2, ...}}
         maxes: list[tuple[tuple[int, int], float]] = []  # [((ui, si), r), ... ]
-        ratios = self._get_ratios(excludes, maxes, prepare_u, prepare_s)
-        matches = []
-        # if there isn't exist at least one item with `ratio` == 1.0 we need to re-retrieve `maxes`
-        if ratios and not maxes:
-            maxes = self._get_maxed(ratios, excludes)
-
-        while maxes:
-            maxes = self._remove_ambiguity(maxes)
-            matches.extend(maxes)
-            for (ui, si), r in maxes:
-                excludes.setdefault('u', set()).add(ui)
-                excludes.setdefault('s', set()).add(si)
-            maxes = self._get_maxed(ratios, excludes)
-        return matches
+        ratios: dict[tuple[int, int], float] = {}  # { (ui, si): ratio, ..... }
+        self.avoided_ratio_count = 0
+        # the matches with ratio 1.0 are final as soon as they are found
+        yield from self._iter_ratios(excludes, maxes, ratios, prepare_u, prepare_s)
+
+        u_excludes, s_excludes = excludes.get('u', set()), excludes.get('s', set())
+        yield from self.matching_strategy.iter_match(
+            {(ui, si): r for (ui, si), r in ratios.items() if ui not in u_excludes and si not in s_excludes}
+        )
 
     def match(self, prepare_u: bool = True, prepare_s: bool = True) -> dict[str, list[tuple[int, int], float]]:
         """
@@ -421,29 +1136,38 @@ class DataMatcher:
         """
         # keys is 'u' - to update, 'i' - to insert/new, 'd' - `s` contains extra, 'n' - equal/nothing to do
         res: dict[str, list] = {k: [] for k in 'uidn'}
+        for kind, usi, r in self.iter_match(prepare_u, prepare_s):
+            res[kind].append((usi, r))
+
+        return res
+
+    def iter_match(self, prepare_u: bool = True, prepare_s: bool = True) -> Iterator[tuple[str, tuple, float]]:
+        """
+        Generator version of `.match()`, it yields 3-tuples (kind, coordinates, ratio), where `kind` is
+        the key of `.match()` result ('u', 'i', 'd', 'n').
+
+        The equal rows ('n') are yielded as soon as they are found, before the ratios of the rest are computed
+        (see `._iter_ratios`), then the ratios of the rest are matched by `matching_strategy` and
+        'n' and 'u' are yielded as soon as they are final (for GreedyMatching it is the order of decreasing ratio).
+        'i' and 'd' are known only when all matches are done, therefore they are yielded at the end.
+        """
         if not (self.s and self.u):
             if self.s:
-                res['d'].extend(((None, si), 1.0) for si, _ in enumerate(self.s))
+                yield from (('d', (None, si), 1.0) for si, _ in enumerate(self.s))
             else:
-                res['i'].extend(((ui, None), 1.0) for ui, _ in enumerate(self.u))
-            return res
+                yield from (('i', (ui, None), 1.0) for ui, _ in enumerate(self.u))
+            return
 
-        matches = self._get_matches(prepare_u, prepare_s)
         u_set, s_set = set(), set()
-        for (ui, si), r in matches:
+        for (ui, si), r in self._iter_matches(prepare_u, prepare_s):
             u_set.add(ui)
             s_set.add(si)
-            if r == 1:
-                res['n'].append(((ui, si), r))
-            else:
-                res['u'].append(((ui, si), r))
+            yield 'n' if r == 1 else 'u', (ui, si), r
 
         # if result has no some indexes from self.u therefore this items are new => to insert
-        res['i'].extend(((ui, None), 1.0) for ui in set(range(len(self.u))) - u_set)
+        yield from (('i', (ui, None), 1.0) for ui in set(range(len(self.u))) - u_set)
         # if result has no some indexes from self.s therefore this items are not correlate to u items => to remove
-        res['d'].extend(((None, si), 1.0) for si in set(range(len(self.s))) - s_set)
-
-        return res
+        yield from (('d', (None, si), 1.0) for si in set(range(len(self.s))) - s_set)
 
 
 class DataComparer:
@@ -467,6 +1191,12 @@ class DataComparer:
     #   As a result, it will have 'Django Framework' instead of 'Django'. On the next run, value will be switched back.
     ratio_range_to_update = (.75, .999999)
 
+    # If True then only the best ratio for each row of `u` is computed (see DictComparer.best)
+    # and the full ratio is not computed for the rows of `s` that can't beat the running best.
+    prune_ratios = False
+    # If it is set, the rows of `u` are compared by blocks in separate processes (see ParallelExecution)
+    parallel: Optional[ParallelExecution] = None
+
     def __init__(self, s: list, u: list, pk_field_name: Optional[str] = None):
         """
             - s is "stored data"
@@ -475,6 +1205,8 @@ class DataComparer:
         if not pk_field_name:
             self.pk_field_name = type(self).pk_field_name
         self.s, self.u = s, u
+        # how many full `SequenceMatcher.ratio()` computations were avoided by pruning during the last compare
+        self.avoided_ratio_count = 0
 
     def _prepare_stored_dict(self, s: dict) -> dict:
         """
@@ -513,24 +1245,58 @@ class DataComparer:
         and value is a list of ComparedItemInfoClass for each of self.s
 
         Internally, it passes through self.u and compares each value of `u` to each value in self.s
+
+        If `.prune_ratios` is True then the value contains only the best ComparedItemInfoClass.
         """
         res = {}
+        self.avoided_ratio_count = 0
 
         if not self.s:
             return res
 
         s = [self._prepare_stored_dict(s) if prep_s else s for s in self.s]
-        for ui, uitem in enumerate(self.u):
-            s_exclude_ids = []
-            dc_item = DictComparer(self._prepare_update_dict(uitem) if prep_u else uitem)
-            dc_infos = dc_item.compare(s, s_exclude_ids)
+        u = [self._prepare_update_dict(uitem) if prep_u else uitem for uitem in self.u]
+        cache = SerializationCache()
+        if self.parallel is not None and self.parallel.is_parallel(len(u), len(s)):
+            rows = []
+            for block in self.parallel.map(
+                type(self)._calc_rows,
+                [u[chunk.start:chunk.stop] for chunk in self.parallel.chunks(len(u))],
+                itertools.repeat(s),
+                itertools.repeat(self.prune_ratios)
+            ):
+                rows.extend(block)
+        else:
+            rows = self._calc_rows(u, s, self.prune_ratios, cache)
+
+        for ui, (ratios, avoided_ratio_count) in enumerate(rows):
+            dc_item = DictComparer(u[ui], cache=cache)
+            # hashes are calculated in the current process, `hash()` of str differs between processes
+            dc_infos = [ComparedItemInfoClass(ratio=r, idx=si, hash=cache.fingerprint(dc_item, s[si])) for si, r in ratios]
+            self.avoided_ratio_count += avoided_ratio_count
             max_ratio_info = functools.reduce(lambda m, n: m if m.ratio >= n.ratio else n, dc_infos)
-            if max_ratio_info.ratio == 1:
-                s_exclude_ids.append(max_ratio_info.idx)
             res[ui, max_ratio_info] = dc_infos
 
         return res
 
+    @staticmethod
+    def _calc_rows(u: list[dict], s: list[dict], prune_ratios: bool,
+                   cache: Optional[SerializationCache] = None) -> list[tuple[list[tuple[int, float]], int]]:
+        """
+        It computes ratios of each `u` row with rows of `s` - [([(si, ratio), ...], avoided_ratio_count), ...]
+        If `prune_ratios` is True then only the best ratio of the row is computed.
+        """
+        cache = SerializationCache() if cache is None else cache
+        res = []
+        for uitem in u:
+            dc_item = DictComparer(uitem, cache=cache)
+            if prune_ratios:
+                best = dc_item._get_best_ratio(s)
+                res.append(([] if best is None else [best], dc_item.avoided_ratio_count))
+            else:
+                res.append((dc_item._get_ratios(s), 0))
+        return res
+
     def prepare_to_update(self) -> list[dict]:
         """
             return: tuple Ready to update dictionary and ratios for string values
@@ -616,6 +1382,22 @@ class CompleteDataComparer(DataMatcher):
         # 'n' and 'd' are ignoring to be compatible with old implementation (DataComparer)
         return res
 
+    def iter_prepare_to_update(self) -> Iterator[dict]:
+        """
+            Generator version of `.prepare_to_update()`, it yields the dictionaries as soon as they are final.
+            Updates go first (in the order of `.iter_match()`), inserts go at the end.
+            !!! Delete is disabled
+        """
+        for kind, (ui, si), r in self.iter_match():
+            if kind == 'u':
+                u = self._prepare_update_dict(self.u[ui])
+                sid = self.s[si].get(self.pk_field_name)
+                assert sid is not None, "For an update action the ID must be not None"
+                u[self.pk_field_name] = sid
+                yield u
+            elif kind == 'i':
+                yield self._prepare_update_dict(self.u[ui])
+
 
 DateRanges = Sequence[
     Union[
@@ -626,6 +1408,120 @@ DateRanges = Sequence[
 ]
 
 
+class IntervalIndex:
+    """
+    Index over the closed integer intervals [begin, end] (ordinals of dates, see `DateRangeCrossing._normalize_dbe`).
+    Intervals are sorted by `begin` once and a segment tree keeps the max `end` for each node,
+    thus all intervals crossed with [b, e] are found in O(log(n) + k), where k is the number of found intervals.
+
+    Indexes of intervals (positions in `intervals`) are used everywhere.
+
+        index = IntervalIndex([(1, 5), (3, 4), (6, 9), (5, 5)])
+        index.crossings()
+        => [[1, 3], [0], [], [0]]
+        index.query(4, 6)
+        => [0, 1, 3, 2]
+        index.split([0, 1, 2, 3])
+        => ([0, 2], [1, 3])
+    """
+
+    def __init__(self, intervals: Sequence[tuple[int, int]]) -> None:
+        self.intervals: list[tuple[int, int]] = [tuple(i) for i in intervals]
+        # positions of intervals in the order of (begin, end)
+        self.order: list[int] = sorted(range(len(self.intervals)), key=lambda i: self.intervals[i])
+        self.begins: list[int] = [self.intervals[i][0] for i in self.order]
+        self._size = 1
+        while self._size < len(self.order):
+            self._size *= 2
+        self._tree: list[Optional[int]] = []
+        self._reset()
+
+    def _reset(self, alive: Optional[Iterable[int]] = None) -> None:
+        """
+        Builds the tree of max `end`-s. If `alive` is not None then only these intervals are present in the tree.
+        """
+        tree = [None] * (2 * self._size)
+        alive = None if alive is None else set(alive)
+        for pos, i in enumerate(self.order):
+            if alive is None or i in alive:
+                tree[self._size + pos] = self.intervals[i][1]
+        for node in range(self._size - 1, 0, -1):
+            tree[node] = max((v for v in (tree[2 * node], tree[2 * node + 1]) if v is not None), default=None)
+        self._tree = tree
+
+    def _remove(self, pos: int) -> None:
+        node = self._size + pos
+        self._tree[node] = None
+        node //= 2
+        while node:
+            tree = self._tree
+            tree[node] = max((v for v in (tree[2 * node], tree[2 * node + 1]) if v is not None), default=None)
+            node //= 2
+
+    def _find(self, b: int, e: int) -> list[int]:
+        """
+        Returns the positions (in `self.order`) of intervals present in the tree that are crossed with [b, e]
+        """
+        hi = bisect.bisect_right(self.begins, e)
+        res, stack = [], [(1, 0, self._size)]
+        while stack:
+            node, lo, node_hi = stack.pop()
+            if lo >= hi or self._tree[node] is None or self._tree[node] < b:
+                continue
+            if node >= self._size:
+                res.append(lo)
+                continue
+            mid = (lo + node_hi) // 2
+            stack.append((2 * node + 1, mid, node_hi))
+            stack.append((2 * node, lo, mid))
+        return res
+
+    def query(self, b: int, e: int) -> list[int]:
+        """
+        Returns indexes of intervals crossed with [b, e] in the order of (begin, end)
+        """
+        return [self.order[pos] for pos in self._find(b, e)]
+
+    def crossings(self) -> list[list[int]]:
+        """
+        Returns for each interval the sorted list of indexes of other intervals that are crossed with it.
+        Each crossed pair is found once by the sweep over the intervals sorted by `begin`:
+        all intervals that begin in [b, e] of the current one are crossed with it.
+        """
+        res = [[] for _ in self.intervals]
+        for pos, i in enumerate(self.order):
+            hi = bisect.bisect_right(self.begins, self.intervals[i][1])
+            for j in self.order[pos + 1:hi]:
+                res[i].append(j)
+                res[j].append(i)
+        for crossed in res:
+            crossed.sort()
+        return res
+
+    def split(self, ids: list[int]) -> tuple[list[int], list[int]]:
+        """
+        Greedy split of `ids` in their order: the current interval goes to `uncrossed`,
+        all the rest intervals crossed with it go to `crossed` (in the order of `ids`) and are not processed anymore.
+        """
+        self._reset(ids)
+        position = {i: pos for pos, i in enumerate(self.order)}
+        ids_order = {i: k for k, i in enumerate(ids)}
+        uncrossed, crossed = [], []
+        for i in ids:
+            pos = position[i]
+            if self._tree[self._size + pos] is None:
+                # already crossed
+                continue
+            self._remove(pos)
+            uncrossed.append(i)
+            found = self._find(*self.intervals[i])
+            for pos in found:
+                self._remove(pos)
+            crossed.extend(sorted((self.order[pos] for pos in found), key=ids_order.__getitem__))
+        self._reset()
+        return uncrossed, crossed
+
+
 class DateRangeCrossing:
     """
         each element (item) of date_ranges must be well formatted - tuple or list (sequence) with 2 elements
@@ -689,19 +1585,18 @@ class DateRangeCrossing:
         (b, e), (B, E) = self._normalize_dbe(a), self._normalize_dbe(b)
         return B <= e and E >= b
 
+    def _get_interval_index(self, dates) -> IntervalIndex:
+        return IntervalIndex([self._normalize_dbe(dbe) for dbe in dates])
+
     def _calc_crossings(self, min_crossing_sort=False) -> dict[Union[list, tuple], list]:
         """
-            Has complexity O(n^2)
+            Has complexity O(n*log(n) + k), where k is the number of crossings (see IntervalIndex)
             If min_crossing_sort == True then result will sorted by [less_crossed .... most_crossed]
         """
         res = {}
-        for i, cur in enumerate(self.date_ranges):
-            crossings = res.setdefault(cur, [[], i])
-            for j, other in enumerate(self.date_ranges):
-                if i == j:
-                    continue
-                if self._is_crossed(cur, other):
-                    crossings[0].append(other)
+        date_ranges = self.date_ranges
+        for i, crossed in enumerate(self._get_interval_index(date_ranges).crossings()):
+            res.setdefault(date_ranges[i], [[], i])[0].extend(date_ranges[j] for j in crossed)
 
         if min_crossing_sort:
             res = {k: v for k, v in sorted(res.items(), key=lambda kv: len(kv[1][0]))}
@@ -712,22 +1607,10 @@ class DateRangeCrossing:
         """
             In fact, the order of the date ranges in `dates' determines the result.
             This method just separate those who can be `uncrossed`.
+            `dates` is not changed.
         """
-        uncrossed, crossed = [], []
-        while dates:
-            cur = dates.pop(0)
-            uncrossed.append(cur)
-
-            i = 0
-            while i < len(dates):
-                other = dates[i]
-                if self._is_crossed(cur, other):
-                    crossed.append(other)
-                    del dates[i]
-                    continue
-                i += 1
-
-        return uncrossed, crossed
+        uncrossed, crossed = self._get_interval_index(dates).split(list(range(len(dates))))
+        return [dates[i] for i in uncrossed], [dates[i] for i in crossed]
 
     def min_crossings(self):
         """
@@ -764,47 +1647,88 @@ class CrossingType(Enum):
 
 
 class DateRangeMatcher:
+    """
+    `match`/`match_many` find the crossings of all needles by one sweep over the sorted haystack and needles.
+    `match1` indexes the haystack lists (see IntervalIndex), thus each needle finds
+    its crossed haystack items in O(log(n) + k) instead of scanning the whole haystack.
+    """
 
     def __init__(self, haystack: DateRanges, needles: DateRanges) -> None:
         self.haystack = DateRangeCrossing(haystack)
         self.needles = DateRangeCrossing(needles)
 
-    def _calc_crossing_distances(self, haystack: Iterable, needle):
+    @staticmethod
+    def _get_haystack_index(haystack: list) -> IntervalIndex:
+        return IntervalIndex([DateRangeCrossing._normalize_dbe(h) for h in haystack])
+
+    def _calc_crossing_distances(self, haystack: Iterable, needle, index: Optional[IntervalIndex] = None):
         """
             returns list of tuples (distance, haystack_item, description)
             intersections for needle
+
+            If `index` (index of the `haystack` list) is passed then only crossed items are processed,
+            the order of result is the same as the order of `haystack`
         """
         # calculates a max crossing by "distance"
         b, e = DateRangeCrossing._normalize_dbe(needle)
         assert b <= e, f'needle - `begin` > `end` {needle}'
 
+        if index is None:
+            items = ((h, DateRangeCrossing._normalize_dbe(h)) for h in haystack)
+        else:
+            items = ((haystack[i], index.intervals[i]) for i in sorted(index.query(b, e)))
+
         res = []  # (max_distance, original_haystack_item, description)
-        for h in haystack:
-            B, E = DateRangeCrossing._normalize_dbe(h)
-            assert B <= E, f'haystack item - `begin` > `end` {h}'
-            distance = min(E, e) - max(B, b)
-            if distance < 0:
-                # no crossing
-                continue
+        for h, (B, E) in items:
+            crossing = self._get_crossing(b, e, h, B, E)
+            if crossing is not None:
+                res.append(crossing)
 
-            crossing_type = CrossingType.partial
-            if B == b and E == e:
-                crossing_type = CrossingType.exact
-            elif B <= b and E >= e:
-                crossing_type = CrossingType.include
+        return res
 
-            res.append((distance, h, crossing_type))
+    @staticmethod
+    def _get_crossing(b: int, e: int, h, B: int, E: int) -> Optional[tuple]:
+        """
+            (distance, haystack_item, description) of the needle [b, e] and the haystack item `h` [B, E]
+            or None if they are not crossed
+        """
+        assert B <= E, f'haystack item - `begin` > `end` {h}'
+        distance = min(E, e) - max(B, b)
+        if distance < 0:
+            # no crossing
+            return None
 
-        return res
+        crossing_type = CrossingType.partial
+        if B == b and E == e:
+            crossing_type = CrossingType.exact
+        elif B <= b and E >= e:
+            crossing_type = CrossingType.include
 
-    def _calc_max_crossing_distance(self, haystack, needle):
+        return distance, h, crossing_type
+
+    @staticmethod
+    def _get_crossing_priority(crossing: tuple, B: int, E: int, i: int) -> tuple:
+        """
+            The key of the prioritization of `_calc_prioritized_crossing`, the best crossing has the min key.
+            `i` is the position of the haystack item, the first item wins the tie like there.
+        """
+        distance, _, crossing_type = crossing
+        if crossing_type == CrossingType.exact:
+            return 0, i
+        if crossing_type == CrossingType.include:
+            # the narrower one
+            return 1, E - B, i
+        # the max crossing
+        return 2, -distance, i
+
+    def _calc_max_crossing_distance(self, haystack, needle, index: Optional[IntervalIndex] = None):
         res = None
-        crossings = self._calc_crossing_distances(haystack, needle)
+        crossings = self._calc_crossing_distances(haystack, needle, index)
         if crossings:
             res = functools.reduce(lambda c, n: c if c[0] >= n[0] else n, crossings)
         return res
 
-    def _calc_prioritized_crossing(self, haystack: Iterable, needle):
+    def _calc_prioritized_crossing(self, haystack: Iterable, needle, index: Optional[IntervalIndex] = None):
         """
             Returns best case for crossing needle in haystack
             Prioritization:
@@ -815,7 +1739,7 @@ class DateRangeMatcher:
             if 'partial' -> max crossing is better
         """
         crossings = {}
-        for item in self._calc_crossing_distances(haystack, needle):
+        for item in self._calc_crossing_distances(haystack, needle, index):
             crossings.setdefault(item[2], []).append(item)
 
         if not crossings:
@@ -837,36 +1761,78 @@ class DateRangeMatcher:
         if res:
             return res
 
-    def match(self):
+    def match_many(self, needles: Optional[DateRanges] = None):
         """
-        In contrast, `match1` does not search separately in uncrossed and crossed ranges.
-        Although it preserves their order.
-        The subtlety that distinguishes this method is the handling of the `include` crossing.
+        The same as `match` but for any `needles` (self.needles.date_ranges by default).
+
+        It is one sweep (merge pass) over the begins and ends of the haystack items and of the distinct needles
+        sorted together. At the begin of a needle it takes the haystack items that are open at that moment,
+        then, while the needle is open, it takes each haystack item that begins.
+        For each needle only the best crossing is kept (see `_get_crossing_priority`), thus it costs
+        O((n + m) * log(n + m) + k), where k is the number of crossed pairs.
         """
-        res = {}
+        needles = self.needles.date_ranges if needles is None else DateRangeCrossing(needles).date_ranges
 
         h_uncrossed, h_crossed = self.haystack.crossings()
-
-        for needle in self.needles.date_ranges:
-            m = self._calc_prioritized_crossing(itertools.chain(h_uncrossed, h_crossed), needle)
-            if m:
-                res[needle] = m
+        haystack = [*h_uncrossed, *h_crossed]
+        h_bes = [DateRangeCrossing._normalize_dbe(h) for h in haystack]
+        n_bes = {needle: DateRangeCrossing._normalize_dbe(needle) for needle in needles}
+
+        # at the same date: the haystack items begin, the needles begin, the needles end, the haystack items end
+        # (the ranges are closed, the touching ones are crossed)
+        events = [(B, 0, i) for i, (B, E) in enumerate(h_bes)] + [(E, 3, i) for i, (B, E) in enumerate(h_bes)]
+        for ni, (needle, (b, e)) in enumerate(n_bes.items()):
+            assert b <= e, f'needle - `begin` > `end` {needle}'
+            events.extend(((b, 1, ni), (e, 2, ni)))
+        events.sort()
+
+        n_items = list(n_bes.items())
+        best = {}  # {ni: (priority, crossing), ...}
+        open_h, open_n = set(), set()
+
+        def offer(ni: int, hi: int):
+            (b, e), (B, E) = n_items[ni][1], h_bes[hi]
+            crossing = self._get_crossing(b, e, haystack[hi], B, E)
+            priority = self._get_crossing_priority(crossing, B, E, hi)
+            if ni not in best or priority < best[ni][0]:
+                best[ni] = (priority, crossing)
+
+        for _, kind, i in events:
+            if kind == 0:
+                open_h.add(i)
+                for ni in open_n:
+                    offer(ni, i)
+            elif kind == 1:
+                open_n.add(i)
+                for hi in open_h:
+                    offer(i, hi)
+            elif kind == 2:
+                open_n.discard(i)
             else:
-                res[needle] = None
+                open_h.discard(i)
 
-        return res
+        return {needle: best[ni][1] if ni in best else None for ni, (needle, _) in enumerate(n_items)}
+
+    def match(self):
+        """
+        In contrast, `match1` does not search separately in uncrossed and crossed ranges.
+        Although it preserves their order.
+        The subtlety that distinguishes this method is the handling of the `include` crossing.
+        """
+        return self.match_many()
 
     def match1(self):
         res = {}
 
         h_uncrossed, h_crossed = self.haystack.min_crossings()
+        uncrossed_index, crossed_index = self._get_haystack_index(h_uncrossed), self._get_haystack_index(h_crossed)
         for needle in self.needles.date_ranges:
-            m_uncrossed = self._calc_prioritized_crossing(h_uncrossed, needle)
+            m_uncrossed = self._calc_prioritized_crossing(h_uncrossed, needle, uncrossed_index)
             if m_uncrossed and m_uncrossed[2] in (CrossingType.exact, CrossingType.include):
                 res[needle] = m_uncrossed
                 continue
 
-            m_crossed = self._calc_prioritized_crossing(h_crossed, needle)
+            m_crossed = self._calc_prioritized_crossing(h_crossed, needle, crossed_index)
             if m_crossed and m_crossed[2] in (CrossingType.exact, CrossingType.include):
                 res[needle] = m_crossed
                 continue
@@ -0,0 +1,63 @@
+# IDE: PyCharm
+# Project: cv
+# Path: apps/cv/management/commands
+# File: benchcompare.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 11:25 AM
+
+import argparse
+
+from django.core.management import BaseCommand, CommandError
+
+from apps.cv.benchmarks.compare import CompareBenchmark
+from apps.cv.benchmarks.data import Similarity
+
+
+class Command(BaseCommand):
+    help = "Benchmarks apps.cv.compare on synthetic (Faker) data, optionally saves results and checks regressions"
+
+    def add_arguments(self, parser: argparse.ArgumentParser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=list(CompareBenchmark.sizes),
+                            help="Numbers of rows (10 ... 10000)")
+        parser.add_argument("--repeat", type=int, default=CompareBenchmark.repeat)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--exact", type=float, default=Similarity().exact,
+                            help="Part of update rows that are equal to stored rows")
+        parser.add_argument("--similar", type=float, default=Similarity().similar,
+                            help="Part of update rows that are modified copies of stored rows")
+        parser.add_argument("--name", action="append", dest="names", help="Benchmark only these entry points")
+        parser.add_argument("--output", type=str, help="Path of JSON file to save the results")
+        parser.add_argument("--baseline", type=str, help="Path of JSON file with results to compare with")
+        parser.add_argument("--max-slowdown", type=float, default=1.5,
+                            help="Fail if any result is slower than baseline more than this times")
+
+    def handle(self, *args, **options):
+        if not 0 <= options['exact'] + options['similar'] <= 1:
+            raise CommandError('--exact plus --similar must be in the range [0, 1]')
+
+        bench = CompareBenchmark(
+            options['sizes'], options['repeat'], options['seed'],
+            Similarity(options['exact'], options['similar']), options['names']
+        )
+
+        results = []
+        for r in bench.iter_run():
+            results.append(r)
+            self.stdout.write(
+                f'{r.name:<40} {r.size:>6} rows {r.seconds * 1000:>12.3f} ms {r.ops_per_sec:>12.2f} ops/s'
+                f' {r.rows_per_sec:>14.1f} rows/s {r.peak_memory / 1024:>12.1f} KiB'
+            )
+
+        if options['output']:
+            bench.save(results, options['output'])
+            self.stdout.write(self.style.SUCCESS(f'Results are saved into {options["output"]}'))
+
+        if options['baseline']:
+            regressions = bench.regressions(bench.load(options['baseline']), results, options['max_slowdown'])
+            for b, r, slowdown in regressions:
+                self.stdout.write(self.style.ERROR(
+                    f'{r.name} [{r.size} rows]: {b.seconds * 1000:.3f} ms -> {r.seconds * 1000:.3f} ms ({slowdown:.2f}x)'
+                ))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS('No regressions'))
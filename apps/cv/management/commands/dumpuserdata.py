@@ -0,0 +1,249 @@
+# IDE: PyCharm
+# Project: cv
+# Path: apps/cv/management/commands
+# File: dumpuserdata.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 5:40 PM
+
+import argparse
+import json
+from itertools import groupby
+from typing import Iterable, Iterator, Optional
+
+from django.core.management import BaseCommand, CommandError
+from django.core.management.base import OutputWrapper
+from django.db.models import Prefetch, QuerySet
+from django.utils.duration import duration_string
+
+from apps.cv import models
+
+
+class CVDumper:
+    """
+        Builds the `my_cv.json`-shaped document (the input of `loaduserdata`) for each profile.
+
+        All sections are prefetched for `chunk_size` profiles at once, thus the number of SQL queries
+        does not depend on the amount of data: 1 + len(prefetch) queries per chunk.
+        Only one chunk of profiles is kept in memory.
+
+            dumper = CVDumper()
+            for profile in dumper.iter_profiles(['test_user']):
+                cv = dumper.get_cv(profile)
+    """
+
+    chunk_size = 100
+
+    # (section, order of rows)
+    prefetch = (
+        ('cveducation_set', ('begin', 'pk')),
+        ('cvhobby_set', ('pk', )),
+        ('cvlanguage_set', ('pk', )),
+        ('cvworkplace_set', ('begin', 'pk')),
+        ('cvworkplace_set__cvworkplaceresponsibility_set', ('begin', 'pk')),
+        ('cvproject_set', ('begin', 'pk')),
+        ('cvproject_set__cvprojecttechnology_set', ('duration', 'notes', 'pk')),
+        ('cvuserresource_set', ('pk', )),
+        ('cvtechnologies_set', ('technology_type', 'technology', 'pk')),
+    )
+
+    # the related objects that are joined to the rows of a section
+    select_related = {
+        'cvproject_set__cvprojecttechnology_set': ('technology', ),
+        'cvuserresource_set': ('resource', ),
+    }
+
+    def __init__(self, photo: bool = True) -> None:
+        """
+            photo - dump a path of the photo file (loaduserdata reads it) otherwise `null`
+        """
+        self.photo = photo
+
+    def get_prefetch(self) -> list[Prefetch]:
+        res = []
+        for lookup, ordering in self.prefetch:
+            model = models.CVUserProfile
+            for name in lookup.split('__'):
+                model = model._meta.get_field(name.removesuffix('_set')).related_model
+            qs = model.objects.order_by(*ordering)
+            if lookup in self.select_related:
+                qs = qs.select_related(*self.select_related[lookup])
+            res.append(Prefetch(lookup, queryset=qs))
+        return res
+
+    def get_queryset(self, usernames: Optional[Iterable[str]] = None) -> QuerySet:
+        qs = models.CVUserProfile.objects.select_related('user').prefetch_related(*self.get_prefetch())
+        if usernames is not None:
+            qs = qs.filter(user__username__in=usernames)
+        return qs.order_by('user__username')
+
+    def iter_profiles(self, usernames: Optional[Iterable[str]] = None) -> Iterator[models.CVUserProfile]:
+        return self.get_queryset(usernames).iterator(chunk_size=self.chunk_size)
+
+    @staticmethod
+    def date(value) -> Optional[str]:
+        return None if value is None else value.isoformat()
+
+    def get_profile(self, profile: models.CVUserProfile) -> dict:
+        photo = None
+        if self.photo and profile.photo:
+            photo = profile.photo.path
+        return {
+            'photo': photo,
+            'birthday': self.date(profile.birthday),
+            'soft_skill': profile.soft_skill,
+            'summary_qualification': profile.summary_qualification,
+            'position': profile.position,
+            'cover_letter': profile.cover_letter,
+        }
+
+    def get_education(self, profile: models.CVUserProfile) -> list[dict]:
+        return [{
+            'begin': self.date(e.begin),
+            'end': self.date(e.end),
+            'degree': e.degree,
+            'speciality': e.speciality,
+            'institution': e.institution,
+            'complete': e.complete,
+            'allow_date_crossing': e.allow_date_crossing,
+        } for e in profile.cveducation_set.all()]
+
+    def get_hobby(self, profile: models.CVUserProfile) -> list[dict]:
+        return [{'description': h.description} for h in profile.cvhobby_set.all()]
+
+    def get_language(self, profile: models.CVUserProfile) -> list[dict]:
+        return [{'lang': lang.lang, 'level': lang.level, 'notes': lang.notes} for lang in profile.cvlanguage_set.all()]
+
+    def get_workplace(self, profile: models.CVUserProfile) -> list[dict]:
+        return [{
+            'begin': self.date(wp.begin),
+            'end': self.date(wp.end),
+            'workplace': wp.workplace,
+            'allow_date_crossing': wp.allow_date_crossing,
+        } for wp in profile.cvworkplace_set.all()]
+
+    def get_project(self, profile: models.CVUserProfile) -> list[dict]:
+        return [{
+            'begin': self.date(p.begin),
+            'end': self.date(p.end),
+            'title': p.title,
+            'prerequisite': p.prerequisite,
+            'description': p.description,
+            'result': p.result,
+            'allow_date_crossing': p.allow_date_crossing,
+        } for p in profile.cvproject_set.all()]
+
+    def get_workplace_responsibility(self, profile: models.CVUserProfile) -> list[dict]:
+        # loaduserdata links a responsibility to the workplace by the date range
+        return [{
+            'begin': self.date(wpr.begin),
+            'end': self.date(wpr.end),
+            'responsibility': wpr.responsibility,
+            'role': wpr.role,
+        } for wp in profile.cvworkplace_set.all() for wpr in wp.cvworkplaceresponsibility_set.all()]
+
+    def get_resource(self, profile: models.CVUserProfile) -> list[dict]:
+        return [{'resource': r.resource.resource, 'link': r.link} for r in profile.cvuserresource_set.all()]
+
+    def get_technologies(self, profile: models.CVUserProfile) -> list[models.CVTechnologies]:
+        # own technologies and the common ones (profile is NULL) that are used in the projects
+        techs = {t.pk: t for t in profile.cvtechnologies_set.all()}
+        for p in profile.cvproject_set.all():
+            for pt in p.cvprojecttechnology_set.all():
+                techs.setdefault(pt.technology.pk, pt.technology)
+        return sorted(techs.values(), key=lambda t: (t.technology_type, t.technology, t.pk))
+
+    def get_technology(self, profile: models.CVUserProfile) -> list[dict]:
+        return [
+            {'technology_type': tech_type, 'technology': [t.technology for t in techs]}
+            for tech_type, techs in groupby(self.get_technologies(profile), key=lambda t: t.technology_type)
+        ]
+
+    def get_project_technology(self, profile: models.CVUserProfile) -> list[dict]:
+        """
+            The project is referenced by the exact [begin, end] range and
+            the rows of one project with the same duration are grouped like in my_cv.json
+        """
+        res = []
+        for p in profile.cvproject_set.all():
+            # the rows are already ordered by duration
+            for duration, pts in groupby(p.cvprojecttechnology_set.all(), key=lambda pt: pt.duration):
+                res.append({
+                    'project': [self.date(p.begin), self.date(p.end)],
+                    'technology': [
+                        pt.technology.technology if pt.notes is None else [pt.technology.technology, pt.notes]
+                        for pt in pts
+                    ],
+                    'duration': None if duration is None else duration_string(duration),
+                    'notes': None,
+                })
+        return res
+
+    def get_cv(self, profile: models.CVUserProfile) -> dict:
+        return {
+            'profile': self.get_profile(profile),
+            'education': self.get_education(profile),
+            'hobby': self.get_hobby(profile),
+            'language': self.get_language(profile),
+            'workplace': self.get_workplace(profile),
+            'project': self.get_project(profile),
+            'workplace_responsibility': self.get_workplace_responsibility(profile),
+            'resource': self.get_resource(profile),
+            'technology': self.get_technology(profile),
+            'project-technology': self.get_project_technology(profile),
+        }
+
+    @staticmethod
+    def get_user(profile: models.CVUserProfile) -> dict:
+        user = profile.user
+        return {'username': user.username, 'email': user.email, 'first_name': user.first_name, 'last_name': user.last_name}
+
+
+class Command(BaseCommand):
+    help = "Dumps CV data of users in the shape that `loaduserdata` (one user) or `importuserdata` (JSON lines) takes"
+
+    def add_arguments(self, parser: argparse.ArgumentParser):
+        parser.add_argument(
+            "username", type=str, nargs='*',
+            help="One username dumps the CV itself (like my_cv.json). Many (or none - all users) dump JSON lines"
+                 " of {\"user\": ..., \"cv\": ...} records."
+        )
+        parser.add_argument("-o", "--output", type=str, default='-', help="Output file ('-' is stdout)")
+        parser.add_argument("--indent", type=int, default=None, help="Indent of the single CV document")
+        parser.add_argument("--jsonl", action="store_true", help="JSON lines output even for one user")
+        parser.add_argument("--no-photo", action="store_true", help="Do not dump the path of the photo file")
+
+    def write_cv(self, out: OutputWrapper, cv: dict, indent: Optional[int] = None):
+        # the encoder yields small chunks, thus the whole JSON text is never built in memory
+        for chunk in json.JSONEncoder(indent=indent, ensure_ascii=False).iterencode(cv):
+            out.write(chunk, ending='')
+        out.write('')
+
+    def dump(self, out: OutputWrapper, usernames: Optional[list[str]] = None, jsonl: bool = True,
+             indent: Optional[int] = None, photo: bool = True) -> int:
+        """
+            Writes the CV(s) into `out` and returns the number of the dumped profiles
+        """
+        dumper = CVDumper(photo=photo)
+        count = 0
+        for profile in dumper.iter_profiles(usernames):
+            count += 1
+            if jsonl:
+                self.write_cv(out, {'user': dumper.get_user(profile), 'cv': dumper.get_cv(profile)})
+            else:
+                self.write_cv(out, dumper.get_cv(profile), indent)
+        return count
+
+    def handle(self, *args, **options):
+        usernames = options['username'] or None
+        jsonl = options['jsonl'] or usernames is None or len(usernames) > 1
+
+        if options['output'] == '-':
+            count = self.dump(self.stdout, usernames, jsonl, options['indent'], not options['no_photo'])
+        else:
+            with open(options['output'], 'w') as f:
+                count = self.dump(OutputWrapper(f), usernames, jsonl, options['indent'], not options['no_photo'])
+
+        if usernames is not None and count < len(usernames):
+            raise CommandError(f'Profile does not exist for {len(usernames) - count} of {len(usernames)} user(s)')
+        if options['output'] != '-':
+            self.stdout.write(self.style.SUCCESS(f'Dumped {count} profile(s) into "{options["output"]}"'))
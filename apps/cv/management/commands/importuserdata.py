@@ -0,0 +1,204 @@
+# IDE: PyCharm
+# Project: cv
+# Path: apps/cv/management/commands
+# File: importuserdata.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 4:10 PM
+
+import argparse
+import concurrent.futures
+import io
+import json
+import pathlib
+import sys
+import time
+from collections import namedtuple
+from typing import Iterator, Optional, TextIO, Union
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, connections
+
+from apps.cv.management.commands import loaduserdata
+
+
+class ImportRecord(namedtuple('ImportRecord', 'source user cv error', defaults=(None, ))):
+    """
+        source - where the record is from ("file.json" or "stream:12" - line number)
+        user - username (str) or dict {username, email, password, first_name, last_name}
+        cv - the data in `my_cv.json` shape
+        error - a parse error, the record can not be imported
+    """
+
+    @property
+    def username(self) -> Optional[str]:
+        return self.user.get('username') if isinstance(self.user, dict) else self.user
+
+
+ImportResult = namedtuple('ImportResult', 'source username ok error_count seconds output')
+
+
+class Command(BaseCommand):
+    help = "Imports CV data for many users from a directory of JSON files or a JSON-lines stream of {user, cv} records"
+
+    user_fields = ('email', 'first_name', 'last_name')
+
+    def add_arguments(self, parser: argparse.ArgumentParser):
+        parser.add_argument(
+            "source", type=str,
+            help="A directory of *.json files or a JSON-lines file ('-' is stdin). Each record is {\"user\": ..., \"cv\": ...}."
+                 " A JSON file without \"cv\" is the CV itself (like my_cv.json), the file name is the username."
+        )
+        parser.add_argument(
+            "--workers", type=int, default=1,
+            help="Number of records that are imported concurrently (threads). It does not help on SQLite:"
+                 " the in-process requests are dispatched one by one there (SQLite does not allow concurrent writes)."
+                 " With other databases the threads wait for the database concurrently,"
+                 " but the matching of the data still shares one CPU (GIL)"
+        )
+        parser.add_argument("--create-users", action="store_true", help="Create users that do not exist")
+
+    def iter_directory(self, path: pathlib.Path) -> Iterator[ImportRecord]:
+        for file_path in sorted(path.glob('*.json')):
+            try:
+                with open(file_path, 'r') as f:
+                    doc = json.load(f)
+            except (OSError, json.JSONDecodeError) as exc:
+                yield ImportRecord(str(file_path), None, None, str(exc))
+                continue
+
+            if isinstance(doc, dict) and 'cv' in doc:
+                yield ImportRecord(str(file_path), doc.get('user'), doc['cv'])
+            else:
+                yield ImportRecord(str(file_path), file_path.stem, doc)
+
+    def iter_stream(self, stream: TextIO, name: str = 'stream') -> Iterator[ImportRecord]:
+        # one line is one record, thus only one record is in memory
+        for line_no, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                doc = json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield ImportRecord(f'{name}:{line_no}', None, None, str(exc))
+                continue
+            if not isinstance(doc, dict):
+                yield ImportRecord(f'{name}:{line_no}', None, None, 'The record must be {"user": ..., "cv": ...}')
+                continue
+            yield ImportRecord(f'{name}:{line_no}', doc.get('user'), doc.get('cv'))
+
+    def iter_records(self, source: Union[str, pathlib.Path]) -> Iterator[ImportRecord]:
+        if source == '-':
+            yield from self.iter_stream(sys.stdin, 'stdin')
+            return
+
+        path = pathlib.Path(source)
+        if path.is_dir():
+            yield from self.iter_directory(path)
+        elif path.is_file():
+            with open(path, 'r') as f:
+                yield from self.iter_stream(f, str(path))
+        else:
+            raise CommandError(f'Source does not exist: "{path}"')
+
+    def get_user(self, record: ImportRecord, create: bool = False):
+        user_model = get_user_model()
+        try:
+            return user_model.objects.get(username=record.username)
+        except user_model.DoesNotExist:
+            if not create:
+                raise
+
+        user_data = record.user if isinstance(record.user, dict) else {}
+        return user_model.objects.create_user(
+            record.username, password=user_data.get('password'),
+            **{k: user_data[k] for k in self.user_fields if k in user_data}
+        )
+
+    def import_record(self, record: ImportRecord, create_users: bool = False) -> ImportResult:
+        """
+            Loads one record like `loaduserdata` does (in-process transport), each record has own session.
+        """
+        start = time.perf_counter()
+        output = io.StringIO()
+        if record.error:
+            return ImportResult(record.source, record.username, False, 1, 0, record.error)
+        if not record.username or not isinstance(record.cv, dict):
+            return ImportResult(record.source, record.username, False, 1, 0, 'The record has no `user` or `cv`')
+
+        load_command = loaduserdata.Command(stdout=output, stderr=output, no_color=True)
+        try:
+            session = loaduserdata.LocalSession(self.get_user(record, create_users))
+            load_command.ensure_profile(session)
+            loader = loaduserdata.CVLoader('', session, load_command)
+            load_command.load(loader, record.cv)
+        except Exception as exc:
+            output.write(f'{type(exc).__name__}: {exc}\n')
+            return ImportResult(record.source, record.username, False, 1, time.perf_counter() - start, output.getvalue())
+
+        return ImportResult(
+            record.source, record.username, loader.error_count == 0, loader.error_count,
+            time.perf_counter() - start, output.getvalue()
+        )
+
+    def _import_record_in_thread(self, record: ImportRecord, create_users: bool = False) -> ImportResult:
+        try:
+            return self.import_record(record, create_users)
+        finally:
+            # each thread has its own DB connections
+            connections.close_all()
+
+    def iter_import(self, records: Iterator[ImportRecord], max_workers: int = 1,
+                    create_users: bool = False) -> Iterator[ImportResult]:
+        """
+            Yields the results as soon as the records are imported.
+            Only 2 * `max_workers` records are read ahead, thus the memory does not depend on the number of records.
+        """
+        if max_workers == 1:
+            for record in records:
+                yield self.import_record(record, create_users)
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            running = set()
+            for record in records:
+                running.add(executor.submit(self._import_record_in_thread, record, create_users))
+                if len(running) >= 2 * max_workers:
+                    done, running = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                    yield from (future.result() for future in done)
+
+            for future in concurrent.futures.as_completed(running):
+                yield future.result()
+
+    def write_result(self, result: ImportResult, verbosity: int = 1):
+        if result.ok:
+            if verbosity >= 1:
+                self.stdout.write(self.style.SUCCESS(f'OK {result.username} [{result.source}] {result.seconds:.2f} s'))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f'FAILED {result.username} [{result.source}] {result.error_count} error(s) {result.seconds:.2f} s'
+            ))
+        if result.output and (verbosity >= 2 or (not result.ok and verbosity >= 1)):
+            self.stdout.write(result.output)
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be positive')
+        if options['workers'] > 1 and connection.vendor in loaduserdata.LocalSession.lock_vendors:
+            self.stdout.write(self.style.NOTICE(
+                f'The records are imported one by one on {connection.display_name}, --workers does not make it faster'
+            ))
+
+        start = time.perf_counter()
+        total = ok = 0
+        for result in self.iter_import(self.iter_records(options['source']), options['workers'], options['create_users']):
+            total += 1
+            ok += result.ok
+            self.write_result(result, options['verbosity'])
+
+        elapsed = time.perf_counter() - start
+        style = self.style.SUCCESS if ok == total else self.style.WARNING
+        self.stdout.write(style(
+            f'Imported {ok} of {total} records ({total - ok} failed) in {elapsed:.2f} s,'
+            f' {total / elapsed if elapsed else 0:.2f} records/s'
+        ))
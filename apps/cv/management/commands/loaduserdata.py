@@ -7,31 +7,41 @@
 import argparse
 import base64
 import binascii
+import concurrent.futures
+import contextlib
 import datetime
 import difflib
 import functools
 import hashlib
-import itertools
 import json
+import mimetypes
 import pathlib
 import string
+import threading
 import urllib.parse
 from collections import UserDict, namedtuple
 from typing import Union, TextIO, Optional, Tuple, Any, Callable, Mapping, Type
 import getpass
 
 import requests
+import requests.adapters
 from bs4 import BeautifulSoup, Tag, SoupStrainer
 from django.conf import settings
+from django.contrib.auth import authenticate
 from django.contrib.auth.forms import AuthenticationForm
-from django.core.management import BaseCommand
+from django.core.handlers.exception import response_for_exception
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, connections
 from django.test.testcases import LiveServerThread, _StaticFilesHandler
 from django.middleware import csrf
-from django.urls import reverse
+from django.urls import reverse, resolve
 from rest_framework.fields import DurationField
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
 
 from apps.cv import models
-from apps.cv.compare import DataComparer, CompleteDataComparer, DateRangeCrossing, DateRangeMatcher
+from apps.cv.versions import cv_versions, RESOURCES_SCOPE
+from apps.cv.compare import DataComparer, CompleteDataComparer, DateRangeCrossing, DateRangeMatcher, IntervalIndex
 
 
 class LiveServer(LiveServerThread):
@@ -64,16 +74,331 @@ class LiveServer(LiveServerThread):
         self.terminate()
 
 
+class LocalResponse:
+    """
+    A `requests.Response`-like wrapper of the DRF response that LocalSession returns.
+    It supports only the part of the interface that is used by CVLoader.
+    """
+
+    def __init__(self, response, request) -> None:
+        self.response = response
+        self.request = request  # namedtuple(method, url, body) like `requests.PreparedRequest`
+        self.status_code = response.status_code
+        self.url = request.url
+        self.headers = response.headers
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self):
+        # The data was not encoded yet, thus there is nothing to decode
+        data = getattr(self.response, 'data', None)
+        if data is None:
+            return json.loads(self.text)
+        return data
+
+    @property
+    def text(self) -> str:
+        if hasattr(self.response, 'render') and not self.response.is_rendered:
+            self.response.render()
+        return self.response.content.decode()
+
+
+class LocalSession:
+    """
+    A `requests.Session`-like transport that dispatches the requests directly into the views (in-process)
+    as the `user` with forced authentication. No sockets, no login form, no CSRF.
+
+        session = LocalSession(user)
+        response = session.get(reverse('cv:education'))
+    """
+
+    server_name = None  # by default, the first host from settings.ALLOWED_HOSTS or 'localhost'
+    LocalRequest = namedtuple('LocalRequest', 'method url body')
+    # For the databases of `lock_vendors` the requests of all sessions are dispatched one by one
+    # even if they are sent concurrently, because SQLite fails the concurrent write transactions
+    # with "database is locked". Other databases (PostgreSQL, MySQL ...) serve the concurrent requests,
+    # they wait for the database concurrently while the Python part of them still shares the GIL.
+    lock = threading.Lock()
+    lock_vendors = ('sqlite', )
+
+    def __init__(self, user, server_name: Optional[str] = None) -> None:
+        self.user = user
+        if server_name is not None:
+            self.server_name = server_name
+        self.request_factory = APIRequestFactory(SERVER_NAME=self.get_server_name())
+
+    def get_lock(self):
+        return self.lock if connection.vendor in self.lock_vendors else contextlib.nullcontext()
+
+    def get_server_name(self) -> str:
+        if self.server_name:
+            return self.server_name
+
+        for host in settings.ALLOWED_HOSTS:
+            # '.example.com' also matches 'example.com'
+            host = host.lstrip('.')
+            if host == '*':
+                break
+            if host:
+                return host
+        return 'localhost'
+
+    def request(self, method: str, url: str, json=None, data=None, headers: Optional[dict] = None) -> LocalResponse:
+        """
+            data - like in `requests`, a file (object that has `read`) is the body of the request.
+                It is not read into memory, the view reads it from the stream like from the socket.
+        """
+        path = urllib.parse.urlsplit(url).path
+        match = resolve(path)
+
+        is_stream = hasattr(data, 'read')
+        if json is not None:
+            request = self.request_factory.generic(
+                method, url, JSONRenderer().render(json), 'application/json', headers=headers
+            )
+        elif is_stream:
+            request = self.request_factory.generic(
+                method, url, content_type=None, headers={'Content-Type': 'application/octet-stream', **(headers or {})},
+                **{'wsgi.input': data, 'CONTENT_LENGTH': str(requests.utils.super_len(data))}
+            )
+        else:
+            request = getattr(self.request_factory, method.lower())(url, data, headers=headers)
+        force_authenticate(request, self.user)
+        # the view reads the stream, the body must be taken before (the streamed one is not kept)
+        local_request = self.LocalRequest(method, url, None if is_stream else request.body)
+
+        with self.get_lock():
+            try:
+                response = match.func(request, *match.args, **match.kwargs)
+            except Exception as exc:
+                # like the HTTP server does, an unhandled exception is the response with error (500)
+                response = response_for_exception(request, exc)
+            finally:
+                # like the HTTP server does, the uploaded (temporary) files are closed
+                request.close()
+        return LocalResponse(response, local_request)
+
+    def get(self, url, **kwargs) -> LocalResponse:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs) -> LocalResponse:
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs) -> LocalResponse:
+        return self.request('PUT', url, **kwargs)
+
+    def patch(self, url, **kwargs) -> LocalResponse:
+        return self.request('PATCH', url, **kwargs)
+
+    def delete(self, url, **kwargs) -> LocalResponse:
+        return self.request('DELETE', url, **kwargs)
+
+
+class SectionScheduler:
+    """
+    Runs the sections (callables) in order of their dependencies (DAG).
+    The sections whose dependencies are done are run concurrently on a thread pool of `max_workers`.
+    If `max_workers` is 1 then the sections are run one by one in the topological order
+    (the declaration order is kept where it is possible).
+
+        scheduler = SectionScheduler(max_workers=4)
+        scheduler.add('workplace', loader.load_workplace, data['workplace'])
+        scheduler.add('project', loader.load_project, data['project'])
+        scheduler.add('workplace_project', loader.load_workplace_project, depends_on=('workplace', 'project'))
+        scheduler.run()
+
+    If any section raises an exception then the sections that were not started yet are skipped
+    and the exception is re-raised after the running sections are done.
+    """
+
+    Section = namedtuple('Section', 'name func args depends_on')
+    max_workers = 1
+
+    def __init__(self, max_workers: Optional[int] = None) -> None:
+        if max_workers is not None:
+            self.max_workers = max_workers
+        self.sections: dict[str, SectionScheduler.Section] = {}
+
+    def add(self, name: str, func: Callable, *args, depends_on: tuple = ()) -> None:
+        if name in self.sections:
+            raise ValueError(f'Section "{name}" already exists')
+        self.sections[name] = self.Section(name, func, args, tuple(depends_on))
+
+    def order(self) -> list[str]:
+        """
+            Returns the names of sections in topological order. Raises ValueError for unknown dependency or cycle.
+        """
+        for section in self.sections.values():
+            unknown = [d for d in section.depends_on if d not in self.sections]
+            if unknown:
+                raise ValueError(f'Section "{section.name}" depends on unknown sections {unknown}')
+
+        res, done = [], set()
+        while len(res) < len(self.sections):
+            ready = [n for n, s in self.sections.items() if n not in done and done.issuperset(s.depends_on)]
+            if not ready:
+                raise ValueError(f'Sections have cyclic dependencies: {[n for n in self.sections if n not in done]}')
+            res.extend(ready)
+            done.update(ready)
+        return res
+
+    def _run_section(self, section: Section):
+        return section.func(*section.args)
+
+    def _run_section_in_thread(self, section: Section):
+        try:
+            return self._run_section(section)
+        finally:
+            # each thread has its own DB connections (in-process transport)
+            connections.close_all()
+
+    def run(self) -> dict:
+        """
+            Returns {name: result, ...}
+        """
+        order = self.order()
+        results = {}
+        if self.max_workers == 1:
+            for name in order:
+                results[name] = self._run_section(self.sections[name])
+            return results
+
+        pending = list(order)
+        running: dict[concurrent.futures.Future, str] = {}
+        error = None
+        with concurrent.futures.ThreadPoolExecutor(self.max_workers) as executor:
+            while running or (pending and error is None):
+                if error is None:
+                    for name in [n for n in pending if set(self.sections[n].depends_on).issubset(results)]:
+                        pending.remove(name)
+                        running[executor.submit(self._run_section_in_thread, self.sections[name])] = name
+
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as exc:
+                        error = error or exc
+
+        if error is not None:
+            raise error
+        return results
+
+
+class SectionManifest:
+    """
+    Fingerprints of the sections that were loaded successfully, per user and server,
+    and the state of the data on the server after the load (see CVLoader.get_server_state).
+    It is a JSON file like
+        {"test_user@http://example.com": {"sections": {"education": "3f2a...", ...}, "state": "\"9c1e...\""}, ...}
+
+    The fingerprints are valid only while the server state is the same, the server data that was changed
+    in other way (UI, another client, re-created database) must be reconciled by loading all sections again.
+
+        manifest = SectionManifest(path, f'{username}@{server}')
+        if manifest.is_state_changed(state) or manifest.is_changed('education', fingerprint):
+            ...  # load
+            manifest.set('education', fingerprint)
+        manifest.set_state(state_after_load)
+        manifest.save()
+    """
+
+    version = 2  # change it to invalidate all the stored fingerprints
+
+    def __init__(self, path: Union[str, pathlib.Path], key: str) -> None:
+        self.path = pathlib.Path(path)
+        self.key = key
+        self.lock = threading.Lock()
+        self.data = self.load()
+
+    def load(self) -> dict:
+        try:
+            data = json.loads(self.path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return data if isinstance(data, dict) and data.get('version') == self.version else {}
+
+    def save(self):
+        with self.lock:
+            self.data['version'] = self.version
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(json.dumps(self.data, indent=2, sort_keys=True))
+
+    @property
+    def sections(self) -> dict:
+        return self.data.setdefault(self.key, {}).setdefault('sections', {})
+
+    @property
+    def state(self) -> Optional[str]:
+        with self.lock:
+            return self.data.get(self.key, {}).get('state')
+
+    def is_state_changed(self, state: Optional[str]) -> bool:
+        return state is None or self.state != state
+
+    def set_state(self, state: Optional[str]):
+        with self.lock:
+            self.data.setdefault(self.key, {})['state'] = state
+
+    @staticmethod
+    def fingerprint(data, *dependency_fingerprints: str) -> str:
+        """
+            A stable fingerprint of the section data and the fingerprints of sections it depends on
+        """
+        h = hashlib.sha256(json.dumps(data, sort_keys=True, separators=(',', ':'), default=str).encode())
+        for dfp in dependency_fingerprints:
+            h.update(dfp.encode())
+        return h.hexdigest()
+
+    def is_changed(self, section: str, fingerprint: str) -> bool:
+        with self.lock:
+            return self.sections.get(section) != fingerprint
+
+    def set(self, section: str, fingerprint: str):
+        with self.lock:
+            self.sections[section] = fingerprint
+
+
 class CVLoader:
     pk_field_name = DataComparer.pk_field_name
     data_comparer_class: Type[CompleteDataComparer] = CompleteDataComparer
 
-    def __init__(self, server_url, session: requests.Session, command: BaseCommand, data_comparer_class: Optional[DataComparer] = None) -> None:
+    def __init__(self, server_url, session: Union[requests.Session, LocalSession], command: BaseCommand,
+                 data_comparer_class: Optional[DataComparer] = None) -> None:
+        """
+            session - the transport, either `requests.Session` (HTTP) or LocalSession (in-process),
+            server_url - the prefix of URLs ('' for LocalSession)
+        """
         self.session = session
         self.command = command
         self.server_url = server_url
         if isinstance(data_comparer_class, type) and issubclass(data_comparer_class, CompleteDataComparer):
             self.data_comparer_class = data_comparer_class
+        # the sections can be loaded in different threads, each section is loaded entirely by one thread
+        self._thread_local = threading.local()
+        # {url: [item, ...], ...} the collections that were fetched in this run
+        self._snapshots: dict[str, list] = {}
+        self._snapshots_lock = threading.Lock()
+
+    @property
+    def error_count(self) -> int:
+        """
+            Number of errors that were written by the current thread
+        """
+        return getattr(self._thread_local, 'error_count', 0)
+
+    def write(self, msg: str, style: str = 'ERROR'):
+        """
+            style is string from django.utils.termcolors.PALETTES[xxx_PALETTE] as
+            "ERROR", "SUCCESS", "WARNING", "NOTICE" etc
+        """
+        if style == 'ERROR':
+            self._thread_local.error_count = self.error_count + 1
+        method = getattr(self.command.style, style)
+        self.command.stdout.write(method(msg))
 
     def _respond_msg(self, response: requests.Response, msg_prefix, style: str = 'ERROR'):
         """
@@ -84,41 +409,130 @@ class CVLoader:
               f'[{response.status_code}]: "{response.text}" \n' \
               f'\tdata:{response.request.body}'
 
-        method = getattr(self.command.style, style)
-        self.command.stdout.write(method(msg))
+        self.write(msg, style)
 
     def report_if_response_is_not_ok(self, response: requests.Response, msg_prefix):
         if not response.ok:
             self._respond_msg(response, msg_prefix, 'ERROR')
 
+    def get_collection(self, url: str, msg_prefix: str) -> Optional[list]:
+        """
+            Returns a copy of the collection (list of items) at `url`.
+            Each collection is fetched from the server at most once per CVLoader instance (run),
+            the later changes are applied to the fetched copy by .apply_to_snapshot
+
+            Returns None if the server responded with an error (it is reported)
+        """
+        with self._snapshots_lock:
+            snapshot = self._snapshots.get(url)
+
+        if snapshot is None:
+            response = self.session.get(url)
+            if not response.ok:
+                self._respond_msg(response, msg_prefix, 'ERROR')
+                return None
+            with self._snapshots_lock:
+                snapshot = self._snapshots.setdefault(url, list(response.json()))
+
+        return list(snapshot)
+
+    def get_server_state(self, state: Optional[str] = None) -> Optional[str]:
+        """
+            The state of the user's data on the server - the ETag of the full CV,
+            it is built from the version counters of the profile and the dictionaries (see apps.cv.versions),
+            thus it is changed by any write, whoever makes it, and it is not repeated by a re-created database.
+
+            state - the known state, if it is not changed the server responds 304 without the data
+            Returns None if the state is unknown (an error)
+        """
+        headers = {'If-None-Match': state} if state else None
+        response = self.session.get(f'{self.server_url}{reverse("cv:full")}', headers=headers)
+        if response.status_code == requests.codes.not_modified:
+            return state
+        return response.headers.get('ETag') if response.ok else None
+
+    def apply_to_snapshot(self, url: str, response: requests.Response):
+        """
+            Applies the body of successful POST/PUT `response` (an item or list of items)
+            to the fetched collection at `url`. The items are matched by `pk_field_name`.
+        """
+        if not response.ok:
+            return
+
+        with self._snapshots_lock:
+            snapshot = self._snapshots.get(url)
+            if snapshot is None:
+                return
+
+            items = response.json()
+            positions = {item[self.pk_field_name]: i for i, item in enumerate(snapshot)}
+            for item in [items] if isinstance(items, dict) else items:
+                i = positions.get(item[self.pk_field_name])
+                if i is None:
+                    snapshot.append(item)
+                else:
+                    snapshot[i] = item
+
+    def send(self, action: Callable, url: str, data, msg_prefix: str, collection_url: Optional[str] = None):
+        """
+            Sends `data` by `action` (self.session.post, .put ...), reports the error
+            and applies the result to the fetched collection (`url` by default)
+        """
+        response = action(url, json=data)
+        self.report_if_response_is_not_ok(response, msg_prefix)
+        self.apply_to_snapshot(collection_url or url, response)
+        return response
+
     def _load_independent_part(self, load_data: list, report_msg_prefix: str, view_name: Union[str, callable],
-                               post_hook: callable = None, put_hook: callable = None):
+                               post_hook: callable = None, put_hook: callable = None,
+                               data_comparer_class: Optional[Type[CompleteDataComparer]] = None):
         """
             view_name - It can be a `callable` that takes the name of action and must return a `view name` for that action
             post_hook(data) - prepared data for updating
             post_hook(sdata, data) - prepared data for updating, `sdata` is the source data that was returned by the server
+            data_comparer_class - overrides self.data_comparer_class for this section only
+                (the sections can be loaded concurrently, thus self must not be modified)
 
             These hooks must return either modified or no `data`
+
+            If `view_name` is a string (the same view serves the list and the items, like CVBaseAPIView)
+            then all inserts are sent in one bulk POST and all updates in one bulk PUT,
+            the batching replaces the streaming, thus the whole `.prepare_to_update()` is collected first.
+            Otherwise, each row is sent by its own request as soon as `.iter_prepare_to_update()` yields it.
         """
         url_lc = f'{self.server_url}{reverse(view_name("list_create") if callable(view_name) else view_name)}'
-        response = self.session.get(url_lc)
-        self.report_if_response_is_not_ok(response, report_msg_prefix)
+        stored_data = self.get_collection(url_lc, report_msg_prefix)
+        if stored_data is None:
+            return
+
+        dc = (data_comparer_class or self.data_comparer_class)(stored_data, load_data)
+        stored_by_pk = {s[self.pk_field_name]: s for s in dc.s}
 
-        stored_data = response.json()
-        dc = self.data_comparer_class(stored_data, load_data)
-        for u in dc.prepare_to_update():
-            uid = u.pop(dc.pk_field_name, None)
+        def prepare(u: dict) -> tuple[Any, dict]:
+            """
+                (pk, data) where pk is None for an insert
+            """
+            uid = u.get(dc.pk_field_name)
             if uid is None:
-                response = self.session.post(url_lc, json=post_hook(u) if callable(post_hook) else u)
-            else:
-                url_rud = f'{self.server_url}{reverse(view_name("put") if callable(view_name) else view_name, args=[uid])}'
-                u[dc.pk_field_name] = uid
-                response = self.session.put(
-                    url_rud,
-                    json=put_hook([s for s in dc.s if s[self.pk_field_name] == uid][0], u) if callable(put_hook) else u
-                )
+                u.pop(dc.pk_field_name, None)
+                return uid, post_hook(u) if callable(post_hook) else u
+            return uid, put_hook(stored_by_pk[uid], u) if callable(put_hook) else u
+
+        if not callable(view_name):
+            to_post, to_put = [], []
+            for uid, data in map(prepare, dc.prepare_to_update()):
+                (to_post if uid is None else to_put).append(data)
+            for action, data in ((self.session.put, to_put), (self.session.post, to_post)):
+                if data:
+                    self.send(action, url_lc, data, report_msg_prefix)
+            return
 
-            self.report_if_response_is_not_ok(response, report_msg_prefix)
+        for uid, data in map(prepare, dc.iter_prepare_to_update()):
+            if uid is None:
+                self.send(self.session.post, url_lc, data, report_msg_prefix)
+            else:
+                url_rud = f'{self.server_url}{reverse(view_name("put"), args=[uid])}'
+                self.send(self.session.put, url_rud, data, report_msg_prefix, url_lc)
 
     @staticmethod
     def _check_and_minimize_crossing(load_data):
@@ -142,16 +556,15 @@ class CVLoader:
 
         # A check, is `photo` base64_encoded
         photo = load_data.get('photo')
+        photo_path = None
         if photo:
             # Photo 200*200 => 40 000 Bytes at least.
             # If compressed (jpg) then It can be smaller but I am sure a photo less 8K is impossible.
             if len(photo) <= 8*1024:
                 # possible, it represents a path to image file
-                photo_path = pathlib.Path(photo)
-                if photo_path.is_file():
-                    # OK
-                    with open(photo_path, 'rb') as f:
-                        photo = base64.b64encode(f.read()).decode()
+                if pathlib.Path(photo).is_file():
+                    # OK, it will be uploaded by the separate request, the profile is sent without `photo`
+                    photo_path = pathlib.Path(photo)
             else:
                 # it may already represent a `base64_encoded` image
                 try:
@@ -159,12 +572,32 @@ class CVLoader:
                 except binascii.Error as exc:
                     msg = f'{msg_prefix} contains `photo` that looks like a base64 encoded image file.' \
                           f' base64.b64decode ERROR: {exc}'
-                    self.command.stdout.write(self.command.style.ERROR(msg))
+                    self.write(msg)
                     return
 
-        load_data['photo'] = photo
+        if photo_path is None:
+            load_data['photo'] = photo
+        else:
+            load_data = {k: v for k, v in load_data.items() if k != 'photo'}
         act_response = action(profile_url, json=load_data)
         self.report_if_response_is_not_ok(act_response, msg_prefix)
+        if act_response.ok and photo_path is not None:
+            self.upload_photo(photo_path, msg_prefix)
+
+    def upload_photo(self, photo_path: pathlib.Path, msg_prefix: str = 'The Profile'):
+        """
+            The file is the body of the request (FileUploadParser of `cv:profile-photo`).
+            It is neither read into memory nor base64 encoded, it is sent by chunks while it is read
+            and the server writes it by chunks into the memory/temporary file (Django upload handlers).
+        """
+        headers = {
+            'Content-Type': mimetypes.guess_type(photo_path.name)[0] or 'application/octet-stream',
+            'Content-Disposition': f'attachment; filename="{photo_path.name}"',
+        }
+        with open(photo_path, 'rb') as f:
+            response = self.session.put(f"{self.server_url}{reverse('cv:profile-photo')}", data=f, headers=headers)
+        self.report_if_response_is_not_ok(response, f'{msg_prefix} (photo)')
+        return response
 
     def load_education(self, load_data):
         self._check_and_minimize_crossing(load_data)
@@ -192,52 +625,17 @@ class CVLoader:
 
     def load_workplace_project(self):
         to_date = datetime.date.fromisoformat
+        msg_prefix = 'The Workplace relationship to the Project'
 
-        def get_projects_for(projects: list, begin: datetime.date, end: Optional[datetime.date], exclude_pids: list):
-            """
-            Groups the `projects` by `workplace` dates
-            """
-            res = []
-
-            for pi, p in enumerate(projects):
-                if pi in exclude_pids:
-                    continue
-
-                if self._check_date_in_range(begin, end, p['begin'], p['end']):
-                    exclude_pids.append(pi)
-                    res.append(p)
-            return res
-
-        def get_workplace_project_to_post(wpps: list[tuple[int, int]], workplace: dict, projects: list[dict]):
-            """
-            Returns a list of `tuple(workplace.pk, project.pk)`
-            There is a side effect to achive optimisation,
-            if `wpps` contains `tuple(workplace.pk, project.pk)` it will be removed right after processing.
-            """
-            pkn = self.pk_field_name
-            all_possible = [(w[pkn], p[pkn]) for w, p in itertools.product((workplace,), projects)]
-
-            ci = len(wpps)-1
-            while wpps and ci >= 0:
-                p4wp = wpps[ci]
-                try:
-                    all_possible.remove(p4wp)
-                except ValueError:
-                    pass
-                else:
-                    # must remove from p4wps
-                    del wpps[ci]
-                ci -= 1
-
-            return all_possible
+        def get_interval(item: dict) -> tuple[int, int]:
+            return tuple(DateRangeCrossing._normalize_dbe(
+                [None if item[k] is None else to_date(item[k]) for k in ('begin', 'end')]
+            ))
 
         # get workplaces
-        url = f'{self.server_url}{reverse("cv:workplace")}'
-        wp_response = self.session.get(url)
-        self.report_if_response_is_not_ok(wp_response, 'The Workplaces')
-        if not wp_response.ok:
+        wps: list[dict] = self.get_collection(f'{self.server_url}{reverse("cv:workplace")}', 'The Workplaces')
+        if wps is None:
             return
-        wps: list[dict] = wp_response.json()
 
         # need to sort wps in order where [min(wps.end - wps.begin), .... max(wps.end - wps.begin)]
         # This resolves an issue where the workspace with the widest date range absorbs all projects
@@ -247,76 +645,94 @@ class CVLoader:
         )
 
         # get projects
-        url = f'{self.server_url}{reverse("cv:project")}'
-        proj_response = self.session.get(url)
-        self.report_if_response_is_not_ok(proj_response, 'The Workplaces')
-        ps = proj_response.json()
-        if not proj_response.ok:
+        ps = self.get_collection(f'{self.server_url}{reverse("cv:project")}', 'The Workplaces')
+        if ps is None:
             return
 
         # get a `workplace-projects` relationships
         url = f'{self.server_url}{reverse("cv:workplace-project")}'
-        wpps_response = self.session.get(url)
-        self.report_if_response_is_not_ok(wpps_response, 'The Workplace relationship to the Project')
+        wpps_data = self.get_collection(url, msg_prefix)
+        if wpps_data is None:
+            return
         wpps: dict[tuple[int, int], dict] = {
-            (wpps['workplace'][self.pk_field_name], wpps['project'][self.pk_field_name]): wpps for wpps in wpps_response.json()
+            (wpps['workplace'][self.pk_field_name], wpps['project'][self.pk_field_name]): wpps for wpps in wpps_data
         }
-        wpps_list = [*wpps.keys()]
-        if not wpps_response.ok:
-            return
 
-        matched_pids = []
+        # The project belongs to the first (the narrowest) workplace that includes its dates.
+        # The index finds the workplaces crossed with the project in O(log(n) + k) instead of scanning all of them.
+        pkn = self.pk_field_name
+        wp_index = IntervalIndex([get_interval(wp) for wp in wps])
+        intervals = wp_index.intervals
+        projects_by_wpi: dict[int, list[dict]] = {}
+        unmatched = []
+        for p in ps:
+            b, e = get_interval(p)
+            wpi = min((i for i in wp_index.query(b, e) if intervals[i][0] <= b <= e <= intervals[i][1]), default=None)
+            if wpi is None:
+                unmatched.append(p)
+            else:
+                projects_by_wpi.setdefault(wpi, []).append(p)
+
+        linked_pids = {pid for _, pid in wpps}
+        matched = set()
+        to_post = []
         for wpi, wp in enumerate(wps):
-            ps4wp = get_projects_for(
-                ps, to_date(wp['begin']), None if wp['end'] is None else to_date(wp['end']), matched_pids
-            )
+            ps4wp = projects_by_wpi.get(wpi)
             # if ps4wp is empty -> Attension (no matches for wp)
             if not ps4wp:
                 self.command.stdout.write(
                     self.command.style.WARNING(f'The Workplace has no any related project \n\t {wp}')
                 )
-            else:
-                # Add the workplace relationship to the project if it does not exist
-                to_add = get_workplace_project_to_post(wpps_list, wp, ps4wp)
-                for wrkp_pk, proj_pk in to_add:
-                    response = self.session.post(url, json={'workplace': wrkp_pk, 'project': proj_pk})
-                    self.report_if_response_is_not_ok(response, 'The Workplace relationship to the Project')
-
-        # if matched_pids does not contain all indexes from ps -> Attension (ps has not matched to any wp)
-        for pi in (pi for pi, p in enumerate(ps) if pi not in matched_pids):
+                continue
+
+            for p in ps4wp:
+                key = wp[pkn], p[pkn]
+                matched.add(key)
+                # Add the workplace relationship to the project if it does not exist.
+                # The project that is linked to other workplace can not be linked again (one to one),
+                # such relationship is reported below as extra.
+                if key not in wpps and p[pkn] not in linked_pids:
+                    to_post.append({'workplace': key[0], 'project': key[1]})
+
+        # all missing relationships are added by one (bulk) request
+        if to_post:
+            self.send(self.session.post, url, to_post, msg_prefix)
+
+        # if the project is not included in any wp -> Attension (ps has not matched to any wp)
+        for p in unmatched:
             self.command.stdout.write(
-                self.command.style.WARNING(f'The Project has no any related workplace \n\t {ps[pi]}')
+                self.command.style.WARNING(f'The Project has no any related workplace \n\t {p}')
             )
 
-        # if wpps still have some elements - Possible, Integrity was violated (extra rows in WorkplaceProject)
-        if wpps_list:
-            for wpps_list_key in wpps_list:
+        # if wpps has elements that were not matched - Possible, Integrity was violated (extra rows in WorkplaceProject)
+        for wpps_key, wpp in wpps.items():
+            if wpps_key not in matched:
                 self.command.stdout.write(
-                    self.command.style.WARNING(f'The WorkplaceProject relationship has extra rows. Possible, Integrity was violated \n\t {wpps[wpps_list_key]}')
+                    self.command.style.WARNING(f'The WorkplaceProject relationship has extra rows. Possible, Integrity was violated \n\t {wpp}')
                 )
 
     def load_workplace_responsibility(self, load_data):
 
-        wp_response = self.session.get(f'{self.server_url}{reverse("cv:workplace")}')
-        if not wp_response.ok:
-            self._respond_msg(wp_response, 'The Workplace', 'ERROR')
+        wps = self.get_collection(f'{self.server_url}{reverse("cv:workplace")}', 'The Workplace')
+        if wps is None:
             return
 
-        wps = wp_response.json()
-
         drm = DateRangeMatcher(
             [(wp['begin'], wp['end']) for wp in wps], [(wpr['begin'], wpr['end']) for wpr in load_data]
         )
-        drm_matches = drm.match()
+        # all responsibilities are matched in one pass over the indexed workplaces
+        drm_matches = drm.match_many()
+        # {(begin, end): workplace, ...} the first workplace wins like in a linear search
+        wps_by_date_range = {}
+        for wp in reversed(wps):
+            wps_by_date_range[wp['begin'], wp['end']] = wp
 
         def get_wp_by_date_range(wps, b, e):
             _b, _e = (datetime.date.fromisoformat(v) if isinstance(v, str) else v for v in (b, e))
             wp_match = drm_matches.get((_b, _e))
             if wp_match:
                 wp_b, wp_e = wp_match[1]
-                for wp in wps:
-                    if wp['begin'] == str(wp_b) and wp['end'] is None if wp_e is None else wp['end'] == str(wp_e):
-                        return wp
+                return wps_by_date_range.get((str(wp_b), None if wp_e is None else str(wp_e)))
 
         def post_hook(data):
             wp = get_wp_by_date_range(wps, data['begin'], data['end'])
@@ -344,8 +760,10 @@ class CVLoader:
         model = models.CVResources
         if settings.DEBUG and model.objects.all().count() == 0:
             model.objects.bulk_create(model(resource=r.lower()) for r in default_resources)
+            # bulk_create does not send the signals
+            cv_versions.bump(RESOURCES_SCOPE)
             if model.objects.all().count() != len(default_resources):
-                self.command.stdout.write(self.command.style.ERROR(f'Can not load resources {default_resources}'))
+                self.write(f'Can not load resources {default_resources}')
 
     def load_resource(self, load_data):
 
@@ -358,18 +776,13 @@ class CVLoader:
                 return u
 
         msg_prefix = 'The Resource'
-        res_dict_response = self.session.get(f"{self.server_url}{reverse('cv:resource-lc')}")
-        self.report_if_response_is_not_ok(res_dict_response, f'{msg_prefix} (dictionary)')
-        if not res_dict_response.ok:
+        resources = self.get_collection(f"{self.server_url}{reverse('cv:resource-lc')}", f'{msg_prefix} (dictionary)')
+        if resources is None:
             return
 
-        res_dict: dict[str, dict] = {r['resource'].lower(): r for r in res_dict_response.json()}
+        res_dict: dict[str, dict] = {r['resource'].lower(): r for r in resources}
 
-        try:
-            self.data_comparer_class = ResourceDataComparer
-            self._load_independent_part(load_data, msg_prefix, 'cv:user-resource')
-        finally:
-            self.data_comparer_class = type(self).data_comparer_class
+        self._load_independent_part(load_data, msg_prefix, 'cv:user-resource', data_comparer_class=ResourceDataComparer)
 
     def load_technology_dictionary(self, load_data):
         # TO_THINK: `technology_dictionary` by essence has only one vary field of small length - `technology`.
@@ -419,11 +832,11 @@ class CVLoader:
             def _get_project(itself, pid: Union[str, int]):
                 proj = None
                 if not isinstance(pid, (str, int, list, tuple)):
-                    self.command.stdout.write(self.command.style.ERROR(
+                    self.write(
                         f'{msg_prefix}: `project` must be either str or int type.'
                         f' Where str is "yyyy-mm-dd" or "null" that points to a project [`begin` ... `end`] range.'
                         f' Or int that represents a `id` (PK) of project. The used value: {pid}'
-                    ))
+                    )
                 elif isinstance(pid, (str, list, tuple)):
                     proj = itself.get_proj_by_date_range(projects, pid)
                 elif isinstance(pid, int):
@@ -454,25 +867,19 @@ class CVLoader:
                     u['duration'] = itself._get_duration(proj, u.get('duration'))
                     u['technology'] = technology_map.get(u.get('technology', '').lower(), {}).get(itself.pk_field_name)
                 else:
-                    self.command.stdout.write(self.command.style.ERROR(
-                        f'{msg_prefix}: `project` was not found for {u_proj}'
-                    ))
+                    self.write(f'{msg_prefix}: `project` was not found for {u_proj}')
 
                 return u
 
-        projs_response = self.session.get(f'{self.server_url}{reverse("cv:project")}')
-        if not projs_response.ok:
-            self._respond_msg(projs_response, 'The Project', 'ERROR')
+        projects = self.get_collection(f'{self.server_url}{reverse("cv:project")}', 'The Project')
+        if projects is None:
             return
 
-        projects = projs_response.json()
-
-        techs_response = self.session.get(f'{self.server_url}{reverse("cv:technology-lc")}')
-        if not techs_response.ok:
-            self._respond_msg(projs_response, 'The Technology', 'ERROR')
+        techs = self.get_collection(f'{self.server_url}{reverse("cv:technology-lc")}', 'The Technology')
+        if techs is None:
             return
 
-        technology_map = {tech['technology'].lower(): tech for tech in techs_response.json()}
+        technology_map = {tech['technology'].lower(): tech for tech in techs}
 
         def extend_technology(load_data):
             for proj_tech in load_data:
@@ -486,12 +893,10 @@ class CVLoader:
                 else:
                     yield proj_tech
 
-        try:
-            self.data_comparer_class = ProjectTechnologyDataComparer
-            load_data = list(extend_technology(load_data))
-            self._load_independent_part(load_data, msg_prefix, 'cv:project-technology')
-        finally:
-            del self.data_comparer_class
+        load_data = list(extend_technology(load_data))
+        self._load_independent_part(
+            load_data, msg_prefix, 'cv:project-technology', data_comparer_class=ProjectTechnologyDataComparer
+        )
 
 
 class Command(BaseCommand):
@@ -501,6 +906,7 @@ class Command(BaseCommand):
     sessionid_cookie_key = 'sessionid'
     csrf_secret_cookie_key = 'csrftoken'
     csrf_token_header_key = 'X-CSRFToken'
+    manifest_path = pathlib.Path.home() / '.cv' / 'loaduserdata.json'
 
     def __init__(self, stdout=None, stderr=None, no_color=False, force_color=False):
         super().__init__(stdout, stderr, no_color, force_color)
@@ -515,6 +921,28 @@ class Command(BaseCommand):
         parser.add_argument("file", type=str)
         parser.add_argument("host", nargs="?", type=str, default='localhost')
         parser.add_argument("port", nargs="?", type=int, default=0)
+        parser.add_argument(
+            "--transport", choices=('local', 'http'), default='local',
+            help="local - dispatch the requests into the views in-process (default),"
+                 " http - talk to the live server (or to --url) over HTTP"
+        )
+        parser.add_argument("--url", type=str, help="URL of a remote server (e.g. http://example.com), implies http")
+        parser.add_argument(
+            "--workers", type=int,
+            help="Number of sections that are loaded concurrently (default: 4 for --url or a local database"
+                 " other than SQLite, otherwise 1). On SQLite the in-process requests are dispatched one by one"
+                 " (SQLite does not allow concurrent writes), thus more workers do not make the local load faster"
+        )
+        parser.add_argument(
+            "--manifest", type=str, default=str(self.manifest_path),
+            help="Path of JSON file with fingerprints of loaded sections, the unchanged sections are skipped"
+        )
+        parser.add_argument("--no-manifest", action="store_true", help="Load all sections, do not use the manifest")
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Load all sections and update the manifest"
+                 " (the sections are also loaded if the data on the server was modified in other way)"
+        )
 
     def _extract_login_form(self, content: Union[str, TextIO]) -> Optional[Tag]:
         soup = BeautifulSoup(content, 'lxml', parse_only=SoupStrainer('form'))
@@ -619,41 +1047,178 @@ class Command(BaseCommand):
             )
             exit(1)
 
-    def handle(self, *args, **parser_options):
-        # run local server to interact with API
+    def login_local(self, parser_options) -> LocalSession:
+        """
+            In-process counterpart of .login
+            Returns: LocalSession of authenticated user
+        """
+        user = authenticate(username=parser_options['username'], password=parser_options['password'])
+        if user is None:
+            err_message = AuthenticationForm.error_messages['invalid_login'] % {'username': 'username'}
+            self.stdout.write(self.style.ERROR('login failed: "%s"' % err_message))
+            exit(1)
 
-        with LiveServer(host=parser_options['host'], static_handler=None, port=parser_options['port']) as server:
-            live_server_url = server.live_server_url  # 'http://127.0.0.1:8000'
+        session = LocalSession(user)
+        self.ensure_profile(session)
+        return session
+
+    def ensure_profile(self, session: LocalSession):
+        # We should create (if not exists) profile like .login does
+        if session.get(self.profile_url).status_code == requests.codes.not_found:
+            profile_response = session.post(self.profile_url, json={})
+            if profile_response.status_code != requests.codes.created:
+                raise ValueError(
+                    f'Bad profile creation: status[{profile_response.status_code}], url[{profile_response.url}]'
+                )
 
-            self.login(live_server_url, parser_options)
+    def read_data(self, parser_options) -> dict:
+        json_file_path = pathlib.Path(parser_options['file'])
+        if not json_file_path.exists() or not json_file_path.is_file():
+            self.stdout.write(self.style.ERROR(f'File does not exist: "{json_file_path}"'))
+            exit(1)
 
-            # load JSON file
-            json_file_path = pathlib.Path(parser_options['file'])
-            if not json_file_path.exists() or not json_file_path.is_file():
-                self.stdout.write(self.style.ERROR(f'File does not exist: "{json_file_path}"'))
+        with open(json_file_path, 'r') as f:
+            try:
+                # for chunk in json.JSONEncoder().iterencode(bigobject):
+                #     mysocket.write(chunk)
+                return json.load(f)
+            except json.JSONDecodeError as exc:
+                self.stdout.write(self.style.ERROR(f'File "{json_file_path}" has errors "{exc}"'))
                 exit(1)
 
-            with open(json_file_path, 'r') as f:
-                try:
-                    # for chunk in json.JSONEncoder().iterencode(bigobject):
-                    #     mysocket.write(chunk)
-                    data = json.load(f)
-                except json.JSONDecodeError as exc:
-                    self.stdout.write(self.style.ERROR(f'File "{json_file_path}" has errors "{exc}"'))
-                    exit(1)
-
-            loader = CVLoader(live_server_url, self.session, self)
-            loader.load_profile(data.get('profile', {}))
-            loader.load_education(data.get('education', []))
-            loader.load_hobby(data.get('hobby', []))
-            loader.load_language(data.get('language', []))
-            loader.load_workplace(data.get('workplace', []))
-            loader.load_project(data.get('project', []))
-            loader.load_workplace_project()
-            loader.load_workplace_responsibility(data.get('workplace_responsibility', []))
-
-            loader.create_resource_dictionary()  # It almost is hard-coded for now
-            loader.load_resource(data.get('resource', []))
-
-            loader.load_technology_dictionary(data.get('technology', []))
-            loader.load_project_technology(data.get('project-technology', []))
+    def get_scheduler(self, loader: CVLoader, data: dict, max_workers: Optional[int] = None) -> SectionScheduler:
+        """
+            Declares the sections and their dependencies
+        """
+        scheduler = SectionScheduler(max_workers)
+        scheduler.add('profile', loader.load_profile, data.get('profile', {}))
+        scheduler.add('education', loader.load_education, data.get('education', []))
+        scheduler.add('hobby', loader.load_hobby, data.get('hobby', []))
+        scheduler.add('language', loader.load_language, data.get('language', []))
+        scheduler.add('workplace', loader.load_workplace, data.get('workplace', []))
+        scheduler.add('project', loader.load_project, data.get('project', []))
+        scheduler.add('workplace_project', loader.load_workplace_project, depends_on=('workplace', 'project'))
+        scheduler.add(
+            'workplace_responsibility', loader.load_workplace_responsibility,
+            data.get('workplace_responsibility', []), depends_on=('workplace',)
+        )
+
+        scheduler.add('resource_dictionary', loader.create_resource_dictionary)  # It almost is hard-coded for now
+        scheduler.add('resource', loader.load_resource, data.get('resource', []), depends_on=('resource_dictionary',))
+
+        scheduler.add('technology', loader.load_technology_dictionary, data.get('technology', []))
+        scheduler.add(
+            'project_technology', loader.load_project_technology, data.get('project-technology', []),
+            depends_on=('project', 'technology')
+        )
+        return scheduler
+
+    def _make_incremental(self, scheduler: SectionScheduler, loader: CVLoader, manifest: SectionManifest,
+                          force: bool = False) -> dict[str, list]:
+        """
+            Wraps the sections of `scheduler` to skip the unchanged ones (if not `force`).
+            The fingerprint of a section includes the fingerprints of its dependencies,
+            thus a section is loaded again if any of its dependencies is changed.
+            The fingerprint is stored only if a section and all its dependencies were loaded without errors.
+
+            Returns {'skipped': [...], 'loaded': [...], 'failed': [...]} that is filled while the scheduler runs
+        """
+        summary = {'skipped': [], 'loaded': [], 'failed': []}
+        fingerprints = {}
+        for name in scheduler.order():
+            section = scheduler.sections[name]
+            fingerprints[name] = manifest.fingerprint(section.args, *(fingerprints[d] for d in section.depends_on))
+
+        def run_section(section: SectionScheduler.Section, fingerprint: str):
+            if not force and not manifest.is_changed(section.name, fingerprint):
+                summary['skipped'].append(section.name)
+                return
+
+            error_count = loader.error_count
+            try:
+                result = section.func(*section.args)
+            except Exception:
+                summary['failed'].append(section.name)
+                raise
+
+            if loader.error_count == error_count and not set(section.depends_on).intersection(summary['failed']):
+                manifest.set(section.name, fingerprint)
+                summary['loaded'].append(section.name)
+            else:
+                summary['failed'].append(section.name)
+            return result
+
+        for name, section in scheduler.sections.items():
+            scheduler.sections[name] = section._replace(
+                func=functools.partial(run_section, section, fingerprints[name]), args=()
+            )
+        return summary
+
+    def load(self, loader: CVLoader, data: dict, max_workers: Optional[int] = None,
+             manifest: Optional[SectionManifest] = None, force: bool = False):
+        scheduler = self.get_scheduler(loader, data, max_workers)
+        if manifest is None:
+            scheduler.run()
+            return
+
+        if not force and manifest.is_state_changed(loader.get_server_state(manifest.state)):
+            # the data on the server was changed in other way (or it was never loaded), it must be reconciled
+            if manifest.state is not None:
+                self.stdout.write(self.style.NOTICE('The data on the server was changed, all sections are loaded'))
+            force = True
+
+        summary = self._make_incremental(scheduler, loader, manifest, force)
+        try:
+            scheduler.run()
+            # the fingerprints are valid only for the data that is on the server after the load
+            manifest.set_state(loader.get_server_state())
+        finally:
+            manifest.save()
+            for state, style in (('skipped', 'NOTICE'), ('loaded', 'SUCCESS'), ('failed', 'ERROR')):
+                if summary[state]:
+                    self.stdout.write(getattr(self.style, style)(
+                        f'{state.capitalize()} sections: {", ".join(sorted(summary[state]))}'
+                    ))
+
+    def _pool_session(self, max_workers: int):
+        # each concurrent section holds a connection
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get_manifest(self, server_key: str, parser_options) -> Optional[SectionManifest]:
+        if parser_options['no_manifest']:
+            return None
+        return SectionManifest(parser_options['manifest'], f'{parser_options["username"]}@{server_key}')
+
+    def handle(self, *args, **parser_options):
+        is_local = not parser_options['url'] and parser_options['transport'] == 'local'
+        max_workers = parser_options['workers'] or (
+            4 if parser_options['url'] or connection.vendor not in LocalSession.lock_vendors else 1
+        )
+        if max_workers < 1:
+            raise CommandError('--workers must be positive')
+
+        # the local server (any transport) works with the local database
+        server_key = parser_options['url'] or f"local:{pathlib.Path(settings.DATABASES['default']['NAME']).resolve()}"
+        manifest = self.get_manifest(server_key, parser_options)
+        force = parser_options['force']
+
+        if parser_options['url']:
+            # remote server to interact with API
+            server_url = parser_options['url'].rstrip('/')
+            self._pool_session(max_workers)
+            self.login(server_url, parser_options)
+            loader = CVLoader(server_url, self.session, self)
+            self.load(loader, self.read_data(parser_options), max_workers, manifest, force)
+        elif not is_local:
+            # run local server to interact with API
+            with LiveServer(host=parser_options['host'], static_handler=None, port=parser_options['port']) as server:
+                live_server_url = server.live_server_url  # 'http://127.0.0.1:8000'
+                self._pool_session(max_workers)
+                self.login(live_server_url, parser_options)
+                loader = CVLoader(live_server_url, self.session, self)
+                self.load(loader, self.read_data(parser_options), max_workers, manifest, force)
+        else:
+            session = self.login_local(parser_options)
+            self.load(CVLoader('', session, self), self.read_data(parser_options), max_workers, manifest, force)
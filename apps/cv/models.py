@@ -139,6 +139,8 @@ class CVEducation(CVAbstractBaseModel):
             DateBeginIsNotNullAndEndIsGreaterOrEqualConstraint().set_name_prefix('education'),
             EducationDateCrossingConstraint(),
         ]
+        # the ordering (and the key of the pagination) of the list
+        indexes = [models.Index(fields=['profile', 'begin', 'id'])]
 
 
 @add_constraints(
@@ -197,6 +199,8 @@ class CVProject(CVAbstractBaseModel):
             DateBeginIsNotNullAndEndIsGreaterOrEqualConstraint().set_name_prefix('project'),
             ProjectDateCrossingConstraint(),
         ]
+        # the ordering (and the key of the pagination) of the list
+        indexes = [models.Index(fields=['profile', 'begin', 'id'])]
 
 
 @add_constraints(
@@ -276,6 +280,8 @@ class CVWorkplace(CVAbstractBaseModel):
             DateBeginIsNotNullAndEndIsGreaterOrEqualConstraint().set_name_prefix('workplace'),
             WorkplaceDateCrossingConstraint(),
         ]
+        # the ordering (and the key of the pagination) of the list
+        indexes = [models.Index(fields=['profile', 'begin', 'id'])]
 
 
 @add_constraints(
@@ -303,6 +309,8 @@ class CVWorkplaceResponsibility(CVAbstractBaseModel):
             DateBeginIsNotNullAndEndIsGreaterOrEqualConstraint().set_name_prefix('workplace_responsibility'),
             WorkplaceResponsibilityDateCrossingConstraint(),
         ]
+        # the ordering (and the key of the pagination) of the list
+        indexes = [models.Index(fields=['workplace', 'begin', 'id'])]
 
 
 @add_constraints(
@@ -320,3 +328,13 @@ class CVWorkplaceProject(CVAbstractBaseModel):
 
     class Meta(CVAbstractBaseModel.Meta):
         unique_together = ['workplace', 'project']
+
+
+class CVVersion(CVAbstractBaseModel):
+    """
+        Counter of the changes of the data in `scope`.
+        `scope` is 'profile:<pk>' (all data of the profile) or a dictionary - 'technologies', 'resources'.
+        It is incremented on each write (see apps.cv.versions) and used to build ETag-s.
+    """
+    scope = models.CharField(max_length=64, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
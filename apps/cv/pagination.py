@@ -0,0 +1,226 @@
+# IDE: PyCharm
+# Project: cv
+# Path: apps/cv
+# File: pagination.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 10:05 PM
+
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from typing import Optional
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet, Model
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+ORDERING_PARAM = 'ordering'
+
+
+def get_ordering(request, view) -> list[str]:
+    """
+        The ordering of the list, like ['-begin', 'id'].
+
+        The fields of ?ordering=-begin,id must be in `view.ordering_fields`, otherwise `view.ordering` is used.
+        The primary key is always the last one, thus the ordering is unique (it is the key of the keyset pagination).
+        Only NOT NULL fields can be in `view.ordering_fields` (a NULL can't be compared in the keyset condition).
+    """
+    allowed = getattr(view, 'ordering_fields', ('id', ))
+    param = request.query_params.get(ORDERING_PARAM)
+    if param:
+        ordering = [f.strip() for f in param.split(',') if f.strip()]
+        invalid = [f for f in ordering if f.removeprefix('-') not in allowed]
+        if invalid or len({f.removeprefix('-') for f in ordering}) != len(ordering):
+            raise ValidationError({ORDERING_PARAM: [f'Allowed fields are {", ".join(allowed)} (once, "-" is descending)']})
+    else:
+        ordering = list(getattr(view, 'ordering', ('id', )))
+
+    names = [f.removeprefix('-') for f in ordering]
+    if 'id' not in names:
+        ordering.append('id')
+    return ordering
+
+
+class KeysetOrderingFilter(BaseFilterBackend):
+    """
+        Orders the list by ?ordering= (see get_ordering), the same ordering is the key of KeysetPagination
+    """
+
+    def filter_queryset(self, request, queryset: QuerySet, view):
+        return queryset.order_by(*get_ordering(request, view))
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': ORDERING_PARAM,
+            'required': False,
+            'in': 'query',
+            'description': f'Comma separated fields of {", ".join(getattr(view, "ordering_fields", ("id", )))}'
+                           f', "-" is descending',
+            'schema': {'type': 'string'},
+        }]
+
+
+class KeysetPagination(BasePagination):
+    """
+        Keyset (cursor) pagination by the ordering of the list (see get_ordering), like (begin, id) or (id, ).
+        The page is the rows after (before) the key of the last (first) row of the previous page
+            WHERE (begin > :begin) OR (begin = :begin AND id > :id) ORDER BY begin, id LIMIT :page_size
+        thus the cost of the page does not depend on its position and the pages are stable
+        when the rows are inserted or deleted.
+
+        The pagination is used only if the request contains ?page_size= or ?cursor=,
+        otherwise the list is not paginated (as before).
+
+            {"next": <url or null>, "previous": <url or null>, "results": [...]}
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 100
+    max_page_size = 1000
+    invalid_cursor_message = 'Invalid cursor'
+
+    def is_paginated(self, request) -> bool:
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request) -> int:
+        value = request.query_params.get(self.page_size_query_param)
+        if value is None:
+            return self.page_size
+        try:
+            page_size = int(value)
+        except ValueError:
+            page_size = 0
+        if page_size <= 0:
+            raise ValidationError({self.page_size_query_param: ['A positive integer is required']})
+        return min(page_size, self.max_page_size)
+
+    def encode_cursor(self, ordering: list[str], values: list, reverse: bool) -> str:
+        data = json.dumps({'o': ordering, 'v': values, 'r': reverse}, cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, request, ordering: list[str]) -> Optional[tuple[list, bool]]:
+        """
+            (values of the key, reverse) or None if there is no cursor
+        """
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if data['o'] != ordering or len(data['v']) != len(ordering):
+                raise ValueError('The cursor of another ordering')
+            values = [field.to_python(v) for field, v in zip(self.get_key_fields(ordering), data['v'])]
+            return values, bool(data['r'])
+        except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_key_fields(self, ordering: list[str]):
+        return [self.model._meta.get_field(f.removeprefix('-')) for f in ordering]
+
+    def get_key(self, obj: Model, ordering: list[str]) -> list:
+        return [getattr(obj, field.attname) for field in self.get_key_fields(ordering)]
+
+    def get_key_condition(self, ordering: list[str], values: list, reverse: bool) -> Q:
+        """
+            (f1 > v1) OR (f1 = v1 AND f2 > v2) OR ... for ascending fields (`<` for descending ones),
+            the comparisons are inverted for the reverse (previous page) direction
+        """
+        condition = Q()
+        equal = {}
+        for f, value in zip(ordering, values):
+            name = f.removeprefix('-')
+            descending = f.startswith('-') != reverse
+            condition |= Q(**equal, **{f'{name}__{"lt" if descending else "gt"}': value})
+            equal[name] = value
+        return condition
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None) -> Optional[list]:
+        if not self.is_paginated(request):
+            return None
+
+        self.request = request
+        self.model = queryset.model
+        self.ordering = get_ordering(request, view)
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request, self.ordering)
+
+        reverse = False
+        if cursor is not None:
+            values, reverse = cursor
+            queryset = queryset.filter(self.get_key_condition(self.ordering, values, reverse))
+        if reverse:
+            queryset = queryset.order_by(*(f.removeprefix('-') if f.startswith('-') else f'-{f}' for f in self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # a cursor is built from the row that is on the border of the page
+        self.next_key = self.previous_key = None
+        if rows:
+            if has_more or reverse:
+                self.next_key = self.get_key(rows[-1], self.ordering)
+            if cursor is not None and (has_more or not reverse):
+                self.previous_key = self.get_key(rows[0], self.ordering)
+        return rows
+
+    def get_link(self, key: Optional[list], reverse: bool) -> Optional[str]:
+        if key is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.ordering, key, reverse))
+
+    def get_next_link(self) -> Optional[str]:
+        return self.get_link(self.next_key, False)
+
+    def get_previous_link(self) -> Optional[str]:
+        return self.get_link(self.previous_key, True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The cursor of the page (the `next` or `previous` link of the paginated response)',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Number of results per page (max {self.max_page_size}),'
+                               f' the list is paginated if it or `{self.cursor_query_param}` is present',
+                'schema': {'type': 'integer'},
+            },
+        ]
@@ -34,3 +34,14 @@ projecttechnology_schema = education_schema
 workplaceresponsibility_schema = education_schema
 workplaceproject_schema = education_schema
 profile_schema = education_schema
+
+fullcv_schema = extend_schema(
+    description='The whole CV of the current user in one response (read only). '
+                'The sections are lists of rows, the foreign keys are represented by ids.',
+    responses=OpenApiTypes.OBJECT
+)
+
+responsecache_schema = extend_schema(
+    description='The number of hits and misses of the response cache (staff only), DELETE resets them.',
+    responses=OpenApiTypes.OBJECT
+)
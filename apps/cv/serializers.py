@@ -6,20 +6,23 @@
 # Created by ox23 at 2023-06-23 (y-m-d) 7:09 AM
 import functools
 import base64
-from typing import Union
+import operator
+from typing import Optional, Union
 
+from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.core.files import File
 from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.db import IntegrityError
-from django.db.models import Model
-from django.http import Http404
+from django.db.models import Model, ImageField, DurationField, Q, QuerySet
+from django.utils.duration import duration_string
+from django.http import HttpRequest
 
 from rest_framework.exceptions import PermissionDenied, NotAuthenticated, ValidationError
 from rest_framework.fields import empty
-from rest_framework.generics import get_object_or_404
 from rest_framework.parsers import MultiPartParser, FileUploadParser, JSONParser, BaseParser
 from rest_framework.request import Request
 from rest_framework.reverse import reverse
@@ -32,19 +35,53 @@ from . import models
 from rest_framework import serializers, settings
 
 
+REQUEST_PROFILE_ATTR = '_cv_user_profile'
+
+
+def get_request_profile(request: Union[Request, HttpRequest]) -> Optional[models.CVUserProfile]:
+    """
+        The profile of the current (logged in) user or None.
+
+        It is resolved once per request and cached on the underlying HttpRequest, thus the views,
+        filters and serializers of one request (even with the different rest_framework.request.Request wrappers)
+        share one instance instead of querying it for each serialized row.
+        The absence of the profile is not cached, it can be created during the request.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return None
+
+    http_request = getattr(request, '_request', request)
+    profile = getattr(http_request, REQUEST_PROFILE_ATTR, None)
+    if profile is None or profile.user_id != user.pk:
+        profile = models.CVUserProfile.objects.select_related('user').filter(user=user).first()
+        if profile is not None:
+            setattr(http_request, REQUEST_PROFILE_ATTR, profile)
+    return profile
+
+
 def get_user_profile(request: Request) -> models.CVUserProfile:
     if not request.user.is_authenticated:
         raise NotAuthenticated()
-    try:
-        profile = get_object_or_404(models.CVUserProfile, user=request.user)
-    except Exception as exc:
-        if isinstance(exc, Http404):
-            raise PermissionDenied(str(exc))
-        raise exc
+
+    profile = get_request_profile(request)
+    if profile is None:
+        raise PermissionDenied('No %s matches the given query.' % models.CVUserProfile._meta.object_name)
 
     return profile
 
 
+def check_profile_owning(request: Request, *profiled_instances: Optional[Model]):
+    """
+        Compares the `profile_id` of the instances with the profile of the request,
+        the related profiles are not loaded. None (the value is not changed) is skipped.
+    """
+    profile_id = get_user_profile(request).pk
+    for instance in profiled_instances:
+        if instance is not None and instance.profile_id != profile_id:
+            raise PermissionDenied()
+
+
 def catch_integrity_raise_validation(ser: Serializer, cback, *cback_args, **cback_kwargs):
     # tests that `cback` is not bound to an instance.
     args = []
@@ -136,9 +173,10 @@ class CVBaseSerializer(serializers.ModelSerializer):
     def _has_instance_profile(self, instance):
         """
             Used in .check_owning to test Serializer(....) .instance has .profile field
-            by default it will test instance.profile against request['user']
+            by default it will test instance.profile_id against the profile of request['user']
         """
-        if not hasattr(instance, 'profile'):
+        # `profile_id` does not load the related profile
+        if not hasattr(instance, 'profile_id'):
             raise AssertionError(self.assertion_messages['profile_required'])
 
     def get_profile(self, obj) -> str:
@@ -151,8 +189,7 @@ class CVBaseSerializer(serializers.ModelSerializer):
         self._has_request()
         self._has_instance_profile(instance)
 
-        if instance.profile != get_user_profile(self.context['request']):
-            raise PermissionDenied()
+        check_profile_owning(self.context['request'], instance)
 
     def to_representation(self, instance):
         self.check_owning(instance)
@@ -277,7 +314,8 @@ class TechnologiesSerializer(serializers.ModelSerializer):
         if instance.profile is None:
             # Any Users can read any rows where .profile is null
             pass
-        elif not user.is_authenticated or instance.profile.user != user:
+        elif not user.is_authenticated or instance.profile_id != getattr(
+                get_request_profile(self.context['request']), 'pk', None):
             PermissionDenied()
         return super().to_representation(instance)
 
@@ -295,7 +333,7 @@ class TechnologiesSerializer(serializers.ModelSerializer):
         if not r.user.is_staff:
             cur_user_profile = get_user_profile(r)
             validated_data.pop('profile', None)  # disable a modification of instance.profile
-            if instance.profile != cur_user_profile:
+            if instance.profile_id != cur_user_profile.pk:
                 raise PermissionDenied()
 
         return catch_integrity_raise_validation(self, super().update, instance, validated_data)
@@ -320,10 +358,7 @@ class ProjectTechnologySerializer(serializers.ModelSerializer):
 
     def check_project_owning(self, *projects):
         _has_request(self)
-        user_profile = get_user_profile(self.context['request'])
-        for project in projects:
-            if project.profile != user_profile:
-                raise PermissionDenied()
+        check_profile_owning(self.context['request'], *projects)
 
     def get_project_representation(self, obj: models.CVProjectTechnology):
         project = obj.project
@@ -403,6 +438,42 @@ class UserRetrieveUpdateSerializer(CVBaseSerializer):
         return res
 
 
+class StreamImageFormField(forms.ImageField):
+    """
+        Like forms.ImageField, but Pillow reads the uploaded file (stream) itself.
+        The original one reads the whole uploaded file into BytesIO (if it is not a temporary file)
+        that is the extra full copy of the image in memory.
+        Pillow reads only the header in `Image.open` and the chunks of data in `verify`.
+    """
+
+    def to_python(self, data):
+        if not callable(getattr(data, 'seek', None)):
+            return super().to_python(data)
+
+        f = forms.FileField.to_python(self, data)
+        if f is None:
+            return None
+
+        try:
+            data.seek(0)
+            image = Image.open(data)
+            image.verify()
+            f.image = image
+            f.content_type = Image.MIME.get(image.format)
+        except Exception as exc:
+            raise DjangoValidationError(self.error_messages["invalid_image"], code="invalid_image") from exc
+
+        f.seek(0)
+        return f
+
+
+class StreamImageField(serializers.ImageField):
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('_DjangoImageField', StreamImageFormField)
+        super().__init__(**kwargs)
+
+
 class ProfileSerializer(serializers.ModelSerializer):
     """
         It supports create, update, retrieve actions without 'photo' field as JSON
@@ -411,6 +482,7 @@ class ProfileSerializer(serializers.ModelSerializer):
         Other, file uploading cases are supported by ProfilePhotoSerializer
     """
     user = UserRetrieveUpdateSerializer(read_only=True)
+    serializer_field_mapping = serializers.ModelSerializer.serializer_field_mapping | {ImageField: StreamImageField}
 
     class Meta:
         model = models.CVUserProfile
@@ -425,7 +497,7 @@ class ProfileSerializer(serializers.ModelSerializer):
         if profile is None:
             profile = self.instance
 
-        if profile.user != self.context['request'].user:
+        if profile.user_id != self.context['request'].user.pk:
             raise PermissionDenied()
 
     # CVBaseSerializer.to_representation - returns standard serializers.ModelSerializer.to_representation
@@ -551,37 +623,47 @@ class WorkplaceProjectSerializer(serializers.ModelSerializer):
         model = models.CVWorkplaceProject
         fields = '__all__'
 
+    workplace_fields = ('id', 'workplace', 'begin', 'end')
+    project_fields = ('id', 'title', 'begin', 'end')
+
+    @functools.cached_property
+    def workplace_serializer(self) -> WorkplaceSerializer:
+        # one instance for all rows, the fields of the serializer are built once
+        return WorkplaceSerializer(read_only=True, context=self.context)
+
+    @functools.cached_property
+    def project_serializer(self) -> ProjectSerializer:
+        return ProjectSerializer(read_only=True, context=self.context)
+
+    def get_nested_representation(self, serializer: Serializer, instance: Model, field_names) -> dict:
+        """
+            The representation of the listed fields of the already loaded `instance`
+            (like serializer.to_representation does it, but without the unused fields and the ownership check)
+        """
+        fields = serializer.fields
+        res = {}
+        for field_name in field_names:
+            attribute = fields[field_name].get_attribute(instance)
+            res[field_name] = None if attribute is None else fields[field_name].to_representation(attribute)
+        return res
+
     def get_workplace_representation(self, workplace: models.CVWorkplace):
         # This approach relies on the implementation of the WorkplaceSerializer representation.
         # Another approach, see in the WorkplaceResponsibilitySerializer.get_workplace_representation.
-        req = self.context.get('request')
-        res = {f: v for f, v in WorkplaceSerializer(
-            workplace,
-            read_only=True,
-            context={'request': req}
-        ).data.items() if f in ('id', 'workplace', 'begin', 'end')}
-        res[self.url_field_name] = reverse(self.workplace_view_name, request=req)
+        res = self.get_nested_representation(self.workplace_serializer, workplace, self.workplace_fields)
+        res[self.url_field_name] = reverse(self.workplace_view_name, request=self.context.get('request'))
         return res
 
     def get_project_representation(self, project: models.CVProject):
         # This approach relies on the implementation of the ProjectSerializer representation.
         # Another approach, see in the WorkplaceResponsibilitySerializer.get_workplace_representation.
-        req = self.context.get('request')
-        res = {f: v for f, v in ProjectSerializer(
-            project,
-            read_only=True,
-            context={'request': req}
-        ).data.items() if f in ('id', 'title', 'begin', 'end')}
-        res[self.url_field_name] = reverse(self.project_view_name, request=req)
+        res = self.get_nested_representation(self.project_serializer, project, self.project_fields)
+        res[self.url_field_name] = reverse(self.project_view_name, request=self.context.get('request'))
         return res
 
     def check_owning(self, *profiled_instances: Model):
         _has_request(self)
-        user_profile = get_user_profile(self.context['request'])
-
-        for instance in profiled_instances:
-            if instance.profile != user_profile:
-                raise PermissionDenied()
+        check_profile_owning(self.context['request'], *profiled_instances)
 
     def to_representation(self, instance: models.CVWorkplaceProject):
         self.check_owning(instance.workplace, instance.project)
@@ -630,10 +712,7 @@ class WorkplaceResponsibilitySerializer(serializers.ModelSerializer):
 
     def check_workplace_owning(self, *workplaces: models.CVWorkplace):
         _has_request(self)
-        user_profile = get_user_profile(self.context['request'])
-        for workplace in workplaces:
-            if workplace.profile != user_profile:
-                raise PermissionDenied()
+        check_profile_owning(self.context['request'], *workplaces)
 
     def to_representation(self, instance: models.CVWorkplaceResponsibility):
         self.check_workplace_owning(instance.workplace)
@@ -649,3 +728,89 @@ class WorkplaceResponsibilitySerializer(serializers.ModelSerializer):
         self.check_workplace_owning(instance.workplace, validated_data.get('workplace'))
         return catch_integrity_raise_validation(self, super().update, instance, validated_data)
 
+
+
+class FullCVSerializer(serializers.BaseSerializer):
+    """
+        Read-only representation of the whole CV of the profile (instance):
+            {'profile': <ProfileSerializer representation>, '<section>': [<row>, ...], ...}
+
+        Each section is one `.values()` query (no model instances and no serializer per row),
+        the foreign keys are represented by ids, the rows of `technology` and `resource`
+        are the dictionary entries the CV refers to.
+    """
+
+    profile_serializer_class = ProfileSerializer
+
+    # section: (model, the lookups of the profile (OR-ed), fields, ordering)
+    sections = {
+        'education': (
+            models.CVEducation, ('profile', ),
+            ('id', 'begin', 'end', 'institution', 'speciality', 'degree', 'complete', 'allow_date_crossing'),
+            ('begin', 'id')
+        ),
+        'hobby': (models.CVHobby, ('profile', ), ('id', 'description'), ('id', )),
+        'language': (models.CVLanguage, ('profile', ), ('id', 'lang', 'level', 'notes'), ('id', )),
+        'workplace': (
+            models.CVWorkplace, ('profile', ),
+            ('id', 'workplace', 'begin', 'end', 'allow_date_crossing'),
+            ('begin', 'id')
+        ),
+        'workplace-responsibility': (
+            models.CVWorkplaceResponsibility, ('workplace__profile', ),
+            ('id', 'workplace', 'responsibility', 'role', 'begin', 'end'),
+            ('begin', 'id')
+        ),
+        'project': (
+            models.CVProject, ('profile', ),
+            ('id', 'title', 'description', 'prerequisite', 'result', 'begin', 'end', 'allow_date_crossing'),
+            ('begin', 'id')
+        ),
+        'project-technology': (
+            models.CVProjectTechnology, ('project__profile', ),
+            ('id', 'project', 'technology', 'duration', 'notes'),
+            ('project', 'id')
+        ),
+        'workplace-project': (
+            models.CVWorkplaceProject, ('workplace__profile', ), ('id', 'workplace', 'project'), ('id', )
+        ),
+        'user-resource': (models.CVUserResource, ('profile', ), ('id', 'resource', 'link'), ('id', )),
+        'technology': (
+            models.CVTechnologies, ('profile', 'cvprojecttechnology__project__profile'),
+            ('id', 'technology', 'technology_type'),
+            ('technology_type', 'technology', 'id')
+        ),
+        'resource': (models.CVResources, ('cvuserresource__profile', ), ('id', 'resource'), ('resource', 'id')),
+    }
+
+    # the values of these model fields are converted like the model serializers do it
+    value_converters = {
+        DurationField: duration_string,
+    }
+
+    def get_section_queryset(self, name: str, profile: models.CVUserProfile) -> QuerySet:
+        model, lookups, fields, ordering = self.sections[name]
+        condition = functools.reduce(operator.or_, (Q(**{lookup: profile.pk}) for lookup in lookups))
+        qs = model.objects.filter(condition).order_by(*ordering).values(*fields)
+        return qs.distinct() if len(lookups) > 1 else qs
+
+    def get_section_representation(self, name: str, profile: models.CVUserProfile) -> list[dict]:
+        model, lookups, fields, ordering = self.sections[name]
+        converters = {}
+        for field_name in fields:
+            converter = self.value_converters.get(type(model._meta.get_field(field_name)))
+            if converter is not None:
+                converters[field_name] = converter
+
+        rows = list(self.get_section_queryset(name, profile))
+        for row in rows:
+            for field_name, converter in converters.items():
+                if row[field_name] is not None:
+                    row[field_name] = converter(row[field_name])
+        return rows
+
+    def to_representation(self, instance: models.CVUserProfile) -> dict:
+        res = {'profile': self.profile_serializer_class(instance, context=self.context).data}
+        for name in self.sections:
+            res[name] = self.get_section_representation(name, instance)
+        return res
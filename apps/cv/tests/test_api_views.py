@@ -23,6 +23,8 @@ from django.forms import model_to_dict
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.test.client import MULTIPART_CONTENT, encode_multipart, BOUNDARY, Client
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.utils.encoding import force_bytes
 from django.views.static import serve as static_serve
 from rest_framework import status
@@ -32,6 +34,7 @@ from rest_framework.reverse import reverse
 from rest_framework.test import APIRequestFactory, force_authenticate, APIClient, APITestCase
 
 from apps.cv import models, views, serializers
+from apps.cv.versions import cv_versions, profile_scope, RESOURCES_SCOPE
 
 
 class TestUserRetrieveUpdate(TestCase):
@@ -370,6 +373,23 @@ class TestProfilePhotoUpdate(APITestCase):
 
         self._test_changes_in_databse(response)
 
+    def test_file_upload_invalid_image(self):
+        self._reset_profile_photo()
+
+        client = APIClient()
+        client.login(username=self.profile.user.username, password=self.password)
+        response = client.put(
+            reverse(self.profile_photo_view_name),
+            b'It is not an image' * 1024,
+            content_type='image/jpeg',
+            HTTP_CONTENT_DISPOSITION='attachment; filename="photo.jpg"'
+        )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertIn('photo', response.data)
+        self.profile.refresh_from_db()
+        self.assertFalse(self.profile.photo)
+
     def _test_method_not_allowed(self, method_name):
         client = APIClient()
         client.login(username=self.profile.user.username, password=self.password)
@@ -446,6 +466,21 @@ class TestResource(TestCase):
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertListEqual(all_res, response.data)
 
+    def test_etag(self):
+        def get(**headers):
+            request = self.factory.get(self.url_lc, **headers)
+            force_authenticate(request, user=self.user)
+            return self.view_lc(request)
+
+        etag = get()['ETag']
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, get(HTTP_IF_NONE_MATCH=etag).status_code)
+
+        # the dictionary is changed
+        models.CVResources.objects.create(resource='skype')
+        response = get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(['skype'], [r['resource'] for r in response.data])
+
     def test_02_retrieve(self):
         # any can retrieve
         model: Model = self.view_rud.view_class.serializer_class.Meta.model
@@ -564,6 +599,18 @@ class TestTechnology(TestCase):
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertListEqual(all_res, response.data)
 
+    def test_etag(self):
+        self.client.force_authenticate(self.user, None)
+        url = reverse('cv:technology-lc')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code)
+
+        # the dictionary is changed by other user
+        models.CVTechnologies.objects.create(technology='Python')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(['Python'], [t['technology'] for t in response.data])
+
     def test_02_retrieve(self):
         # any can retrieve
         self.client.force_authenticate(None, None)
@@ -1134,6 +1181,109 @@ class TestEducation(TestCase):
         self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
         obj.refresh_from_db()
 
+    def test_bulk_create(self):
+        self.client.force_authenticate(self.profile.user, None)
+
+        data = [
+            self.model_kwargs_to_data(self.get_model_kwargs()),
+            self.model_kwargs_to_data(self.get_update_model_kwargs())
+        ]
+        response = self.client.post(reverse(self.get_view_name()), data=data, format='json')
+
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        objs = self.get_object_model().objects.order_by('pk')
+        self.assertEqual(2, len(objs))
+        self.assertListEqual([r[self.get_object_model()._meta.pk.name] for r in response.data], [o.pk for o in objs])
+
+    def test_bulk_create_rollback(self):
+        self.client.force_authenticate(self.profile.user, None)
+
+        data = [self.model_kwargs_to_data(self.get_model_kwargs()), 'It is not a dictionary']
+        response = self.client.post(reverse(self.get_view_name()), data=data, format='json')
+
+        # nothing is saved if any item is invalid, the errors are in order of items
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual(2, len(response.data))
+        self.assertEqual({}, response.data[0])
+        self.assertIn('non_field_errors', response.data[1])
+        self.assertEqual(0, self.get_object_model().objects.count())
+
+    def test_etag(self):
+        self.client.force_authenticate(self.profile.user, None)
+        obj = self.create_object()
+        table = f'"{self.get_object_model()._meta.db_table}"'
+
+        list_url, detail_url = reverse(self.get_view_name()), reverse(self.get_view_name(), args=[obj.pk])
+        etags = {}
+        for url in (list_url, detail_url):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(status.HTTP_200_OK, response.status_code)
+                etags[url] = response['ETag']
+
+                # the data is not queried for the matched tag
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+                self.assertEqual(etags[url], response['ETag'])
+                self.assertEqual(b'', response.content)
+                self.assertFalse([q['sql'] for q in queries.captured_queries if table in q['sql']])
+
+        self.assertNotEqual(etags[list_url], etags[detail_url])
+
+        # the tag of other user is other
+        self.client.force_authenticate(self.profiles[1].user, None)
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=etags[list_url])
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+        # a write changes the tag
+        self.client.force_authenticate(self.profile.user, None)
+        response = self.client.delete(detail_url)
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=etags[list_url])
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertNotEqual(etags[list_url], response['ETag'])
+
+    def test_profile_queries(self):
+        self.client.force_authenticate(self.profile.user, None)
+        table = f'"{models.CVUserProfile._meta.db_table}"'
+
+        for n, model_kwargs in enumerate((self.get_model_kwargs(), self.get_update_model_kwargs()), 1):
+            self.get_object_model().objects.create(**model_kwargs)
+            with self.subTest(rows=n), CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse(self.get_view_name()))
+                self.assertEqual(status.HTTP_200_OK, response.status_code)
+                self.assertEqual(n, len(response.data))
+                # the profile is resolved once per request, the ownership of rows is checked by ids
+                self.assertEqual(1, len([q for q in queries.captured_queries if table in q['sql']]))
+
+    def test_bulk_update(self):
+        self.client.force_authenticate(self.profile.user, None)
+
+        obj = self.create_object()
+        data = self.model_kwargs_to_data(model_to_dict(obj) | self.get_update_model_kwargs())
+        response = self.client.put(reverse(self.get_view_name()), data=[data], format='json')
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(1, len(response.data))
+
+        obj.refresh_from_db()
+        self.assertDictEqual(self.model_kwargs_to_data(model_to_dict(obj)), data)
+
+    def test_bulk_update_bad_user(self):
+        self.client.force_authenticate(self.profiles[1].user, None)
+
+        obj = self.create_object()
+        data = self.model_kwargs_to_data(model_to_dict(obj) | self.get_update_model_kwargs())
+        response = self.client.patch(reverse(self.get_view_name()), data=[data], format='json')
+
+        # the other's objects are not found, thus nothing is saved
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual([{'id': ['Not found.']}], response.data)
+        obj_data = self.model_kwargs_to_data(model_to_dict(obj))
+        obj.refresh_from_db()
+        self.assertDictEqual(obj_data, self.model_kwargs_to_data(model_to_dict(obj)))
+
 
 class TestHobby(TestEducation):
     """
@@ -1622,3 +1772,289 @@ class TestWorkplaceProject(TestEducation):
                 response = self.client.put(reverse(self.get_view_name(), kwargs={'pk': obj.pk}), data=data)
 
                 self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+    def test_bulk_create_integrity_rollback(self):
+        self.client.force_authenticate(self.profile.user, None)
+
+        # both items are valid, but `project` is unique, thus the second item fails on save
+        data = [
+            self.model_kwargs_to_data(self.get_model_kwargs()),
+            self.model_kwargs_to_data(self.get_model_kwargs() | {'workplace': self.workplaces[1]}),
+        ]
+        response = self.client.post(reverse(self.get_view_name()), data=data, format='json')
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual(2, len(response.data))
+        self.assertEqual({}, response.data[0])
+        self.assertTrue(response.data[1])
+        self.assertEqual(0, self.get_object_model().objects.count())
+
+
+class CVRowsTestCase(TestCase):
+    """
+        The profile of the logged in user with any number of rows in each section
+    """
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        user = get_user_model().objects.create_user(username='test_user', password='12345678')
+        self.profile = models.CVUserProfile.objects.create(user=user, birthday=datetime.date(2001, 1, 1))
+        self.workplace = models.CVWorkplace.objects.create(
+            profile=self.profile, workplace='Company', begin=datetime.date(1990, 1, 1)
+        )
+        self.technology = models.CVTechnologies.objects.create(technology='Python')
+        self.client.force_authenticate(user, None)
+
+    def get_range(self, i: int, start: datetime.date) -> dict:
+        # the ranges do not cross, `allow_date_crossing` (where it exists) only skips the slow check of it
+        begin = start + datetime.timedelta(days=2 * i)
+        return {'begin': begin, 'end': begin + datetime.timedelta(days=1)}
+
+    def create_rows(self, start: int, stop: int):
+        numbers = range(start, stop)
+        models.CVEducation.objects.bulk_create(
+            models.CVEducation(
+                profile=self.profile, institution=f'Institution #{i}', speciality='Speciality', degree='Degree',
+                allow_date_crossing=True,
+                **self.get_range(i, datetime.date(1991, 1, 1))
+            ) for i in numbers
+        )
+        models.CVHobby.objects.bulk_create(
+            models.CVHobby(profile=self.profile, description=f'Hobby #{i}') for i in numbers
+        )
+        resources = models.CVResources.objects.bulk_create(models.CVResources(resource=f'r{i}') for i in numbers)
+        models.CVUserResource.objects.bulk_create(
+            models.CVUserResource(profile=self.profile, resource=r) for r in resources
+        )
+        models.CVWorkplaceResponsibility.objects.bulk_create(
+            models.CVWorkplaceResponsibility(
+                workplace=self.workplace, responsibility=f'Responsibility #{i}', role='Developer',
+                **self.get_range(i, datetime.date(1991, 1, 1))
+            ) for i in numbers
+        )
+        projects = models.CVProject.objects.bulk_create(
+            models.CVProject(
+                profile=self.profile, title=f'Project #{i}', description='Description', allow_date_crossing=True,
+                **self.get_range(i, datetime.date(1991, 1, 1))
+            ) for i in numbers
+        )
+        models.CVProjectTechnology.objects.bulk_create(
+            models.CVProjectTechnology(project=p, technology=self.technology, duration=datetime.timedelta(days=1))
+            for p in projects
+        )
+        models.CVWorkplaceProject.objects.bulk_create(
+            models.CVWorkplaceProject(workplace=self.workplace, project=p) for p in projects
+        )
+        # bulk_create does not send the signals
+        cv_versions.bump(profile_scope(self.profile.pk), RESOURCES_SCOPE)
+
+
+class TestListNumQueries(CVRowsTestCase):
+    """
+        The number of queries of the list does not depend on the number of rows
+    """
+
+    view_names = (
+        'cv:education', 'cv:hobby', 'cv:project', 'cv:workplace', 'cv:user-resource',
+        'cv:project-technology', 'cv:workplace-responsibility', 'cv:workplace-project',
+    )
+
+    def test_num_queries(self):
+        created = 0
+        for rows in (1, 10, 1000):
+            self.create_rows(created, rows)
+            created = rows
+            for view_name in self.view_names:
+                # profile, versions (ETag) and rows
+                with self.subTest(view_name=view_name, rows=rows), self.assertNumQueries(3):
+                    response = self.client.get(reverse(view_name))
+                    self.assertEqual(status.HTTP_200_OK, response.status_code)
+                    self.assertEqual(1 if view_name == 'cv:workplace' else rows, len(response.data))
+
+    def test_workplace_project_representation(self):
+        self.create_rows(0, 1)
+        response = self.client.get(reverse('cv:workplace-project'))
+
+        project = models.CVProject.objects.get()
+        self.assertEqual(
+            {'id': self.workplace.pk, 'workplace': 'Company', 'begin': '1990-01-01', 'end': None,
+             'url': reverse('cv:workplace', request=response.wsgi_request)},
+            response.data[0]['workplace']
+        )
+        self.assertEqual(
+            {'id': project.pk, 'title': 'Project #0', 'begin': '1991-01-01', 'end': '1991-01-02',
+             'url': reverse('cv:project', request=response.wsgi_request)},
+            response.data[0]['project']
+        )
+
+
+class TestFullCV(CVRowsTestCase):
+
+    def test_num_queries(self):
+        created = 0
+        for rows in (1, 10, 100):
+            self.create_rows(created, rows)
+            created = rows
+            # profile, versions (ETag) and one query per section
+            with self.subTest(rows=rows), self.assertNumQueries(2 + len(serializers.FullCVSerializer.sections)):
+                response = self.client.get(reverse('cv:full'))
+                self.assertEqual(status.HTTP_200_OK, response.status_code)
+                self.assertEqual(rows, len(response.data['project-technology']))
+
+    def test_retrieve(self):
+        self.create_rows(0, 2)
+        models.CVTechnologies.objects.create(technology='Unused')
+        own = models.CVTechnologies.objects.create(technology='Own', profile=self.profile)
+        response = self.client.get(reverse('cv:full'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+        data = response.data
+        self.assertEqual(self.profile.pk, data['profile']['id'])
+        self.assertEqual('test_user', data['profile']['user']['username'])
+        self.assertEqual(
+            [{'id': p.pk, 'title': p.title, 'description': 'Description', 'prerequisite': p.prerequisite,
+              'result': p.result,
+              'begin': p.begin, 'end': p.end, 'allow_date_crossing': True}
+             for p in models.CVProject.objects.order_by('begin')],
+            data['project']
+        )
+        pt = models.CVProjectTechnology.objects.order_by('project', 'id')[0]
+        self.assertEqual(
+            {'id': pt.pk, 'project': pt.project_id, 'technology': self.technology.pk, 'duration': '1 00:00:00',
+             'notes': None},
+            data['project-technology'][0]
+        )
+        # own technologies and the ones that are used in the projects, without duplicates
+        self.assertEqual(
+            [{'id': own.pk, 'technology': 'Own', 'technology_type': 'OTHER'},
+             {'id': self.technology.pk, 'technology': 'Python', 'technology_type': 'OTHER'}],
+            data['technology']
+        )
+        self.assertEqual(['r0', 'r1'], [r['resource'] for r in data['resource']])
+        self.assertEqual(1, len(data['workplace']))
+        self.assertEqual(2, len(data['workplace-responsibility']))
+        self.assertEqual(2, len(data['workplace-project']))
+        self.assertEqual(['Hobby #0', 'Hobby #1'], [h['description'] for h in data['hobby']])
+        self.assertEqual([], data['language'])
+
+        # the rendered dates are in ISO format
+        self.assertIn(b'"begin":"1991-01-01"', response.content)
+
+    def test_etag(self):
+        self.create_rows(0, 1)
+        response = self.client.get(reverse('cv:full'))
+        etag = response['ETag']
+        response = self.client.get(reverse('cv:full'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+
+        models.CVHobby.objects.create(profile=self.profile, description='New hobby')
+        response = self.client.get(reverse('cv:full'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_no_profile(self):
+        self.client.force_authenticate(get_user_model().objects.create_user(username='no_profile'), None)
+        response = self.client.get(reverse('cv:full'))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+        self.client.force_authenticate(None, None)
+        response = self.client.get(reverse('cv:full'))
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+    def test_read_only(self):
+        response = self.client.post(reverse('cv:full'), data={}, format='json')
+        self.assertEqual(status.HTTP_405_METHOD_NOT_ALLOWED, response.status_code)
+
+
+class TestKeysetPagination(CVRowsTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.create_rows(0, 25)
+
+    def walk(self, url: str, link: str = 'next') -> list[list]:
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            pages.append([row['id'] for row in response.data['results']])
+            url = response.data[link]
+        return pages
+
+    def test_pages(self):
+        ids = list(models.CVProject.objects.order_by('begin', 'id').values_list('id', flat=True))
+
+        pages = self.walk(reverse('cv:project') + '?page_size=10')
+        self.assertEqual([10, 10, 5], [len(page) for page in pages])
+        self.assertEqual(ids, sum(pages, []))
+
+        # from the last page back to the first one
+        response = self.client.get(reverse('cv:project') + '?page_size=10')
+        response = self.client.get(response.data['next'])
+        last_page = self.client.get(response.data['next'])
+        self.assertIsNone(last_page.data['next'])
+        pages = self.walk(last_page.data['previous'], 'previous')
+        self.assertEqual([ids[10:20], ids[:10]], pages)
+
+    def test_ordering(self):
+        ids = list(models.CVProject.objects.order_by('-begin', 'id').values_list('id', flat=True))
+        pages = self.walk(reverse('cv:project') + '?page_size=7&ordering=-begin')
+        self.assertEqual(ids, sum(pages, []))
+
+        # not paginated list is ordered also
+        response = self.client.get(reverse('cv:project') + '?ordering=-begin')
+        self.assertEqual(ids, [row['id'] for row in response.data])
+
+        for ordering in ('title', 'end', 'begin,-begin'):
+            with self.subTest(ordering=ordering):
+                response = self.client.get(reverse('cv:project') + f'?ordering={ordering}')
+                self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+                self.assertIn('ordering', response.data)
+
+    def test_stable_cursor(self):
+        response = self.client.get(reverse('cv:hobby') + '?page_size=10')
+        first_page = [row['id'] for row in response.data['results']]
+
+        # the rows of the first page are deleted, the new rows are added
+        models.CVHobby.objects.filter(pk__in=first_page[5:]).delete()
+        models.CVHobby.objects.create(profile=self.profile, description='New hobby')
+        pages = self.walk(response.data['next'])
+
+        ids = list(models.CVHobby.objects.order_by('id').values_list('id', flat=True))
+        self.assertEqual(ids[5:], sum(pages, []))
+
+    def test_not_paginated(self):
+        response = self.client.get(reverse('cv:education'))
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(25, len(response.data))
+
+    def test_num_queries(self):
+        response = self.client.get(reverse('cv:project-technology') + '?page_size=10')
+        # profile, versions (ETag) and rows
+        with self.assertNumQueries(3):
+            response = self.client.get(response.data['next'])
+        self.assertEqual(10, len(response.data['results']))
+
+    def test_invalid_params(self):
+        for query in ('?cursor=bad', '?cursor=e30=', '?page_size=0', '?page_size=x'):
+            with self.subTest(query=query):
+                response = self.client.get(reverse('cv:project') + query)
+                self.assertIn(response.status_code, (status.HTTP_400_BAD_REQUEST, status.HTTP_404_NOT_FOUND))
+
+        # the cursor of another ordering
+        response = self.client.get(reverse('cv:project') + '?page_size=10')
+        cursor = response.data['next'].split('cursor=')[1]
+        response = self.client.get(reverse('cv:project') + f'?page_size=10&ordering=-begin&cursor={cursor}')
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_technology(self):
+        for i in range(12):
+            models.CVTechnologies.objects.create(technology=f'Technology #{i:02}')
+        names = list(models.CVTechnologies.objects.order_by('technology', 'id').values_list('technology', flat=True))
+
+        url = reverse('cv:technology-lc') + '?page_size=5&ordering=technology'
+        pages = []
+        while url:
+            response = self.client.get(url)
+            pages.append([row['technology'] for row in response.data['results']])
+            url = response.data['next']
+        self.assertEqual(names, sum(pages, []))
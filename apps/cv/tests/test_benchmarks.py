@@ -0,0 +1,59 @@
+# IDE: PyCharm
+# Project: cv
+# Path: apps/cv/tests
+# File: test_benchmarks.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 12:05 PM
+import pathlib
+import tempfile
+
+from django.test import SimpleTestCase
+
+from apps.cv.benchmarks.compare import CompareBenchmark, BenchmarkResult
+from apps.cv.benchmarks.data import CVDataFactory, Similarity
+
+
+class TestCVDataFactory(SimpleTestCase):
+
+    def test_reproducible(self):
+        self.assertEqual(CVDataFactory(1).technology_rows(20), CVDataFactory(1).technology_rows(20))
+        self.assertEqual(CVDataFactory(1).date_range_pairs(20), CVDataFactory(1).date_range_pairs(20))
+        self.assertNotEqual(CVDataFactory(1).technology_rows(20), CVDataFactory(2).technology_rows(20))
+
+    def test_similarity(self):
+        s, u = CVDataFactory(1, Similarity(exact=1, similar=0)).project_rows(30)
+        self.assertEqual(30, len(s))
+        self.assertListEqual(list(range(1, 31)), [row['id'] for row in s])
+        stored = [{k: v for k, v in row.items() if k != 'id'} for row in s]
+        self.assertTrue(all(row in stored for row in u))
+
+        s, u = CVDataFactory(1, Similarity(exact=0, similar=0)).technology_rows(30)
+        stored = [{k: v for k, v in row.items() if k != 'id'} for row in s]
+        self.assertFalse(any(row in stored for row in u))
+
+    def test_date_ranges(self):
+        for b, e in CVDataFactory(1).date_ranges(50):
+            self.assertTrue(e is None or b <= e)
+
+
+class TestCompareBenchmark(SimpleTestCase):
+
+    def test_run(self):
+        bench = CompareBenchmark(sizes=[10], repeat=1, names=['DataMatcher.match', 'DateRangeMatcher.match'])
+        results = bench.run()
+        self.assertListEqual(['DataMatcher.match', 'DateRangeMatcher.match'], [r.name for r in results])
+        for r in results:
+            self.assertEqual(10, r.size)
+            self.assertLess(0, r.seconds)
+            self.assertLess(0, r.peak_memory)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = pathlib.Path(tmp_dir, 'bench.json')
+            bench.save(results, path)
+            self.assertListEqual(results, bench.load(path))
+
+    def test_regressions(self):
+        baseline = [BenchmarkResult('a', 10, 1, 1., 1., 10., 0), BenchmarkResult('b', 10, 1, 1., 1., 10., 0)]
+        results = [BenchmarkResult('a', 10, 1, 2., .5, 5., 0), BenchmarkResult('b', 10, 1, 1.2, .8, 8., 0),
+                   BenchmarkResult('c', 10, 1, 9., .1, 1., 0)]
+        self.assertListEqual([(baseline[0], results[0], 2.)], CompareBenchmark.regressions(baseline, results))
@@ -0,0 +1,113 @@
+# IDE: PyCharm
+# Project: cv
+# Path: apps/cv/tests
+# File: test_cache.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 11:40 PM
+
+import datetime
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.test.utils import override_settings
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from apps.cv import models
+from apps.cv.cache import response_cache
+
+
+class TestResponseCache(TestCase):
+
+    backend = 'django.core.cache.backends.locmem.LocMemCache'
+
+    def setUp(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        settings = override_settings(
+            CACHES={'default': {'BACKEND': self.backend, 'LOCATION': tmp_dir.name}},
+            CV_RESPONSE_CACHE='default'
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.client = APIClient()
+        self.users = [get_user_model().objects.create_user(username=f'user{n}', password='12345678') for n in range(2)]
+        self.profiles = [
+            models.CVUserProfile.objects.create(user=user, birthday=datetime.date(2001, 1, 1)) for user in self.users
+        ]
+        for profile in self.profiles:
+            models.CVHobby.objects.create(profile=profile, description=f'Hobby of {profile.user.username}')
+        self.client.force_authenticate(self.users[0], None)
+
+    def get(self, url: str, x_cache: str):
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(x_cache, response[response_cache.header_name])
+        return response
+
+    def test_hit_and_miss(self):
+        url = reverse('cv:hobby')
+        data = self.get(url, 'MISS').data
+        # profile and versions only
+        with self.assertNumQueries(2):
+            self.assertEqual(data, self.get(url, 'HIT').data)
+        self.assertEqual({'cache': 'default', 'hits': 1, 'misses': 1}, response_cache.get_stats())
+
+        # another query params, another user
+        self.get(url + '?ordering=-id', 'MISS')
+        self.client.force_authenticate(self.users[1], None)
+        self.assertEqual('Hobby of user1', self.get(url, 'MISS').data[0]['description'])
+
+    def test_write(self):
+        url = reverse('cv:full')
+        self.get(url, 'MISS')
+        self.get(url, 'HIT')
+
+        models.CVHobby.objects.create(profile=self.profiles[0], description='New hobby')
+        response = self.get(url, 'MISS')
+        self.assertEqual(2, len(response.data['hobby']))
+
+        # the data of another profile does not change the version
+        models.CVHobby.objects.create(profile=self.profiles[1], description='New hobby')
+        self.get(url, 'HIT')
+
+    def test_etag(self):
+        url = reverse('cv:hobby')
+        etag = self.get(url, 'MISS')['ETag']
+        self.assertEqual(etag, self.get(url, 'HIT')['ETag'])
+
+    def test_api_root(self):
+        url = reverse('cv:api_root')
+        data = self.get(url, 'MISS').data
+        self.assertEqual(data, self.get(url, 'HIT').data)
+
+    def test_disabled(self):
+        with override_settings(CV_RESPONSE_CACHE=None):
+            response = self.client.get(reverse('cv:hobby'))
+            self.assertNotIn(response_cache.header_name, response)
+            self.assertEqual({'cache': None, 'hits': None, 'misses': None}, response_cache.get_stats())
+
+    def test_stats(self):
+        url = reverse('cv:cache-stats')
+        self.get(reverse('cv:hobby'), 'MISS')
+
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+        self.users[0].is_staff = True
+        self.users[0].save()
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual({'cache': 'default', 'hits': 0, 'misses': 1}, response.data)
+
+        response = self.client.delete(url)
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+        self.assertEqual({'cache': 'default', 'hits': 0, 'misses': 0}, response_cache.get_stats())
+
+
+class TestFileResponseCache(TestResponseCache):
+
+    backend = 'django.core.cache.backends.filebased.FileBasedCache'
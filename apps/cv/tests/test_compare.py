@@ -6,11 +6,16 @@
 # Created by ox23 at 2023-10-23 (y-m-d) 9:32 PM
 import datetime
 import functools
+import json
 import random
 
 from django.test import TestCase
 
-from apps.cv.compare import DataMatcher, DateRangeCrossing, DateRangeMatcher, CrossingType
+from apps.cv.compare import (
+    DataMatcher, CompleteDataComparer, DateRangeCrossing, DateRangeMatcher, CrossingType, DictComparer, RatioMatrix,
+    GreedyMatching, AssignmentMatching, SerializationCache, NGramIndex, IntervalIndex, ParallelExecution,
+    DataComparer
+)
 
 
 class TestFullDataComparer(TestCase):
@@ -18,76 +23,6 @@ class TestFullDataComparer(TestCase):
     def setUp(self) -> None:
         ...
 
-    def test__remove_ambiguity(self):
-        """
-        -------------------------> s
-        | .3 | .6 | .7 | .7 | .2 |
-        | .9 | .2 | .9 | .6 | .6 |
-        | .5 | .8 | .4 | .7 | .5 |
-        | .9 | .6 | .9 | .9 | .1 |
-        u
-        """
-        dc = DataMatcher([], [])
-
-        # test for .9
-        with self.subTest('subtest maxes set #1'):
-            maxes = [
-                ((1, 0), .9), ((1, 2), .9),
-                ((3, 0), .9), ((3, 2), .9), ((3, 3), .9)
-            ]
-            test_result = [((1, 0), .9), ((3, 2), .9)]
-            res = dc._remove_ambiguity(maxes)
-            self.assertListEqual(test_result, res)
-
-        with self.subTest('subtest maxes set #2'):
-            maxes = [
-                ((3, 3), .9), ((3, 2), .9), ((1, 2), .9),
-                ((3, 0), .9), ((1, 0), .9),
-            ]
-            test_result = [((3, 3), .9), ((1, 2), .9)]
-            res = dc._remove_ambiguity(maxes)
-            self.assertListEqual(test_result, res)
-
-        with self.subTest('empty maxes'):
-            self.assertListEqual(dc._remove_ambiguity([]), [])
-
-        with self.subTest('maxes has different ratio'):
-            maxes = [((3, 3), .9), ((3, 2), .8)]
-            with self.assertRaises(AssertionError) as exc:
-                res = dc._remove_ambiguity(maxes)
-            texcstr = "Warning: ratios [0.8:0.9] must be equal"
-            self.assertEqual(str(exc.exception), texcstr)
-
-    def test__get_maxed(self):
-        """
-        -------------------------> s
-        | .3 | .6 | .7 | .7 | .2 |
-        | .9 | .2 | .9 | .6 | .6 |
-        | .5 | .8 | .4 | .7 | .5 |
-        | .9 | .6 | .9 | .9 | .1 |
-        u
-        """
-        # ratios is { (ui, si): ratio, ..... }
-        ratios_list = [
-            ((0, 0), .3), ((0, 1), .6), ((0, 2), .7), ((0, 3), .7), ((0, 4), .2),
-            ((1, 0), .9), ((1, 1), .2), ((1, 2), .9), ((1, 3), .6), ((1, 4), .6),
-            ((2, 0), .5), ((2, 1), .8), ((2, 2), .4), ((2, 3), .7), ((2, 4), .5),
-            ((3, 0), .9), ((3, 1), .6), ((3, 2), .9), ((3, 3), .9), ((3, 4), .1)
-        ]
-        ratios = dict(ratios_list)
-
-        dc = DataMatcher([], [])
-        maxes_09 = [((1, 0), .9), ((1, 2), .9), ((3, 0), .9), ((3, 2), .9), ((3, 3), .9)]
-        with self.subTest('maxes for 0.9'):
-            maxes = dc._get_maxed(ratios, {})
-            self.assertListEqual(maxes_09, maxes)
-
-        excludes: dict[str, set[int]] = {k: {ri[0][ki] for ri in maxes_09} for ki, k in enumerate('us')}
-        maxes_08 = [((2, 1), .8)]
-        with self.subTest('maxes for next after 0.9 -> ((2, 1), .8)'):
-            maxes = dc._get_maxed(ratios, excludes)
-            self.assertListEqual(maxes_08, maxes)
-
     def test__get_ratios(self):
         """
              | ltp | udp | smtp | tftp | sftp | umtp|
@@ -103,10 +38,11 @@ class TestFullDataComparer(TestCase):
         dc.ratio_round_precision = 1
         excludes, maxes = {}, []
         ratios = dc._get_ratios(excludes, maxes, False, False)
+        # 'udp' is equal to s[1], thus its row and column are not compared
         test_ratios = {
-            (0, 0): 0.7, (0, 1): 0.5, (0, 2): 0.6, (0, 3): 0.8, (0, 4): 0.6, (0, 5): 0.6,
-            (1, 0): 0.8, (1, 1): 0.6, (1, 2): 0.9, (1, 3): 0.7, (1, 4): 0.9, (1, 5): 0.7,
-            (2, 0): 0.6, (2, 1): 1.0,
+            (0, 0): 0.7, (0, 2): 0.6, (0, 3): 0.8, (0, 4): 0.6, (0, 5): 0.6,
+            (1, 0): 0.8, (1, 2): 0.9, (1, 3): 0.7, (1, 4): 0.9, (1, 5): 0.7,
+            (2, 1): 1.0,
             (3, 0): 0.8, (3, 2): 0.7, (3, 3): 0.7, (3, 4): 0.7, (3, 5): 0.9
         }
         with self.subTest('main subtest'):
@@ -128,9 +64,9 @@ class TestFullDataComparer(TestCase):
             self.assertDictEqual({'u': {2}, 's': {1}}, excludes)
 
         test_ratios = {
-            (0, 0): 0.7, (0, 1): 0.5, (0, 2): 0.6, (0, 3): 0.8, (0, 4): 0.6, (0, 5): 0.6,
+            (0, 0): 0.7, (0, 2): 0.6, (0, 3): 0.8, (0, 4): 0.6, (0, 5): 0.6,
 
-            (2, 0): 0.6, (2, 1): 1.0,
+            (2, 1): 1.0,
             (3, 0): 0.8, (3, 2): 0.7, (3, 3): 0.7, (3, 4): 0.7, (3, 5): 0.9
         }
         excludes, maxes = {'u': {1}}, []
@@ -141,9 +77,9 @@ class TestFullDataComparer(TestCase):
             self.assertDictEqual({'u': {1, 2}, 's': {1}}, excludes)
 
         test_ratios = {
-            (0, 0): 0.7, (0, 1): 0.5, (0, 3): 0.8, (0, 4): 0.6, (0, 5): 0.6,
-            (1, 0): 0.8, (1, 1): 0.6, (1, 3): 0.7, (1, 4): 0.9, (1, 5): 0.7,
-            (2, 0): 0.6, (2, 1): 1.0,
+            (0, 0): 0.7, (0, 3): 0.8, (0, 4): 0.6, (0, 5): 0.6,
+            (1, 0): 0.8, (1, 3): 0.7, (1, 4): 0.9, (1, 5): 0.7,
+            (2, 1): 1.0,
             (3, 0): 0.8, (3, 3): 0.7, (3, 4): 0.7, (3, 5): 0.9
         }
         excludes, maxes = {'s': {2}}, []
@@ -295,6 +231,382 @@ class TestFullDataComparer(TestCase):
             matches = dc.match()
             self.assertEqual(test_matches, matches)
 
+    def test_iter_match(self):
+        s_list = [{'key': v} for v in ('ltp', 'udp', 'smtp', 'tftp', 'sftp', 'umtp')]
+        u_list = [{'key': v} for v in ('https', 'stp', 'udp', 'utp')]
+        dc = DataMatcher(s_list, u_list)
+        dc.ratio_round_precision = 1
+        test_items = [
+            ('n', (2, 1), 1.0), ('u', (1, 2), 0.9), ('u', (3, 5), 0.9), ('u', (0, 3), 0.8),
+            ('d', (None, 0), 1.0), ('d', (None, 4), 1.0)
+        ]
+        self.assertListEqual(test_items, [*dc.iter_match()])
+
+        with self.subTest('the equal rows are yielded before the ratio matrix is built'):
+            built = []
+
+            class TrackedRatioMatrix(RatioMatrix):
+
+                @property
+                def matrix(self):
+                    built.append(len(self.u))
+                    return super().matrix
+
+            dc.ratio_matrix_class = TrackedRatioMatrix
+            items = dc.iter_match()
+            self.assertEqual(('n', (2, 1), 1.0), next(items))
+            self.assertListEqual([], built)
+            self.assertListEqual(test_items[1:], [*items])
+            # the row of 'udp' is not compared
+            self.assertListEqual([3], built)
+
+        with self.subTest('s is empty'):
+            dc.s = []
+            self.assertListEqual([('i', (ui, None), 1.0) for ui in range(4)], [*dc.iter_match()])
+
+    def test_iter_prepare_to_update(self):
+        s_list = [{'id': i + 10, 'key': v} for i, v in enumerate(('ltp', 'udp', 'smtp', 'tftp'))]
+        u_list = [{'key': v} for v in ('https', 'stp', 'udp', 'django')]
+        dc = CompleteDataComparer(s_list, u_list)
+        dc.ratio_round_precision = 1
+        items = [*dc.iter_prepare_to_update()]
+        # updates first in the order of decreasing ratio, then inserts
+        self.assertListEqual(
+            [{'key': 'stp', 'id': 12}, {'key': 'https', 'id': 13}, {'key': 'django', 'id': 10}], items
+        )
+        self.assertListEqual(
+            sorted(dc.prepare_to_update(), key=lambda u: u['key']), sorted(items, key=lambda u: u['key'])
+        )
+
+
+class TestMatchingStrategy(TestCase):
+    """
+    -------------------------> s
+    | .3 | .6 | .7 | .7 | .2 |
+    | .9 | .2 | .9 | .6 | .6 |
+    | .5 | .8 | .4 | .7 | .5 |
+    | .9 | .6 | .9 | .9 | .1 |
+    u
+    """
+
+    ratios = dict([
+        ((0, 0), .3), ((0, 1), .6), ((0, 2), .7), ((0, 3), .7), ((0, 4), .2),
+        ((1, 0), .9), ((1, 1), .2), ((1, 2), .9), ((1, 3), .6), ((1, 4), .6),
+        ((2, 0), .5), ((2, 1), .8), ((2, 2), .4), ((2, 3), .7), ((2, 4), .5),
+        ((3, 0), .9), ((3, 1), .6), ((3, 2), .9), ((3, 3), .9), ((3, 4), .1)
+    ])
+
+    def test_greedy(self):
+        test_matches = [((1, 0), .9), ((3, 2), .9), ((2, 1), .8), ((0, 3), .7)]
+        self.assertListEqual(test_matches, GreedyMatching().match(self.ratios))
+
+        with self.subTest('min_ratio'):
+            self.assertListEqual(test_matches[:3], GreedyMatching(.8).match(self.ratios))
+
+        with self.subTest('empty'):
+            self.assertListEqual([], GreedyMatching().match({}))
+
+    def test_greedy_ties(self):
+        # all of them are .9, the lower (ui, si) wins regardless of the order of the ratios
+        maxes = [((1, 0), .9), ((1, 2), .9), ((3, 0), .9), ((3, 2), .9), ((3, 3), .9)]
+        test_matches = [((1, 0), .9), ((3, 2), .9)]
+        self.assertListEqual(test_matches, GreedyMatching().match(dict(maxes)))
+        self.assertListEqual(test_matches, GreedyMatching().match(dict(reversed(maxes))))
+
+        with self.subTest('the next after .9'):
+            self.assertListEqual([((2, 1), .8)], GreedyMatching().match(self.ratios)[2:3])
+
+    def test_assignment(self):
+        ratios = {(0, 0): .9, (0, 1): .8, (1, 0): .8, (1, 1): .1}
+        self.assertListEqual([((0, 0), .9), ((1, 1), .1)], GreedyMatching().match(ratios))
+        self.assertListEqual([((0, 1), .8), ((1, 0), .8)], AssignmentMatching().match(ratios))
+
+        with self.subTest('the max sum of ratios'):
+            matches = AssignmentMatching().match(self.ratios)
+            self.assertEqual(3.3, round(sum(r for _, r in matches), 4))
+            self.assertEqual(4, len({ui for (ui, _), _ in matches}))
+            self.assertEqual(4, len({si for (_, si), _ in matches}))
+
+        with self.subTest('exact matches first'):
+            ratios = {(0, 0): 1.0, (0, 1): .9, (1, 0): .9, (1, 1): .1}
+            self.assertListEqual([((0, 0), 1.0), ((1, 1), .1)], AssignmentMatching().match(ratios))
+
+        with self.subTest('min_ratio'):
+            ratios = {(0, 0): .9, (0, 1): .8, (1, 0): .8, (1, 1): .1, (2, 1): .4}
+            self.assertListEqual([((0, 1), .8), ((1, 0), .8)], AssignmentMatching(.3).match(ratios))
+            self.assertListEqual([((0, 0), .9)], AssignmentMatching(.85).match(ratios))
+
+    def test_data_matcher_strategy(self):
+        s_list = [{'key': v} for v in ('ltp', 'udp', 'smtp', 'tftp', 'sftp', 'umtp')]
+        u_list = [{'key': v} for v in ('https', 'stp', 'udp', 'utp')]
+        dc = DataMatcher(s_list, u_list, AssignmentMatching(.85))
+        dc.ratio_round_precision = 1
+        test_matches = {
+            'u': [((1, 2), 0.9), ((3, 5), 0.9)],
+            'i': [((0, None), 1.0)],
+            'd': [((None, 0), 1.0), ((None, 3), 1.0), ((None, 4), 1.0)],
+            'n': [((2, 1), 1.0)]
+        }
+        self.assertEqual(test_matches, dc.match())
+
+
+class TestSerializationCache(TestCase):
+
+    def test_dumps(self):
+        cache = SerializationCache(maxsize=2)
+        lst = [1, 2]
+        self.assertEqual('"abc"', cache.dumps('abc'))
+        self.assertEqual('"abc"', cache.dumps('abc'))
+        self.assertEqual('[1, 2]', cache.dumps(lst))
+        self.assertEqual('[1, 2]', cache.dumps(lst))
+        self.assertEqual((2, 2), (cache.hits, cache.misses))
+
+        with self.subTest('values of different types are not mixed up'):
+            self.assertEqual('1', cache.dumps(1))
+            self.assertEqual('true', cache.dumps(True))
+            self.assertEqual('1.0', cache.dumps(1.0))
+
+        with self.subTest('eviction'):
+            self.assertEqual(2, len(cache))
+            cache.dumps('abc')
+            self.assertEqual(6, cache.misses)
+
+        cache.clear()
+        self.assertEqual((0, 0, 0), (len(cache), cache.hits, cache.misses))
+
+    def test_dumps_nested_types(self):
+        cache = SerializationCache()
+        for a, b in (((1, True), (1, 1)), (('a', 1.0), ('a', 1)), (-0.0, 0.0), ((0.0, ), (-0.0, ))):
+            with self.subTest(a=a, b=b):
+                self.assertEqual(json.dumps(a), cache.dumps(a))
+                self.assertEqual(json.dumps(b), cache.dumps(b))
+
+    def test_own_cache_per_call(self):
+        dc = DictComparer({'a': 'x', 'b': [1]})
+        o = {'a': 'x', 'b': [1]}
+        self.assertEqual(1.0, dc.compare([o])[0].ratio)
+
+        o['a'] = 'zzz'
+        o['b'].append(5)
+        expected = DictComparer({'a': 'x', 'b': [1]}).compare([o])
+        self.assertListEqual(expected, dc.compare([o]))
+        self.assertEqual(expected[0], dc.best([o]))
+
+    def test_fingerprint(self):
+        d = {'one': "one", '2': "two", 'three': 'three'}
+        others = [
+            {'one': "one", None: 'fffffff', '2': "two"},
+            {'one': "one", None: 'fffffff', '2': "two xvbxvcbxvcb"},
+        ]
+        cache = SerializationCache()
+        test_infos = DictComparer(d).compare(others)
+        dc = DictComparer(d, cache=cache)
+        self.assertListEqual(test_infos, dc.compare(others))
+        self.assertListEqual(test_infos, dc.compare(others))
+        self.assertEqual(2, len([*filter(lambda k: k[0] == 'f', cache._data)]))
+
+        with self.subTest('the fingerprint depends on the keys'):
+            dc = DictComparer(d, ['one', '2'], cache=cache)
+            self.assertListEqual(DictComparer(d, ['one', '2']).compare(others), dc.compare(others))
+            self.assertEqual(4, len([*filter(lambda k: k[0] == 'f', cache._data)]))
+
+    def test_shared_cache_serializes_once(self):
+        s_list = [{'key': v, 'tag': 't'} for v in ('ltp', 'udp', 'smtp', 'tftp', 'sftp', 'umtp')]
+        u_list = [{'key': v, 'tag': 't'} for v in ('https', 'stp', 'udp', 'utp')]
+        cache = SerializationCache()
+        for u in u_list:
+            self.assertListEqual(DictComparer(u).compare(s_list), DictComparer(u, cache=cache).compare(s_list))
+
+        # 9 unique values of 'key', 1 value of 'tag' and 6 fingerprints of s_list
+        self.assertEqual(9 + 1 + 6, cache.misses)
+
+
+class TestRatioMatrix(TestCase):
+
+    def test_matrix(self):
+        s_list = [{'key': v} for v in ('ltp', 'udp', 'smtp', 'tftp', 'sftp', 'umtp')]
+        u_list = [{'key': v} for v in ('https', 'stp', 'udp', 'utp')]
+        rm = RatioMatrix(u_list, s_list)
+        rm.ratio_round_precision = 1
+        test_matrix = [
+            [0.7, 0.5, 0.6, 0.8, 0.6, 0.6],
+            [0.8, 0.6, 0.9, 0.7, 0.9, 0.7],
+            [0.6, 1.0, 0.5, 0.5, 0.5, 0.7],
+            [0.8, 0.8, 0.7, 0.7, 0.7, 0.9]
+        ]
+        self.assertListEqual(test_matrix, rm.matrix)
+
+    def test_matrix_equals_dict_comparer(self):
+        s_list = [
+            {'one': "one", None: 'fffffff', '2': "two"},
+            {'one': "one", None: 'fffffff', '2': "two xvbxvcbxvcb"},
+            {'one': "onevc x xvb", '2': "two"},
+            {},
+        ]
+        u_list = [
+            {'one': "one", '2': "two", 'three': 'three'},
+            {'one': "one", '2': ["two", 2], 'three': None},
+            {'2': "two"},
+        ]
+        rm = RatioMatrix(u_list, s_list)
+        for ui, u in enumerate(u_list):
+            with self.subTest(f'u[{ui}]'):
+                test_row = [info.ratio for info in DictComparer(u).compare(s_list)]
+                self.assertListEqual(test_row, rm.matrix[ui])
+
+        with self.subTest('field matrix'):
+            self.assertIsNone(rm.field_matrix('three')[2])
+            self.assertListEqual([.0, .0, .0, .0], rm.field_matrix('three')[0])
+            self.assertListEqual([1.0, 1.0, 0.5555555555555556, .0], rm.field_matrix('one')[0])
+
+        with self.subTest('empty'):
+            self.assertListEqual([], RatioMatrix([], s_list).matrix)
+            self.assertListEqual([[], [], []], RatioMatrix(u_list, []).matrix)
+
+    def test_matrix_pruning(self):
+        s_list = [{'key': v} for v in ('ltp', 'udp', 'smtp', 'tftp', 'sftp', 'umtp')]
+        u_list = [{'key': v} for v in ('https', 'stp', 'udp', 'utp')]
+        rm = RatioMatrix(u_list, s_list, min_ratio=.8)
+        rm.ratio_round_precision = 1
+        test_matrix = [
+            [None, None, 0.6, 0.8, 0.6, None],
+            [0.8, None, 0.9, None, 0.9, None],
+            [None, 1.0, None, None, None, None],
+            [0.8, 0.8, None, None, None, 0.9]
+        ]
+        self.assertListEqual(test_matrix, rm.matrix)
+        # the upper bound is not strict, therefore some of the computed ratios are less than `min_ratio`
+        self.assertEqual(24 - 10, rm.avoided_ratio_count)
+
+        with self.subTest('data matcher'):
+            for strategy in (GreedyMatching(.8), AssignmentMatching(.8)):
+                dm = DataMatcher(s_list, u_list, strategy)
+                test_matches = dm.match()
+                dm.prune_ratios = True
+                self.assertEqual(test_matches, dm.match())
+                self.assertLess(0, dm.avoided_ratio_count)
+
+
+class TestNGramIndex(TestCase):
+
+    def test_candidates(self):
+        s_list = [{'key': v, 'type': 'proto'} for v in ('ltp', 'udp', 'smtp', 'tftp', 'sftp', 'umtp')]
+        index = NGramIndex(s_list)
+        self.assertSetEqual({0, 2, 3, 4, 5}, index.candidates({'key': 'stp'}))
+        # all rows share n-grams of 'type'
+        self.assertSetEqual({0, 1, 2, 3, 4, 5}, index.candidates({'key': 'stp', 'type': 'proto'}))
+        self.assertSetEqual({1}, index.candidates({'key': 'udp'}))
+        self.assertSetEqual(set(), index.candidates({'key': 'django'}))
+        self.assertSetEqual(set(), index.candidates({'unknown': 'stp'}))
+
+        with self.subTest('min_similarity'):
+            # the rows without common n-grams are never candidates
+            self.assertSetEqual({0, 2, 3, 4, 5}, NGramIndex(s_list, min_similarity=0).candidates({'key': 'stp'}))
+            self.assertSetEqual(set(), NGramIndex(s_list, min_similarity=.5).candidates({'key': 'stp'}))
+
+    def test_exact(self):
+        s_list = [{'key': 'udp', 'type': 'proto'}, {'key': 'udp'}, {'key': 'smtp', 'type': 'proto'}]
+        index = NGramIndex(s_list)
+        self.assertListEqual([0, 1], index.exact({'key': 'udp'}))
+        self.assertListEqual([0], index.exact({'key': 'udp', 'type': 'proto'}))
+        self.assertListEqual([], index.exact({'key': 'smtp', 'type': None}))
+        self.assertListEqual([], index.exact({}))
+
+    def test_data_matcher_blocking(self):
+        s_list = [{'key': v} for v in ('ltp', 'udp', 'smtp', 'tftp', 'sftp', 'umtp')]
+        u_list = [{'key': v} for v in ('https', 'stp', 'udp', 'utp')]
+        dc = DataMatcher(s_list, u_list)
+        dc.ratio_round_precision = 1
+        # the blocking is off by default, thus the comparison is exhaustive
+        self.assertIsNone(DataMatcher.blocking_min_pairs)
+        test_matches = {
+            'u': [((1, 2), 0.9), ((3, 5), 0.9), ((0, 3), 0.8)],
+            'i': [],
+            'd': [((None, 0), 1.0), ((None, 4), 1.0)],
+            'n': [((2, 1), 1.0)]
+        }
+        self.assertEqual(test_matches, dc.match())
+        self.assertEqual(0, dc.avoided_ratio_count)
+
+        # 'https' and 'tftp' have no common n-gram, thus 'https' is not matched
+        dc.blocking_min_pairs = 0
+        test_matches = {
+            'u': [((1, 2), 0.9), ((3, 5), 0.9)],
+            'i': [((0, None), 1.0)],
+            'd': [((None, 0), 1.0), ((None, 3), 1.0), ((None, 4), 1.0)],
+            'n': [((2, 1), 1.0)]
+        }
+        self.assertEqual(test_matches, dc.match())
+        self.assertLess(0, dc.avoided_ratio_count)
+
+        with self.subTest('nothing in common'):
+            dc.u = [{'key': 'django'}]
+            self.assertEqual({'u': [], 'i': [((0, None), 1.0)], 'd': [((None, si), 1.0) for si in range(6)], 'n': []},
+                             dc.match())
+
+        with self.subTest('a long varying field'):
+            # the n-grams of the changed notes dominate, thus the stored row is not a candidate for blocking
+            s_list = [{'project': 1, 'technology': 2, 'notes': None}]
+            u_list = [{'project': 1, 'technology': 2, 'notes': 'Used for the REST API of the whole backend'}]
+            self.assertEqual([((0, 0), 0.6806)], DataMatcher(s_list, u_list).match()['u'])
+            dc = DataMatcher(s_list, u_list)
+            dc.blocking_min_pairs = 0
+            self.assertEqual([((0, None), 1.0)], dc.match()['i'])
+
+
+class TestParallelExecution(TestCase):
+
+    s_list = [{'id': i, 'key': v} for i, v in enumerate(('ltp', 'udp', 'smtp', 'tftp', 'sftp', 'umtp'))]
+    u_list = [{'key': v} for v in ('https', 'stp', 'udp', 'utp')]
+
+    def test_chunks(self):
+        self.assertListEqual([range(0, 3), range(3, 5)], ParallelExecution(chunk_rows=3).chunks(5))
+        self.assertListEqual([range(0, 1), range(1, 2)], ParallelExecution(max_workers=2).chunks(2))
+        self.assertListEqual([], ParallelExecution(chunk_rows=3).chunks(0))
+
+    def test_is_parallel(self):
+        self.assertFalse(ParallelExecution().is_parallel(10, 10))
+        self.assertTrue(ParallelExecution(min_pairs=100).is_parallel(10, 10))
+        self.assertFalse(ParallelExecution(max_workers=1, min_pairs=0).is_parallel(10, 10))
+        self.assertFalse(ParallelExecution(min_pairs=0).is_parallel(1, 10))
+
+    def test_matrix(self):
+        test_matrix = RatioMatrix(self.u_list, self.s_list).matrix
+        rm = RatioMatrix(self.u_list, self.s_list, parallel=ParallelExecution(max_workers=2, min_pairs=0, chunk_rows=1))
+        self.assertListEqual(test_matrix, rm.matrix)
+
+    def test_data_comparer_and_matcher(self):
+        parallel = ParallelExecution(max_workers=2, min_pairs=0, chunk_rows=3)
+        for prune_ratios in (False, True):
+            with self.subTest(prune_ratios=prune_ratios):
+                dc = DataComparer(self.s_list, self.u_list)
+                dc.prune_ratios = prune_ratios
+                test_infos = dc.compare()
+                dc.parallel = parallel
+                self.assertEqual(test_infos, dc.compare())
+
+                dm = DataMatcher(self.s_list, self.u_list)
+                dm.prune_ratios = prune_ratios
+                test_matches = dm.match()
+                dm.parallel = parallel
+                self.assertEqual(test_matches, dm.match())
+
+
+class TestDictComparer(TestCase):
+
+    def test_best(self):
+        s_list = [{'key': v} for v in ('ltp', 'udp', 'smtp', 'tftp', 'sftp', 'umtp')]
+        for u in ('https', 'stp', 'udp', 'utp'):
+            with self.subTest(u):
+                dc = DictComparer({'key': u})
+                test_info = functools.reduce(lambda m, n: m if m.ratio >= n.ratio else n, dc.compare(s_list))
+                self.assertEqual(test_info, dc.best(s_list))
+                self.assertLess(0, dc.avoided_ratio_count)
+
+        with self.subTest('empty'):
+            self.assertIsNone(DictComparer({'key': 'udp'}).best([]))
+            self.assertIsNone(DictComparer({}).best(s_list))
+
 
 class TestDateRangeCrossing(TestCase):
 
@@ -486,6 +798,35 @@ class TestDateRangeCrossing(TestCase):
                (datetime.date(2022, 1, 11), datetime.date(2022, 1, 31))]
         self.assertEqual(exp, res)
 
+        with self.subTest('date_ranges are not changed'):
+            self.assertEqual(5, len(drc.date_ranges))
+            self.assertEqual(exp, drc.crossings())
+
+
+class TestIntervalIndex(TestCase):
+
+    intervals = [(1, 5), (3, 4), (6, 9), (5, 5), (3, 4), (10, 12)]
+
+    def test_crossings(self):
+        index = IntervalIndex(self.intervals)
+        self.assertListEqual([[1, 3, 4], [0, 4], [], [0], [0, 1], []], index.crossings())
+
+    def test_query(self):
+        index = IntervalIndex(self.intervals)
+        self.assertListEqual([0, 1, 4, 3, 2], index.query(4, 6))
+        self.assertListEqual([2, 5], index.query(9, 100))
+        self.assertListEqual([], index.query(13, 100))
+        self.assertListEqual([], IntervalIndex([]).query(1, 2))
+
+    def test_split(self):
+        index = IntervalIndex(self.intervals)
+        self.assertTupleEqual(([0, 2, 5], [1, 3, 4]), index.split([0, 1, 2, 3, 4, 5]))
+        self.assertTupleEqual(([1, 3, 2, 5], [4, 0]), index.split([1, 3, 2, 5, 4, 0]))
+        self.assertTupleEqual(([4, 5], [1]), index.split([4, 5, 1]))
+
+        with self.subTest('index is reusable after split'):
+            self.assertListEqual([0, 1, 4, 3, 2], index.query(4, 6))
+
 
 class TestDateRangeMatcher(TestCase):
 
@@ -709,6 +1050,43 @@ class TestDateRangeMatcher(TestCase):
 
         self.assertEqual(exp, res)
 
+        with self.subTest('match_many'):
+            self.assertEqual(exp, drm.match_many())
+            res = drm.match_many([['2022-03-11', '2022-03-25'], ['2022-01-01', '2022-01-03'], ['2022-03-11', '2022-03-25']])
+            self.assertEqual({k: exp[k] for k in [
+                (datetime.date(2022, 3, 11), datetime.date(2022, 3, 25)),
+                (datetime.date(2022, 1, 1), datetime.date(2022, 1, 3))
+            ]}, res)
+
+        with self.subTest('indexed and not indexed haystack give the same crossings'):
+            h_uncrossed, h_crossed = drm.haystack.crossings()
+            h = [*h_uncrossed, *h_crossed]
+            index = drm._get_haystack_index(h)
+            for needle in drm.needles.date_ranges:
+                self.assertListEqual(
+                    drm._calc_crossing_distances(h, needle), drm._calc_crossing_distances(h, needle, index)
+                )
+
+    def test_match_many_sweep(self):
+        # the sweep gives the same result as the prioritized crossing of each needle
+        rnd = random.Random(7)
+        start = datetime.date(2020, 1, 1)
+
+        def date_ranges(count):
+            res = []
+            for _ in range(count):
+                b = start + datetime.timedelta(days=rnd.randint(0, 60))
+                e = None if rnd.random() < .1 else b + datetime.timedelta(days=rnd.randint(0, 20))
+                res.append([None if rnd.random() < .05 else b, e])
+            return res
+
+        for _ in range(20):
+            drm = DateRangeMatcher(date_ranges(15), date_ranges(30))
+            h_uncrossed, h_crossed = drm.haystack.crossings()
+            h = [*h_uncrossed, *h_crossed]
+            exp = {needle: drm._calc_prioritized_crossing(h, needle) for needle in drm.needles.date_ranges}
+            self.assertEqual(exp, drm.match_many())
+
     def test_match1(self):
         haystack = [
             ['2022-01-10', '2022-01-31'], ['2022-02-09', '2022-02-24'], ['2022-03-11', '2022-03-25'],  # 1, 2, 3
@@ -0,0 +1,114 @@
+# IDE: PyCharm
+# Project: cv
+# Path: apps/cv/tests
+# File: test_dumpuserdata.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 6:15 PM
+
+import datetime
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from apps.cv import models
+from apps.cv.management.commands.dumpuserdata import CVDumper
+from apps.cv.management.commands.loaduserdata import LocalSession, CVLoader, Command
+
+
+class TestDumpUserData(TestCase):
+
+    def setUp(self) -> None:
+        self.git = models.CVResources.objects.create(resource='git')
+        self.python = models.CVTechnologies.objects.create(technology='Python', technology_type='PROG_LANG')
+        self.users = [self.create_cv(f'user{n}', n + 1) for n in range(3)]
+
+    def create_cv(self, username: str, size: int):
+        user = get_user_model().objects.create_user(username=username, password='12345678')
+        profile = models.CVUserProfile.objects.create(
+            user=user, birthday=datetime.date(2001, 1, 1), position=f'Developer {username}'
+        )
+        models.CVUserResource.objects.create(profile=profile, resource=self.git, link=f'https://git/{username}')
+        models.CVLanguage.objects.create(profile=profile, lang='English', level='Intermediate')
+        workplace = models.CVWorkplace.objects.create(
+            profile=profile, workplace='Company', begin=datetime.date(2010, 1, 1), end=datetime.date(2019, 12, 31)
+        )
+        models.CVWorkplaceResponsibility.objects.create(
+            workplace=workplace, responsibility='Coding', role='Developer',
+            begin=datetime.date(2010, 1, 1), end=datetime.date(2019, 12, 31)
+        )
+        own_tech = models.CVTechnologies.objects.create(technology=f'Lib of {username}', profile=profile)
+        for i in range(size):
+            models.CVHobby.objects.create(profile=profile, description=f'Hobby #{i}')
+            project = models.CVProject.objects.create(
+                profile=profile, title=f'Project #{i}', description='Description',
+                begin=datetime.date(2010 + i, 1, 1), end=datetime.date(2010 + i, 6, 30)
+            )
+            models.CVWorkplaceProject.objects.create(workplace=workplace, project=project)
+            models.CVProjectTechnology.objects.create(
+                project=project, technology=self.python, duration=datetime.timedelta(days=30)
+            )
+            models.CVProjectTechnology.objects.create(
+                project=project, technology=own_tech, duration=datetime.timedelta(days=60), notes='Some notes'
+            )
+        return user
+
+    def dump(self, *args) -> str:
+        out = io.StringIO()
+        call_command('dumpuserdata', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dump(self):
+        cv = json.loads(self.dump('user1'))
+        self.assertEqual('Developer user1', cv['profile']['position'])
+        self.assertEqual(['Hobby #0', 'Hobby #1'], [h['description'] for h in cv['hobby']])
+        self.assertEqual([{'resource': 'git', 'link': 'https://git/user1'}], cv['resource'])
+        self.assertEqual(
+            [{'technology_type': 'OTHER', 'technology': ['Lib of user1']},
+             {'technology_type': 'PROG_LANG', 'technology': ['Python']}],
+            cv['technology']
+        )
+        self.assertIn(
+            {'project': ['2010-01-01', '2010-06-30'], 'technology': ['Python'], 'duration': '30 00:00:00', 'notes': None},
+            cv['project-technology']
+        )
+        self.assertIn(
+            {'project': ['2010-01-01', '2010-06-30'], 'technology': [['Lib of user1', 'Some notes']],
+             'duration': '60 00:00:00', 'notes': None},
+            cv['project-technology']
+        )
+
+    def test_jsonl(self):
+        lines = self.dump().splitlines()
+        self.assertEqual(['user0', 'user1', 'user2'], [json.loads(line)['user']['username'] for line in lines])
+        self.assertEqual(3, len(json.loads(lines[2])['cv']['hobby']))
+
+    def test_num_queries(self):
+        dumper = CVDumper()
+        # profiles + one query per prefetched section regardless of the number of profiles and rows
+        for usernames in (['user0'], ['user0', 'user1', 'user2']):
+            with self.subTest(usernames=usernames), self.assertNumQueries(1 + len(dumper.prefetch)):
+                for profile in dumper.iter_profiles(usernames):
+                    dumper.get_cv(profile)
+
+    def test_round_trip(self):
+        user = self.users[2]
+        cv = json.loads(self.dump(user.username))
+        sent = []
+
+        class WriteSession(LocalSession):
+            def request(self, method, url, **kwargs):
+                if method != 'GET':
+                    sent.append((method, url))
+                return super().request(method, url, **kwargs)
+
+        command = Command(stdout=io.StringIO())
+        loader = CVLoader('', WriteSession(user), command)
+        command.load(loader, cv)
+
+        # the profile is always PUT by loaduserdata, nothing else is changed
+        self.assertEqual(0, loader.error_count)
+        self.assertEqual([('PUT', '/cv/api/profile/')], sent)
+        self.assertEqual(cv, json.loads(self.dump(user.username)))
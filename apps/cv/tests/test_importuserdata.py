@@ -0,0 +1,81 @@
+# IDE: PyCharm
+# Project: cv
+# Path: apps/cv/tests
+# File: test_importuserdata.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 4:55 PM
+
+import io
+import json
+import pathlib
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from apps.cv import models
+from apps.cv.management.commands.importuserdata import Command, ImportRecord
+
+
+class TestImportUserData(TestCase):
+
+    def setUp(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_path = pathlib.Path(tmp_dir.name)
+
+    def get_cv(self, n: int) -> dict:
+        return {
+            'hobby': [{'description': f'Hobby #{i} of user #{n}'} for i in range(n + 1)],
+            'language': [{'lang': 'English', 'level': 'Intermediate', 'notes': None}],
+        }
+
+    def import_data(self, *args) -> str:
+        out = io.StringIO()
+        call_command('importuserdata', *args, stdout=out, no_color=True)
+        return out.getvalue()
+
+    def test_stream(self):
+        path = self.tmp_path / 'users.jsonl'
+        with open(path, 'w') as f:
+            for n in range(3):
+                f.write(json.dumps({'user': {'username': f'user{n}', 'email': f'user{n}@cv.lan'}, 'cv': self.get_cv(n)}))
+                f.write('\n')
+            f.write('{"bad json\n')
+            f.write(json.dumps({'user': 'user4', 'cv': self.get_cv(4)}) + '\n')
+
+        out = self.import_data(str(path), '--create-users')
+
+        self.assertIn('Imported 4 of 5 records (1 failed)', out)
+        self.assertIn(f'FAILED None [{path}:4]', out)
+        for n in (0, 1, 2, 4):
+            user = get_user_model().objects.get(username=f'user{n}')
+            self.assertEqual(n + 1, models.CVHobby.objects.filter(profile__user=user).count())
+        self.assertEqual('user1@cv.lan', get_user_model().objects.get(username='user1').email)
+
+    def test_directory(self):
+        get_user_model().objects.create_user(username='user0')
+        # the file name is the username if the document is the CV itself
+        (self.tmp_path / 'user0.json').write_text(json.dumps(self.get_cv(0)))
+        (self.tmp_path / 'other.json').write_text(json.dumps({'user': 'user1', 'cv': self.get_cv(1)}))
+
+        out = self.import_data(str(self.tmp_path))
+
+        # users are not created without --create-users
+        self.assertIn('Imported 1 of 2 records (1 failed)', out)
+        self.assertIn('FAILED user1', out)
+        self.assertIn('OK user0', out)
+        self.assertEqual(1, models.CVHobby.objects.filter(profile__user__username='user0').count())
+
+    def test_iter_stream(self):
+        stream = io.StringIO('{"user": "u", "cv": {}}\n\n[1, 2]\n')
+        records = list(Command().iter_stream(stream))
+        self.assertEqual([ImportRecord('stream:1', 'u', {})], records[:1])
+        self.assertEqual('stream:3', records[1].source)
+        self.assertIsNotNone(records[1].error)
+
+    def test_workers_on_sqlite(self):
+        out = self.import_data(str(self.tmp_path), '--workers', '2')
+        self.assertIn('--workers does not make it faster', out)
+        self.assertNotIn('--workers', self.import_data(str(self.tmp_path)))
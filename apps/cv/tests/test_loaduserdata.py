@@ -0,0 +1,343 @@
+# IDE: PyCharm
+# Project: cv
+# Path: apps/cv/tests
+# File: test_loaduserdata.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 2:05 PM
+
+import contextlib
+import datetime
+import io
+import pathlib
+import tempfile
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, SimpleTestCase
+from django.urls import reverse
+from rest_framework import status
+
+from apps.cv import models
+from apps.cv.management.commands.loaduserdata import (
+    LocalSession, CVLoader, Command, SectionScheduler, SectionManifest
+)
+
+
+class TestLocalSession(TestCase):
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(username='test_user', password='12345678')
+        self.profile = models.CVUserProfile.objects.create(user=self.user, birthday=datetime.date(2001, 1, 1))
+        self.session = LocalSession(self.user)
+
+    def test_get_post(self):
+        url = reverse('cv:hobby')
+        response = self.session.post(url, json={'description': 'Some hobby'})
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertTrue(response.ok)
+        self.assertEqual('POST', response.request.method)
+        self.assertIn(b'Some hobby', response.request.body)
+
+        response = self.session.get(url)
+        self.assertTrue(response.ok)
+        self.assertEqual(['Some hobby'], [h['description'] for h in response.json()])
+        self.assertIn('Some hobby', response.text)
+
+    def test_not_ok(self):
+        response = self.session.get(reverse('cv:hobby', args=[123]))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+        self.assertFalse(response.ok)
+
+    def test_lock(self):
+        # the requests are dispatched one by one only for the databases of `lock_vendors` (SQLite)
+        self.assertIs(LocalSession.lock, self.session.get_lock())
+        self.session.lock_vendors = ()
+        self.assertIsInstance(self.session.get_lock(), contextlib.nullcontext)
+
+    def test_loader(self):
+        out = io.StringIO()
+        loader = CVLoader('', self.session, Command(stdout=out))
+        data = [{'description': 'Hobby #1'}, {'description': 'Hobby #2'}]
+
+        loader.load_hobby(data)
+        self.assertEqual(['Hobby #1', 'Hobby #2'], [*models.CVHobby.objects.order_by('pk').values_list('description', flat=True)])
+
+        # the second load updates the same rows
+        loader.load_hobby([{'description': 'Hobby #1'}, {'description': 'Hobby #2 (upd)'}])
+        self.assertEqual(
+            ['Hobby #1', 'Hobby #2 (upd)'],
+            [*models.CVHobby.objects.order_by('pk').values_list('description', flat=True)]
+        )
+        self.assertEqual('', out.getvalue())
+
+    def test_load_profile_photo(self):
+        src_img_path = pathlib.Path(__file__).parent / 'media' / 'boy-909552_960_720.jpg'
+        sent = []
+
+        class RecordingSession(LocalSession):
+            def request(self, method, url, **kwargs):
+                response = super().request(method, url, **kwargs)
+                sent.append(response.request)
+                return response
+
+        loader = CVLoader('', RecordingSession(self.user), Command(stdout=io.StringIO()))
+        loader.load_profile({'photo': str(src_img_path), 'position': 'Developer'})
+        self.assertEqual(0, loader.error_count)
+
+        # the profile is sent without the photo, the photo is streamed by the separate request
+        self.assertEqual(
+            [('GET', reverse('cv:profile')), ('PUT', reverse('cv:profile')), ('PUT', reverse('cv:profile-photo'))],
+            [(r.method, r.url) for r in sent]
+        )
+        self.assertNotIn(b'photo', sent[1].body)
+        self.assertIsNone(sent[2].body)
+
+        self.profile.refresh_from_db()
+        self.assertEqual('Developer', self.profile.position)
+        res_img_path = pathlib.Path(self.profile.photo.path)
+        self.addCleanup(res_img_path.unlink, missing_ok=True)
+        self.assertEqual(src_img_path.read_bytes(), res_img_path.read_bytes())
+
+    def test_load_workplace_project(self):
+        wps = [
+            models.CVWorkplace.objects.create(
+                profile=self.profile, workplace=f'Company #{i}',
+                begin=datetime.date(2000 + 10 * i, 1, 1), end=datetime.date(2009 + 10 * i, 12, 31)
+            ) for i in range(2)
+        ]
+        projects = [
+            models.CVProject.objects.create(
+                profile=self.profile, title=f'Project #{i}', description='Description',
+                begin=datetime.date(2000, 1, 1) + datetime.timedelta(days=30 * i),
+                end=datetime.date(2000, 1, 20) + datetime.timedelta(days=30 * i)
+            ) for i in range(240)
+        ]
+        models.CVWorkplaceProject.objects.create(workplace=wps[0], project=projects[0])
+        sent = []
+
+        class WriteSession(LocalSession):
+            def request(self, method, url, **kwargs):
+                if method != 'GET':
+                    sent.append((method, url))
+                return super().request(method, url, **kwargs)
+
+        out = io.StringIO()
+        loader = CVLoader('', WriteSession(self.user), Command(stdout=out))
+        loader.load_workplace_project()
+        self.assertEqual(0, loader.error_count)
+
+        # the missing links are added by one bulk request
+        self.assertEqual([('POST', reverse('cv:workplace-project'))], sent)
+        for wp, wp_projects in zip(wps, (projects[:122], projects[122:])):
+            self.assertEqual(
+                [p.pk for p in wp_projects],
+                [*models.CVWorkplaceProject.objects.filter(workplace=wp).order_by('project').values_list('project', flat=True)]
+            )
+        self.assertEqual('', out.getvalue())
+
+        # nothing to add
+        sent.clear()
+        loader.load_workplace_project()
+        self.assertEqual([], sent)
+
+    def test_load_per_row_streaming(self):
+        # the dictionary is writable by the staff only
+        self.user.is_staff = True
+        self.user.save()
+        models.CVTechnologies.objects.create(technology='Python')
+        events = []
+
+        class RecordingSession(LocalSession):
+            def request(self, method, url, **kwargs):
+                if method != 'GET':
+                    events.append(method)
+                return super().request(method, url, **kwargs)
+
+        class RecordingDataComparer(CVLoader.data_comparer_class):
+            def iter_prepare_to_update(self):
+                for u in super().iter_prepare_to_update():
+                    events.append('yield')
+                    yield u
+
+        def view_name(action):
+            return 'cv:technology-rud' if action == 'put' else 'cv:technology-lc'
+
+        out = io.StringIO()
+        loader = CVLoader('', RecordingSession(self.user), Command(stdout=out))
+        loader._load_independent_part(
+            [{'technology': 'Python 3'}, {'technology': 'Django'}], 'The Technology', view_name,
+            data_comparer_class=RecordingDataComparer
+        )
+        self.assertEqual('', out.getvalue())
+        # each row is sent as soon as it is yielded
+        self.assertEqual(['yield', 'PUT', 'yield', 'POST'], events)
+        self.assertEqual(
+            ['Python 3', 'Django'], [*models.CVTechnologies.objects.order_by('pk').values_list('technology', flat=True)]
+        )
+
+    def test_loader_snapshot(self):
+        gets = []
+
+        class CountingSession(LocalSession):
+            def request(self, method, url, **kwargs):
+                if method == 'GET':
+                    gets.append(url)
+                return super().request(method, url, **kwargs)
+
+        loader = CVLoader('', CountingSession(self.user), Command(stdout=io.StringIO()))
+        url = reverse('cv:hobby')
+
+        loader.load_hobby([{'description': 'Hobby #1'}, {'description': 'Hobby #2'}])
+        loader.load_hobby([{'description': 'Hobby #1'}, {'description': 'Hobby #2 (upd)'}, {'description': 'Hobby #3'}])
+        self.assertEqual([url], gets)
+
+        # the snapshot reflects the changes that were made by the loader
+        self.assertEqual(
+            [*models.CVHobby.objects.order_by('pk').values_list('pk', 'description')],
+            sorted((h['id'], h['description']) for h in loader.get_collection(url, 'The Hobby'))
+        )
+        self.assertEqual([url], gets)
+
+
+class TestIncrementalLoad(TestCase):
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(username='test_user', password='12345678')
+        self.profile = models.CVUserProfile.objects.create(user=self.user, birthday=datetime.date(2001, 1, 1))
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.manifest_path = pathlib.Path(tmp_dir.name) / 'manifest.json'
+        self.data = {
+            'hobby': [{'description': 'Hobby #1'}],
+            'language': [{'lang': 'English', 'level': 'Intermediate', 'notes': ''}],
+        }
+
+    def load(self, data, force=False) -> str:
+        out = io.StringIO()
+        command = Command(stdout=out)
+        loader = CVLoader('', LocalSession(self.user), command)
+        command.load(loader, data, manifest=SectionManifest(self.manifest_path, 'test_user@local'), force=force)
+        return out.getvalue()
+
+    def test_load(self):
+        out = self.load(self.data)
+        self.assertIn('Loaded sections: ', out)
+        self.assertNotIn('Skipped sections: ', out)
+        self.assertNotIn('Failed sections: ', out)
+
+        out = self.load(self.data)
+        self.assertNotIn('Loaded sections: ', out)
+        self.assertIn('Skipped sections: ', out)
+
+        # only the modified section is loaded again
+        self.data['hobby'].append({'description': 'Hobby #2'})
+        out = self.load(self.data)
+        self.assertIn('Loaded sections: hobby\n', out)
+        self.assertEqual(2, models.CVHobby.objects.count())
+
+        out = self.load(self.data, force=True)
+        self.assertNotIn('Skipped sections: ', out)
+
+    def test_server_changed(self):
+        self.load(self.data)
+        self.assertIn('Skipped sections: ', self.load(self.data))
+
+        # the data on the server is changed in other way (UI, another client)
+        models.CVHobby.objects.filter(profile=self.profile).delete()
+        out = self.load(self.data)
+        self.assertIn('The data on the server was changed', out)
+        self.assertNotIn('Skipped sections: ', out)
+        self.assertEqual(['Hobby #1'], [*models.CVHobby.objects.values_list('description', flat=True)])
+
+        # the reconciled state is stored
+        self.assertIn('Skipped sections: ', self.load(self.data))
+
+        with self.subTest('the manifest of another database at the same path'):
+            manifest = SectionManifest(self.manifest_path, 'test_user@local')
+            manifest.set_state('"another"')
+            manifest.save()
+            self.assertNotIn('Skipped sections: ', self.load(self.data))
+
+    def test_fingerprint(self):
+        fp = SectionManifest.fingerprint
+        self.assertEqual(fp({'a': 1, 'b': [1, 2]}), fp({'b': [1, 2], 'a': 1}))
+        self.assertNotEqual(fp({'a': 1}), fp({'a': 2}))
+        # the changed dependency changes the fingerprint
+        self.assertNotEqual(fp({'a': 1}, fp('x')), fp({'a': 1}, fp('y')))
+
+
+class TestSectionScheduler(SimpleTestCase):
+
+    def get_scheduler(self, max_workers, func):
+        scheduler = SectionScheduler(max_workers)
+        scheduler.add('a', func, 'a')
+        scheduler.add('ab', func, 'ab', depends_on=('a', 'b'))
+        scheduler.add('b', func, 'b')
+        scheduler.add('c', func, 'c')
+        scheduler.add('bc', func, 'bc', depends_on=('b', 'c'))
+        return scheduler
+
+    def test_order(self):
+        scheduler = self.get_scheduler(1, str)
+        self.assertListEqual(['a', 'b', 'c', 'ab', 'bc'], scheduler.order())
+
+        with self.assertRaises(ValueError):
+            scheduler.add('a', str)
+
+        scheduler.add('x', str, depends_on=('y',))
+        with self.assertRaisesRegex(ValueError, 'unknown'):
+            scheduler.order()
+
+        scheduler.add('y', str, depends_on=('x',))
+        with self.assertRaisesRegex(ValueError, 'cyclic'):
+            scheduler.order()
+
+    def test_run(self):
+        delay = .1
+        events = []
+        lock = threading.Lock()
+
+        def section(name):
+            with lock:
+                events.append(('start', name))
+            time.sleep(delay)
+            with lock:
+                events.append(('end', name))
+            return name.upper()
+
+        for max_workers in (1, 3):
+            with self.subTest(max_workers=max_workers):
+                events.clear()
+                start = time.perf_counter()
+                results = self.get_scheduler(max_workers, section).run()
+                elapsed = time.perf_counter() - start
+
+                self.assertDictEqual({'a': 'A', 'ab': 'AB', 'b': 'B', 'c': 'C', 'bc': 'BC'}, results)
+                # the dependent sections start after their dependencies are done
+                for name, deps in (('ab', 'ab'), ('bc', 'bc')):
+                    for dep in deps:
+                        self.assertLess(events.index(('end', dep)), events.index(('start', name)))
+
+                if max_workers == 1:
+                    self.assertGreaterEqual(elapsed, 5 * delay)
+                else:
+                    # critical path is 2 sections
+                    self.assertLess(elapsed, 4 * delay)
+
+    def test_run_error(self):
+        called = []
+
+        def section(name):
+            called.append(name)
+            if name == 'b':
+                raise RuntimeError(name)
+
+        for max_workers in (1, 3):
+            with self.subTest(max_workers=max_workers):
+                called.clear()
+                with self.assertRaisesRegex(RuntimeError, 'b'):
+                    self.get_scheduler(max_workers, section).run()
+                # the sections that depend on failed one are not run
+                self.assertNotIn('ab', called)
+                self.assertNotIn('bc', called)
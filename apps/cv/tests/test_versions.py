@@ -0,0 +1,75 @@
+# IDE: PyCharm
+# Project: cv
+# Path: apps/cv/tests
+# File: test_versions.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 7:55 PM
+
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from apps.cv import models
+from apps.cv.versions import cv_versions, profile_scope, TECHNOLOGIES_SCOPE, RESOURCES_SCOPE
+
+
+class TestVersionTracker(TestCase):
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(username='test_user', password='12345678')
+        self.profile = models.CVUserProfile.objects.create(user=self.user, birthday=datetime.date(2001, 1, 1))
+        self.scope = profile_scope(self.profile.pk)
+
+    def get_version(self, scope=None) -> int:
+        scope = scope or self.scope
+        return cv_versions.get_versions(scope)[scope]
+
+    def test_bump(self):
+        self.assertEqual(0, cv_versions.get_versions('unknown')['unknown'])
+        cv_versions.bump('unknown')
+        version = cv_versions.get_versions('unknown')['unknown']
+        cv_versions.bump('unknown')
+        self.assertEqual(version + 1, cv_versions.get_versions('unknown')['unknown'])
+
+    def test_bump_recreated(self):
+        # the re-created counter does not repeat the versions
+        cv_versions.bump('unknown')
+        version = cv_versions.get_versions('unknown')['unknown']
+        models.CVVersion.objects.filter(scope='unknown').delete()
+        cv_versions.bump('unknown')
+        self.assertGreater(cv_versions.get_versions('unknown')['unknown'], version + 1)
+
+    def test_profile_data(self):
+        version = self.get_version()
+        project = models.CVProject.objects.create(
+            profile=self.profile, title='Project', description='Description',
+            begin=datetime.date(2010, 1, 1), end=datetime.date(2010, 6, 30)
+        )
+        self.assertEqual(version + 1, self.get_version())
+
+        # the nested data changes the version of the profile
+        tech = models.CVTechnologies.objects.create(technology='Python')
+        self.assertEqual(version + 1, self.get_version())
+        self.assertNotEqual(0, self.get_version(TECHNOLOGIES_SCOPE))
+        models.CVProjectTechnology.objects.create(project=project, technology=tech, duration=datetime.timedelta(days=1))
+        self.assertEqual(version + 2, self.get_version())
+
+        # the user is a part of the profile, the login is not
+        self.user.first_name = 'Test'
+        self.user.save()
+        self.assertEqual(version + 3, self.get_version())
+        self.user.last_login = datetime.datetime.now(datetime.timezone.utc)
+        self.user.save(update_fields=['last_login'])
+        self.assertEqual(version + 3, self.get_version())
+
+        models.CVResources.objects.create(resource='git')
+        self.assertNotEqual(0, self.get_version(RESOURCES_SCOPE))
+
+    def test_profile_delete(self):
+        models.CVHobby.objects.create(profile=self.profile, description='Hobby')
+        version = self.get_version()
+
+        # the counter is kept, thus the new profile with the same pk continues it
+        self.user.delete()
+        self.assertLess(version, self.get_version())
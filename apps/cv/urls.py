@@ -34,6 +34,8 @@ schema_url_patterns = [
     re_path(pk_re_pattern % 'workplace-responsibility', views.WorkplaceResponsibility.as_view(),
             name='workplace-responsibility'),
     re_path(pk_re_pattern % 'workplace-project', views.WorkplaceProject.as_view(), name='workplace-project'),
+    path('full/', views.FullCV.as_view(), name='full'),
+    path('cache/', views.ResponseCacheStats.as_view(), name='cache-stats'),
 
     # path('schema/', views.api_root_view, kwargs={'app_names': ('rest_framework',)}, name='api_root_schema'),
     path('schema/schema/', SpectacularAPIView.as_view(), name='schema'),
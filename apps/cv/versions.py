@@ -0,0 +1,126 @@
+# IDE: PyCharm
+# Project: cv
+# Path: apps/cv
+# File: versions.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 7:20 PM
+
+import time
+from typing import Callable, Iterable, Optional, Type
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import F, Model
+from django.db.models.signals import post_save, post_delete
+
+
+TECHNOLOGIES_SCOPE = 'technologies'
+RESOURCES_SCOPE = 'resources'
+
+
+def profile_scope(profile_id: int) -> str:
+    return f'profile:{profile_id}'
+
+
+class VersionTracker:
+    """
+        Increments the version counters (models.CVVersion) on each save/delete of the tracked models.
+        The counter is incremented in the same transaction as the change, thus the changed data
+        is never visible with the old version.
+
+        Writes that do not send the signals (QuerySet.update, bulk_create ...) must call `bump` explicitly.
+
+        The versions are the parts of the keys of the cached responses (see apps.cv.cache), thus they are never repeated:
+        the counter starts from the current time (ns) and it is not deleted with the profile.
+        A re-created counter (a new profile with the reused pk, a rolled back transaction) does not
+        return the version of the cached response of the previous data.
+    """
+
+    dispatch_uid = 'cv_version_tracker'
+
+    def __init__(self) -> None:
+        self._scope_getters: Optional[dict[Type[Model], Callable[[Model], Iterable[str]]]] = None
+
+    @property
+    def version_model(self):
+        from .models import CVVersion
+        return CVVersion
+
+    def get_scope_getters(self) -> dict[Type[Model], Callable[[Model], Iterable[str]]]:
+        """
+            {model: callable(instance) -> scopes, ...}
+        """
+        if self._scope_getters is None:
+            from . import models
+
+            def by_profile(instance):
+                return [profile_scope(instance.profile_id)]
+
+            def by_workplace(instance):
+                return [profile_scope(instance.workplace.profile_id)]
+
+            def by_project(instance):
+                return [profile_scope(instance.project.profile_id)]
+
+            self._scope_getters = {
+                models.CVUserProfile: lambda instance: [profile_scope(instance.pk)],
+                get_user_model(): self.get_user_scopes,
+                models.CVEducation: by_profile,
+                models.CVHobby: by_profile,
+                models.CVLanguage: by_profile,
+                models.CVProject: by_profile,
+                models.CVWorkplace: by_profile,
+                models.CVUserResource: by_profile,
+                models.CVWorkplaceResponsibility: by_workplace,
+                models.CVWorkplaceProject: by_workplace,
+                models.CVProjectTechnology: by_project,
+                models.CVTechnologies: lambda instance: [TECHNOLOGIES_SCOPE],
+                models.CVResources: lambda instance: [RESOURCES_SCOPE],
+            }
+        return self._scope_getters
+
+    def get_user_scopes(self, user) -> list[str]:
+        # the user is a part of the profile representation
+        from .models import CVUserProfile
+        return [profile_scope(pk) for pk in CVUserProfile.objects.filter(user=user).values_list('pk', flat=True)]
+
+    def bump(self, *scopes: str) -> None:
+        model = self.version_model
+        for scope in scopes:
+            if model.objects.filter(scope=scope).update(version=F('version') + 1):
+                continue
+            _, created = model.objects.get_or_create(scope=scope, defaults={'version': time.time_ns()})
+            if not created:
+                # created concurrently
+                model.objects.filter(scope=scope).update(version=F('version') + 1)
+
+    def get_versions(self, *scopes: str) -> dict[str, int]:
+        """
+            The scope that has never been changed has version 0
+        """
+        versions = dict.fromkeys(scopes, 0)
+        versions.update(self.version_model.objects.filter(scope__in=scopes).values_list('scope', 'version'))
+        return versions
+
+    def changed_handler(self, sender, instance, **kwargs):
+        getter = self.get_scope_getters().get(sender)
+        if getter is None:
+            return
+        update_fields = kwargs.get('update_fields')
+        if sender is get_user_model() and update_fields is not None and set(update_fields) <= {'last_login'}:
+            # a login does not change the data
+            return
+
+        try:
+            scopes = getter(instance)
+        except ObjectDoesNotExist:
+            # the parent is deleted already (cascade), the deletion of the parent changes the version
+            return
+        self.bump(*scopes)
+
+    def connect(self):
+        post_save.connect(self.changed_handler, dispatch_uid=self.dispatch_uid)
+        post_delete.connect(self.changed_handler, dispatch_uid=self.dispatch_uid)
+
+
+cv_versions = VersionTracker()
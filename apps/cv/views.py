@@ -1,24 +1,31 @@
+import functools
+import hashlib
+import json
 from typing import Optional, Iterable
 
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.db.models import Model, QuerySet, Q, F
 from django.http import Http404
 from django.shortcuts import render
+from django.utils.http import parse_etags
 
 # Create your views here.
 from django.urls import get_resolver, get_ns_resolver
 from drf_spectacular.plumbing import get_doc
 
-from rest_framework import generics, mixins, parsers
+from rest_framework import generics, mixins, parsers, status
 from rest_framework.decorators import api_view
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.filters import BaseFilterBackend
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import (IsAuthenticated, BasePermission, SAFE_METHODS, IsAdminUser, )
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 
-from . import serializers, models
+from . import serializers, models, versions
+from .cache import response_cache
+from .pagination import KeysetOrderingFilter, KeysetPagination
 
 # Staff (common for all)
 # class Resources:
@@ -72,10 +79,14 @@ class TechnologyPermission(BasePermission):
 
         if request.method in SAFE_METHODS:
             # an authenticated user can see public (.profile is None) and their own technologies
-            return obj.profile is None or obj.profile.user == request.user
+            return obj.profile_id is None or self.is_own(request, obj)
         else:
             # an authenticated user can only operate on their own technologies
-            return obj.profile is not None and obj.profile.user == request.user
+            return obj.profile_id is not None and self.is_own(request, obj)
+
+    def is_own(self, request, obj: models.CVTechnologies) -> bool:
+        profile = serializers.get_request_profile(request)
+        return profile is not None and obj.profile_id == profile.pk
 
 
 class IsReadOnly(BasePermission):
@@ -94,18 +105,20 @@ class IsAuthenticatedAndMyself(BasePermission):
     The request is authenticated and try to get object for current logged user.
     """
 
-    def get_obj_user(self, obj):
+    def get_obj_user_id(self, obj) -> Optional[int]:
         if type(obj) is serializers.UserRetrieveUpdateSerializer.Meta.model:
-            return obj
+            return obj.pk
 
         if type(obj) is serializers.ProfileSerializer.Meta.model:
-            return obj.user
+            return obj.user_id
 
+    def get_obj_profile_id(self, obj) -> Optional[int]:
+        # the ids are compared, the profiles (and users) are not loaded
         if type(obj) is serializers.WorkplaceProjectSerializer.Meta.model:
-            if obj.workplace.profile != obj.project.profile:
+            if obj.workplace.profile_id != obj.project.profile_id:
                 return None
             else:
-                return obj.workplace.profile.user
+                return obj.workplace.profile_id
 
         if type(obj) is serializers.ProjectTechnologySerializer.Meta.model:
             obj = obj.project
@@ -113,30 +126,29 @@ class IsAuthenticatedAndMyself(BasePermission):
         if type(obj) is serializers.WorkplaceResponsibilitySerializer.Meta.model:
             obj = obj.workplace
 
-        p = getattr(obj, 'profile', None)
-        if p is not None:
-            return p.user
+        return getattr(obj, 'profile_id', None)
 
     def has_permission(self, request, view):
         return bool(request.user and request.user.is_authenticated)
 
     def has_object_permission(self, request, view, obj):
-        obj_user = self.get_obj_user(obj)
-        if obj_user is None:
+        obj_user_id = self.get_obj_user_id(obj)
+        if obj_user_id is not None:
+            return bool(obj_user_id == request.user.pk)
+
+        obj_profile_id = self.get_obj_profile_id(obj)
+        if obj_profile_id is None:
             return False
-        return bool(obj_user == request.user)
+        profile = serializers.get_request_profile(request)
+        return bool(profile is not None and obj_profile_id == profile.pk)
 
 
 def get_current_profile(request, raise_not_found=True) -> Optional[CVUserProfile]:
-    profile = CVUserProfile.objects.select_related('user').filter(user=request.user)
-    if len(profile) == 1:
-        return profile[0]
-    if raise_not_found:
-        if len(profile) == 0:
-            error = "%s not found" % CVUserProfile._meta.object_name
-        else:
-            error = "Weird, more than 1 instance of the %s was found." % CVUserProfile._meta.object_name
-        raise Http404(error)
+    # resolved once per request, see serializers.get_request_profile
+    profile = serializers.get_request_profile(request)
+    if profile is None and raise_not_found:
+        raise Http404("%s not found" % CVUserProfile._meta.object_name)
+    return profile
 
 
 class PermitAuthenticatedMixin:
@@ -179,23 +191,90 @@ class ProfilePhotoUpdate(PermitAuthenticatedMixin, generics.UpdateAPIView):
         self.kwargs[self.lookup_field] = get_current_profile(self.request).pk
         return super().get_object()
 
+    def update(self, request, *args, **kwargs):
+        try:
+            return super().update(request, *args, **kwargs)
+        finally:
+            # Django closes the uploaded files of the form media types only,
+            # the file of FileUploadParser (a temporary file for the big one) is closed here
+            for file in request.FILES.values():
+                file.close()
+
+
+class ETagMixin:
+    """
+        Conditional GET (ETag / If-None-Match).
+        The strong ETag is built from the version counters of `get_etag_scopes()` (see apps.cv.versions),
+        the user, the absolute URI and the format of the response, thus it is known before any query of the data.
+        If it matches `If-None-Match` then 304 is returned without the query and the serialization.
+        Otherwise, the ETag is the key of the cached data of the response (see apps.cv.cache).
+    """
+
+    etag_scopes = ()
+
+    def get_etag_scopes(self) -> Optional[list[str]]:
+        """
+            None - the response has no ETag
+        """
+        return list(self.etag_scopes)
+
+    def get_etag(self, request) -> Optional[str]:
+        scopes = self.get_etag_scopes()
+        if scopes is None:
+            return None
+
+        scope_versions = versions.cv_versions.get_versions(*scopes)
+        key = [
+            request.user.pk, request.user.is_staff, request.build_absolute_uri(), request.accepted_renderer.format,
+            sorted(scope_versions.items())
+        ]
+        return '"%s"' % hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+    def conditional_get(self, request, handler: callable, *args, **kwargs) -> Response:
+        etag = self.get_etag(request)
+        if etag is not None:
+            etags = parse_etags(request.headers.get('If-None-Match', ''))
+            if etag in etags or '*' in etags:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        if etag is None:
+            return handler(request, *args, **kwargs)
+
+        response = response_cache.get_response(
+            response_cache.get_key('etag', etag), functools.partial(handler, request, *args, **kwargs)
+        )
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
 
-class ResourcesListCreate(generics.ListCreateAPIView):
+    def get(self, request, *args, **kwargs):
+        return self.conditional_get(request, super().get, *args, **kwargs)
+
+
+class ResourcesListCreate(ETagMixin, generics.ListCreateAPIView):
     permission_classes = [IsReadOnly | IsAdminUser]
+    etag_scopes = [versions.RESOURCES_SCOPE]
     serializer_class = serializers.ResourcesSerializer
     queryset = serializers.ResourcesSerializer.Meta.model.objects.all()
 
 
-class ResourcesRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+class ResourcesRetrieveUpdateDestroy(ETagMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsReadOnlyOrAdmin]
+    etag_scopes = [versions.RESOURCES_SCOPE]
     serializer_class = serializers.ResourcesSerializer
     queryset = serializers.ResourcesSerializer.Meta.model.objects.all()
 
 
-class TechnologiesListCreate(generics.ListCreateAPIView):
+class TechnologiesListCreate(ETagMixin, generics.ListCreateAPIView):
     permission_classes = [TechnologyPermission]
+    etag_scopes = [versions.TECHNOLOGIES_SCOPE]
     serializer_class = serializers.TechnologiesSerializer
     queryset = serializers.TechnologiesSerializer.Meta.model.objects.all()
+    filter_backends = [KeysetOrderingFilter]
+    pagination_class = KeysetPagination
+    ordering = ('id', )
+    # `technology` is the first field of the unique index (technology, profile)
+    ordering_fields = ('technology', 'id')
 
     def get_queryset(self):
         q = super(TechnologiesListCreate, TechnologiesListCreate).get_queryset(self)
@@ -211,8 +290,9 @@ class TechnologiesListCreate(generics.ListCreateAPIView):
         return q
 
 
-class TechnologiesRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+class TechnologiesRetrieveUpdateDestroy(ETagMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [TechnologyPermission]
+    etag_scopes = [versions.TECHNOLOGIES_SCOPE]
     serializer_class = serializers.TechnologiesSerializer
     queryset = serializers.TechnologiesSerializer.Meta.model.objects.all()
 
@@ -222,39 +302,146 @@ class TechnologiesRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
 class MyselfFilter(BaseFilterBackend):
 
     def filter_queryset(self, request, queryset: QuerySet, view):
-        profile = get_current_profile(request)
+        profile_id = get_current_profile(request).pk
         if issubclass(type(view), WorkplaceProject):
-            rqs = queryset.filter(workplace__profile=profile, project__profile=F('workplace__profile'))
+            rqs = queryset.filter(workplace__profile_id=profile_id, project__profile_id=F('workplace__profile_id'))
         elif issubclass(type(view), WorkplaceResponsibility):
-            rqs = queryset.filter(workplace__profile=profile)
+            rqs = queryset.filter(workplace__profile_id=profile_id)
         elif issubclass(type(view), ProjectTechnology):
-            rqs = queryset.filter(project__profile=profile)
+            rqs = queryset.filter(project__profile_id=profile_id)
         else:
-            rqs = queryset.filter(profile=profile)
+            rqs = queryset.filter(profile_id=profile_id)
         return rqs
 
 
-class CVBaseAPIView(mixins.ListModelMixin, mixins.CreateModelMixin, mixins.RetrieveModelMixin,
-                    mixins.UpdateModelMixin, mixins.DestroyModelMixin, generics.GenericAPIView):
+class BulkModelMixin:
+    """
+        List-level create and update. The request data is a JSON array, each item is validated
+        by its own serializer (like a regular create or update) and all items are saved in one transaction.
+
+        The response is the list of representations (in the order of the request items) or,
+        if any item is invalid, HTTP 400 with the list of errors where valid items have `{}`
+        (like ListSerializer does). Nothing is saved in the last case.
+
+        For update each item must contain `bulk_pk_field_name` of the instance to update.
+    """
+
+    bulk_pk_field_name = 'id'
+    bulk_not_found_message = 'Not found.'
+
+    def _get_bulk_pk(self, item) -> Optional[int]:
+        pk = item.get(self.bulk_pk_field_name) if isinstance(item, dict) else None
+        if isinstance(pk, int) or (isinstance(pk, str) and pk.isdigit()):
+            return int(pk)
+
+    def get_bulk_instances(self, data: list) -> dict[int, Model]:
+        """
+            Returns {pk: instance, ...} for the items of `data` that are available for the current user
+        """
+        pks = {self._get_bulk_pk(item) for item in data} - {None}
+        instances = self.filter_queryset(self.get_queryset()).in_bulk(pks)
+        for instance in instances.values():
+            self.check_object_permissions(self.request, instance)
+        return instances
+
+    def _bulk_save(self, data: list, instances: Optional[dict] = None, partial: bool = False) -> tuple[list, bool]:
+        """
+            Returns (results, is_valid) where results are either representations or errors
+        """
+        serializers_, errors = [], []
+        for item in data:
+            instance = None
+            if instances is not None:
+                instance = instances.get(self._get_bulk_pk(item))
+                if instance is None:
+                    serializers_.append(None)
+                    errors.append({self.bulk_pk_field_name: [self.bulk_not_found_message]})
+                    continue
+
+            serializer = self.get_serializer(instance, data=item, partial=partial)
+            serializers_.append(serializer)
+            errors.append({} if serializer.is_valid() else serializer.errors)
+
+        if any(errors):
+            return errors, False
+
+        with transaction.atomic():
+            for i, serializer in enumerate(serializers_):
+                try:
+                    # savepoint per item, thus the errors of all items can be collected
+                    with transaction.atomic():
+                        if serializer.instance is None:
+                            self.perform_create(serializer)
+                        else:
+                            self.perform_update(serializer)
+                except ValidationError as exc:
+                    errors[i] = exc.detail
+
+            if any(errors):
+                transaction.set_rollback(True)
+                return errors, False
+
+        return [serializer.data for serializer in serializers_], True
+
+    def bulk_create(self, request, *args, **kwargs):
+        results, is_valid = self._bulk_save(request.data)
+        return Response(results, status=status.HTTP_201_CREATED if is_valid else status.HTTP_400_BAD_REQUEST)
+
+    def bulk_update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        results, is_valid = self._bulk_save(request.data, self.get_bulk_instances(request.data), partial)
+        return Response(results, status=status.HTTP_200_OK if is_valid else status.HTTP_400_BAD_REQUEST)
+
+    def partial_bulk_update(self, request, *args, **kwargs):
+        kwargs['partial'] = True
+        return self.bulk_update(request, *args, **kwargs)
+
+
+class CVBaseAPIView(ETagMixin, BulkModelMixin, mixins.ListModelMixin, mixins.CreateModelMixin,
+                    mixins.RetrieveModelMixin, mixins.UpdateModelMixin, mixins.DestroyModelMixin, generics.GenericAPIView):
     """
         Implements base behaviour for List, Create, Retrieve, Update, Partial-Update, Delete.
         It should be coupled with URLs definition like
         re_path('^education/(?:(?P<pk>[0-9]+)/)?$', Education.as_view(), name='education') where `pk` is optional part.
         It will respond to the URLs "education/1222/" or "education/".
+
+        POST, PUT or PATCH of a JSON array to the URL without `pk` (like "education/") is a bulk action,
+        see BulkModelMixin. It can be turned off by `allow_bulk = False`.
+
+        GET is conditional (see ETagMixin), the ETag depends on the version of the profile's data
+        and the versions of the dictionaries (their values are the parts of the representations).
     """
 
     permission_classes = [IsAuthenticatedAndMyself]
     serializer_class = None
+    allow_bulk = True
+
+    # ?ordering= accepts `ordering_fields` (NOT NULL and backed by an index), `id` is always the last key.
+    # The list is paginated by the keyset of the ordering if ?page_size= or ?cursor= is present.
+    pagination_class = KeysetPagination
+    ordering = ('id', )
+    ordering_fields = ('id', )
+
+    # The related objects that the representation (and the permission check) uses,
+    # they are loaded with the rows instead of the lazy load per row.
+    select_related = ()
+    prefetch_related = ()
 
     def _initialize_queryset(self):
         """
             Initialize self.queryset from self.serializer_class
+            and apply the `select_related` and `prefetch_related` of the view
         """
         if self.queryset is None:
             # try to from serializer
             model: Model = self.serializer_class.Meta.model
             self.queryset = model.objects.all()
 
+        if self.select_related:
+            self.queryset = self.queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            self.queryset = self.queryset.prefetch_related(*self.prefetch_related)
+
     def _get_lookup_field_name(self) -> str:
         return self.lookup_url_kwarg or self.lookup_field
 
@@ -281,17 +468,32 @@ class CVBaseAPIView(mixins.ListModelMixin, mixins.CreateModelMixin, mixins.Retri
         lookup_url_kwarg = self._get_lookup_field_name()
         # We did some preparation in .initial
         if lookup_url_kwarg in self.kwargs:
-            return self.retrieve(request, *args, **kwargs)
+            return self.conditional_get(request, self.retrieve, *args, **kwargs)
         else:
-            return self.list(request, *args, **kwargs)
+            return self.conditional_get(request, self.list, *args, **kwargs)
+
+    def get_etag_scopes(self) -> Optional[list[str]]:
+        profile = get_current_profile(self.request, False)
+        if profile is None:
+            return None
+        return [versions.profile_scope(profile.pk), versions.TECHNOLOGIES_SCOPE, versions.RESOURCES_SCOPE]
+
+    def is_bulk(self, request) -> bool:
+        return self.allow_bulk and isinstance(request.data, list) and self._get_lookup_field_name() not in self.kwargs
 
     def post(self, request, *args, **kwargs):
+        if self.is_bulk(request):
+            return self.bulk_create(request, *args, **kwargs)
         return self.create(request, *args, **kwargs)
 
     def put(self, request, *args, **kwargs):
+        if self.is_bulk(request):
+            return self.bulk_update(request, *args, **kwargs)
         return self.update(request, *args, **kwargs)
 
     def patch(self, request, *args, **kwargs):
+        if self.is_bulk(request):
+            return self.partial_bulk_update(request, *args, **kwargs)
         return self.partial_update(request, *args, **kwargs)
 
     def delete(self, request, *args, **kwargs):
@@ -318,6 +520,7 @@ class CVBaseAPIView(mixins.ListModelMixin, mixins.CreateModelMixin, mixins.Retri
 @schemas.profile_schema
 class Profile(CVBaseAPIView):
     serializer_class = serializers.ProfileSerializer
+    allow_bulk = False
     queryset = serializer_class.Meta.model.objects.select_related('user')
 
     def get_object(self):
@@ -345,67 +548,119 @@ class Profile(CVBaseAPIView):
 class Education(CVBaseAPIView):
     permission_classes = [IsAuthenticatedAndMyself]
     serializer_class = serializers.EducationSerializer
-    filter_backends = [MyselfFilter]
+    filter_backends = [MyselfFilter, KeysetOrderingFilter]
+    ordering = ('begin', 'id')
+    ordering_fields = ('begin', 'id')
 
 
 @schemas.hobby_schema
 class Hobby(CVBaseAPIView):
     permission_classes = [IsAuthenticatedAndMyself]
     serializer_class = serializers.HobbySerializer
-    filter_backends = [MyselfFilter]
+    filter_backends = [MyselfFilter, KeysetOrderingFilter]
 
 
 @schemas.language_schema
 class Language(CVBaseAPIView):
     permission_classes = [IsAuthenticatedAndMyself]
     serializer_class = serializers.LanguageSerializer
-    filter_backends = [MyselfFilter]
+    filter_backends = [MyselfFilter, KeysetOrderingFilter]
 
 
 @schemas.project_schema
 class Project(CVBaseAPIView):
     permission_classes = [IsAuthenticatedAndMyself]
     serializer_class = serializers.ProjectSerializer
-    filter_backends = [MyselfFilter]
+    filter_backends = [MyselfFilter, KeysetOrderingFilter]
+    ordering = ('begin', 'id')
+    ordering_fields = ('begin', 'id')
 
 
 @schemas.workplace_schema
 class Workplace(CVBaseAPIView):
     permission_classes = [IsAuthenticatedAndMyself]
     serializer_class = serializers.WorkplaceSerializer
-    filter_backends = [MyselfFilter]
+    filter_backends = [MyselfFilter, KeysetOrderingFilter]
+    ordering = ('begin', 'id')
+    ordering_fields = ('begin', 'id')
 
 
 @schemas.userresource_schema
 class UserResource(CVBaseAPIView):
     permission_classes = [IsAuthenticatedAndMyself]
     serializer_class = serializers.UserResourceSerializer
-    filter_backends = [MyselfFilter]
+    filter_backends = [MyselfFilter, KeysetOrderingFilter]
 
 
 @schemas.projecttechnology_schema
 class ProjectTechnology(CVBaseAPIView):
     permission_classes = [IsAuthenticatedAndMyself]
     serializer_class = serializers.ProjectTechnologySerializer
-    filter_backends = [MyselfFilter]
+    filter_backends = [MyselfFilter, KeysetOrderingFilter]
+    select_related = ('project', 'technology')
 
 
 @schemas.workplaceresponsibility_schema
 class WorkplaceResponsibility(CVBaseAPIView):
     permission_classes = [IsAuthenticatedAndMyself]
     serializer_class = serializers.WorkplaceResponsibilitySerializer
-    filter_backends = [MyselfFilter]
+    filter_backends = [MyselfFilter, KeysetOrderingFilter]
+    ordering = ('begin', 'id')
+    ordering_fields = ('begin', 'id')
+    select_related = ('workplace', )
 
 
 @schemas.workplaceproject_schema
 class WorkplaceProject(CVBaseAPIView):
     permission_classes = [IsAuthenticatedAndMyself]
     serializer_class = serializers.WorkplaceProjectSerializer
-    filter_backends = [MyselfFilter]
+    filter_backends = [MyselfFilter, KeysetOrderingFilter]
+    select_related = ('workplace', 'project')
+
+
+@schemas.fullcv_schema
+class FullCV(ETagMixin, generics.RetrieveAPIView):
+    """
+        The whole CV of the current user (profile and all sections) in one response
+    """
+    permission_classes = [IsAuthenticatedAndMyself]
+    serializer_class = serializers.FullCVSerializer
+    queryset = serializers.ProfileSerializer.Meta.model.objects.select_related('user')
+
+    get_etag_scopes = CVBaseAPIView.get_etag_scopes
+
+    def get_object(self):
+        # the profile is already resolved (with the user) for the request
+        profile = get_current_profile(self.request)
+        self.check_object_permissions(self.request, profile)
+        return profile
+
+
+@schemas.responsecache_schema
+class ResponseCacheStats(generics.GenericAPIView):
+    """
+        The number of hits and misses of the response cache (staff only), DELETE resets them
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(response_cache.get_stats())
+
+    def delete(self, request, *args, **kwargs):
+        response_cache.reset_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 @api_view(['GET'])
 def api_root_view(request, app_names: Iterable, sort: bool = True):
+    # the data depends on the urls and the views only
+    return response_cache.get_response(
+        response_cache.get_key('api_root', request.build_absolute_uri(), list(app_names), sort),
+        functools.partial(get_api_root_response, request, app_names, sort)
+    )
+
+
+def get_api_root_response(request, app_names: Iterable, sort: bool = True) -> Response:
     resolver = get_resolver()
     res = {}
 
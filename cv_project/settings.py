@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -165,4 +166,18 @@ SPECTACULAR_SETTINGS = {
     'SERVE_INCLUDE_SCHEMA': False,
     # OTHER SETTINGS
     # 'COMPONENT_SPLIT_REQUEST': True,
-}
\ No newline at end of file
+}
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # shared by the processes of the host
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': Path(tempfile.gettempdir()) / 'cv_cache',
+    },
+}
+
+# The cache of the GET responses of the CV endpoints (apps/cv/cache.py), the alias of CACHES or None (disabled)
+CV_RESPONSE_CACHE = 'default'
+CV_RESPONSE_CACHE_TIMEOUT = 60 * 60